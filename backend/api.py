@@ -1,64 +1,45 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Response
+from fastapi import FastAPI, HTTPException, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import List, Optional
 from custom_crew import CustomAgent, CustomTask, CustomCrew
 from tools import process_pdf, summarize_text, generate_audio
-from langchain_community.llms import LlamaCpp
+from llm_registry import get_llm, warm_up, model_stats
+from prompt_cache import prefix_cache_stats
+from cache_store import get_cache, cache_stats
+from papers import canonical_arxiv_id, content_key, paper_key
+from audio_generator import (get_tts_pool, check_espeak, espeak_required, install_instructions,
+                             generate_audio_file, generate_audio_stream, audio_artifact_key,
+                             sentences_to_speak, voice_settings, wav_header, warm_up_tts)
+from pdf_extract import extract_sections, sections_to_text
+from jobs import JobStore, job_handler
+from arxiv_index import ArxivIndex
+from semantic_cache import SemanticCache
+from upload_store import PdfStore, UPLOAD_OPENAPI
+from metrics import HTTP_SECONDS, new_trace, register_collector, render as render_metrics, stage
+import summarizer
+from inference import (QueueFullError, llm_pool, tts_pool, pool_stats,
+                       search_flight, summary_flight, summary_stream_flight, audio_flight, flight_stats,
+                       normalize_key,
+                       stream_from_pool)
+import asyncio
+import json
 import os
+import re
 import time
+from email.utils import formatdate
 from dotenv import load_dotenv
-import shutil
+import sqlite3
+import threading
 from pathlib import Path
 from uuid import uuid4
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 
 load_dotenv()
 
 app = FastAPI()
 
-# Configure Llama model from environment variables
-model_path = os.getenv("MODEL_PATH", "./models/llama-2-7b.Q4_K_M.gguf")
-gpu_layers = int(os.getenv("GPU_LAYERS", "40"))
-
 print(f"🔍 CUDA_VISIBLE_DEVICES: {os.environ.get('CUDA_VISIBLE_DEVICES', 'Not Set')}")
-print(f"🔍 Initializing LlamaCpp with {gpu_layers} GPU layers on model: {model_path}")
-
-# Add very verbose initialization to debug GPU usage
-llama_llm = LlamaCpp(
-    model_path=model_path,
-    temperature=0.7,
-    max_tokens=2000,
-    n_ctx=2048,
-    n_gpu_layers=gpu_layers,
-    n_batch=512,
-    f16_kv=True,            # Use half-precision for key/value cache
-    verbose=True,           # Enable verbose mode to see which layers go to GPU
-)
-
-print("✅ LlamaCpp model initialized")
-
-print("\n")
-print("="*50)
-print("🔍 GPU USAGE DIAGNOSTICS:")
-print(f"GPU_LAYERS set to: {gpu_layers}")
-print(f"CUDA_VISIBLE_DEVICES: {os.environ.get('CUDA_VISIBLE_DEVICES', 'Not Set')}")
-
-# Test GPU load using simple PyTorch test
-try:
-    import torch
-    print(f"PyTorch CUDA available: {torch.cuda.is_available()}")
-    if torch.cuda.is_available():
-        print(f"PyTorch CUDA device: {torch.cuda.get_device_name(0)}")
-        # Create small tensor on GPU to verify functionality
-        x = torch.rand(10, 10).cuda()
-        print("✅ Successfully created tensor on GPU")
-except ImportError:
-    print("PyTorch not installed, skipping GPU test")
-except Exception as e:
-    print(f"❌ GPU test failed: {e}")
-
-print("="*50)
-print("\n")
 
 print("\n🚀 Starting FastAPI server...")
 
@@ -69,10 +50,77 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the frontend read the ids it needs for follow-up requests
+    expose_headers=["X-Session-Id", "X-Search-Id", "X-Paper-Key", "X-Trace-Id"],
 )
 
-# In-memory cache
-cache = {}
+# Every request gets a trace id (the caller's, if it sent one) that tags
+# the stage timings and events recorded while serving it
+TRACE_HEADER = "X-Trace-Id"
+TRACE_ID_PATTERN = re.compile(r"[A-Za-z0-9-]{8,64}")
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    requested = request.headers.get(TRACE_HEADER, "")
+    trace = new_trace(requested if TRACE_ID_PATTERN.fullmatch(requested) else None)
+    start_time = time.perf_counter()
+    response = await call_next(request)
+    # Streaming responses are timed to their first byte
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(time.perf_counter() - start_time, method=request.method,
+                         route=getattr(route, "path", "unmatched"), status=response.status_code)
+    response.headers[TRACE_HEADER] = trace
+    return response
+
+# Shed load with a Retry-After hint when the inference queue is full
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.on_event("shutdown")
+def shutdown_pools():
+    llm_pool.shutdown()
+    tts_pool.shutdown()
+
+def warm_up_all():
+    warm_up()
+    if os.getenv("WARM_UP_TTS", "1") == "1":
+        try:
+            warm_up_tts()
+        except Exception as e:
+            print(f"⚠️ TTS warm-up skipped: {e}")
+
+# Load the models in the background so /health answers while they warm up
+@app.on_event("startup")
+def warm_up_models():
+    if os.getenv("WARM_UP_ON_STARTUP", "1") == "1":
+        threading.Thread(target=warm_up_all, name="model-warm-up", daemon=True).start()
+
+# Local arXiv metadata index; /search falls back to the LLM while it is empty
+try:
+    arxiv_index = ArxivIndex()
+except sqlite3.OperationalError as e:
+    print(f"⚠️ arXiv index unavailable (SQLite without FTS5?): {e}")
+    arxiv_index = None
+
+# Pick up new snapshot files in the background; search works on what is indexed so far
+@app.on_event("startup")
+def ingest_arxiv_snapshots():
+    if arxiv_index is not None and os.getenv("ARXIV_INGEST_ON_STARTUP", "1") == "1":
+        threading.Thread(target=arxiv_index.ingest_directory, name="arxiv-ingest", daemon=True).start()
+
+# Separate namespaces so query strings, ids and result indices never collide
+search_cache = get_cache("searches")      # normalized query -> {"search_id", "text"} of its results
+query_cache = SemanticCache()             # query embedding -> same, for differently worded queries
+result_sets = get_cache("result_sets")    # search id -> parsed papers, each with a stable key
+sessions = get_cache("sessions")          # session id -> {"search_id"} of its latest search
+summary_cache = get_cache("summaries")    # content key, file/summary id or "paper:<key>" -> summary
+audio_cache = get_cache("audio")          # paper id -> metadata of its audio artifact
+rewrite_cache = get_cache("query_rewrites")  # normalized query -> index keywords
 
 # Create upload directory if it doesn't exist
 UPLOAD_DIR = Path("./uploads")
@@ -82,14 +130,137 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 AUDIO_DIR = UPLOAD_DIR / "audio"
 AUDIO_DIR.mkdir(exist_ok=True)
 
+# Uploaded PDFs, named by their SHA-256
+pdf_store = PdfStore(UPLOAD_DIR / "pdfs")
+
 class SearchRequest(BaseModel):
     query: str
 
+# Each browser tab sends its own session id, so concurrent users never see
+# (or summarize) each other's search results
+SESSION_HEADER = "X-Session-Id"
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9-]{8,64}")
+# Sessions not used for this long are evicted
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "3600"))
+
+def request_session_id(request: Request):
+    session_id = request.headers.get(SESSION_HEADER, "")
+    return session_id if SESSION_ID_PATTERN.fullmatch(session_id) else None
+
+def save_session(session_id: str, session: dict):
+    # Re-setting on every use makes the TTL an idle timeout
+    sessions.set(session_id, session, ttl_seconds=SESSION_IDLE_SECONDS)
+
+def search_response(text: str, search_id: str, http_request: Request) -> Response:
+    """Result lines, with the result set recorded as the caller's latest search."""
+    session_id = request_session_id(http_request) or str(uuid4())
+    save_session(session_id, {"search_id": search_id})
+    return Response(content=text, media_type="text/plain",
+                    headers={SESSION_HEADER: session_id, "X-Search-Id": search_id})
+
+def session_results(request: Request, search_id: str = None) -> list:
+    """Papers of the given search, or of the latest search in the caller's session."""
+    if search_id is None:
+        session_id = request_session_id(request)
+        session = sessions.get(session_id) if session_id else None
+        if session is None:
+            raise HTTPException(status_code=404, detail="No search in this session. Please search first.")
+        save_session(session_id, session)
+        search_id = session["search_id"]
+    papers = result_sets.get(search_id)
+    if papers is None:
+        raise HTTPException(status_code=404, detail="Search results expired. Please search again.")
+    return papers
+
+SEARCH_RESULTS = 5
+# The exact shape of the search answer: five "N: Title - Link" lines. The
+# grammar is complete after the fifth link, so generation stops right there.
+# A hyphen in a title may not be followed by a space, which keeps " - " an
+# unambiguous separator.
+SEARCH_GRAMMAR = r"""
+root ::= "0: " entry "\n1: " entry "\n2: " entry "\n3: " entry "\n4: " entry
+entry ::= title " - " link
+title ::= [^ \n-] titlechar*
+titlechar ::= [^\n-] | "-" [^ \n-]
+link ::= "https://arxiv.org/abs/" digit digit digit digit "." digit digit digit digit digit? version?
+version ::= "v" digit digit?
+digit ::= [0-9]
+"""
+# Five lines of title and link fit in far fewer tokens than the model-wide max_tokens
+SEARCH_MAX_TOKENS = int(os.getenv("SEARCH_MAX_TOKENS", "400"))
+# Summaries are asked for in around 100 words
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "320"))
+# Let the LLM turn a request into keywords before the index lookup
+SEARCH_QUERY_REWRITE = os.getenv("SEARCH_QUERY_REWRITE", "0") == "1"
+REWRITE_PROMPT = """Rewrite this research paper search request as 3 to 8 search keywords.
+Reply with the keywords only, on one line.
+
+Request: {query}
+Keywords:"""
+
+def publish_results(papers: list, http_request: Request, query: str = None,
+                    query_vector=None) -> Response:
+    """Store a result set and return it as "<index>: <title> - <link>" lines."""
+    minimal = [f"{p['index']}: {p['title']} - {p['link']}" for p in papers]
+    result = "\n".join(minimal)
+    search_id = content_key(result)[:16]
+    result_sets.set(search_id, papers)
+    if query is not None:
+        cached = {"search_id": search_id, "text": result}
+        search_cache.set(normalize_key(query), cached)
+        query_cache.add(query_vector, cached)
+    return search_response(result, search_id, http_request)
+
+def cached_search(cached: Optional[dict]) -> Optional[dict]:
+    # The result set may have expired while the query still points at it
+    return cached if cached is not None and cached["search_id"] in result_sets else None
+
+async def rewrite_query(query: str) -> str:
+    key = normalize_key(query)
+    keywords = rewrite_cache.get(key)
+    if keywords is None:
+        llm = get_llm()
+        text = await llm_pool.run(llm.invoke, REWRITE_PROMPT.format(query=query), max_tokens=32)
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        keywords = lines[0] if lines else query
+        rewrite_cache.set(key, keywords)
+    return keywords
+
+async def index_search(query: str):
+    """Ranked papers from the local arXiv index (possibly none), or None if there is no index."""
+    if arxiv_index is None or not await asyncio.to_thread(arxiv_index.available):
+        return None
+    if SEARCH_QUERY_REWRITE:
+        try:
+            query = await rewrite_query(query)
+        except QueueFullError:
+            pass  # Plain keywords are good enough when the model is busy
+    start_time = time.time()
+    hits = await asyncio.to_thread(arxiv_index.search, query, SEARCH_RESULTS)
+    print(f"📚 Index search for '{query}' returned {len(hits)} papers "
+          f"in {(time.time() - start_time) * 1000:.1f} ms")
+    return [{"index": i, "title": hit["title"], "link": hit["link"], "key": paper_key(hit["link"])}
+            for i, hit in enumerate(hits)]
+
 @app.post("/search")
-async def search(request: SearchRequest):
-    # Check cache
-    if request.query in cache:
-        return Response(content=cache[request.query], media_type="text/plain")
+async def search(request: SearchRequest, http_request: Request):
+    # Real papers from the local index when there is one, in milliseconds
+    papers = await index_search(request.query)
+    if papers is not None:
+        if not papers:
+            # The model would only invent titles and links the index does not have
+            raise HTTPException(status_code=404, detail="No papers in the arXiv index match this search.")
+        return publish_results(papers, http_request)
+
+    # Without an index, ask the model; check the caches first
+    cached = cached_search(search_cache.get(normalize_key(request.query)))
+    if cached is not None:
+        return search_response(cached["text"], cached["search_id"], http_request)
+    query_vector = await asyncio.to_thread(query_cache.embed, request.query)
+    cached = cached_search(query_cache.lookup(query_vector))
+    if cached is not None:
+        print(f"🎯 Semantic cache hit for '{request.query}'")
+        return search_response(cached["text"], cached["search_id"], http_request)
 
     try:
         print(f"🔍 Starting search for: '{request.query}'")
@@ -98,7 +269,7 @@ async def search(request: SearchRequest):
             goal="Find and analyze cutting-edge research papers",
             backstory="Expert researcher with 10 years' experience in ML paper analysis.",
             tools=[process_pdf],
-            llm=llama_llm
+            llm=get_llm()
         )
         search_task = CustomTask(
             description="""Find 5 recent papers about {query} on arXiv.
@@ -111,7 +282,10 @@ Return exactly 5 lines of output, numbered 0 through 4, each in this exact forma
 """,
             expected_output="List of papers with titles and links in the specified format",
             agent=researcher,
-            tools=["process_pdf"]
+            tools=["process_pdf"],
+            grammar=SEARCH_GRAMMAR,
+            stop=["\n5:"],
+            max_tokens=SEARCH_MAX_TOKENS
         )
         crew = CustomCrew(
             tasks=[search_task],
@@ -120,7 +294,11 @@ Return exactly 5 lines of output, numbered 0 through 4, each in this exact forma
         
         print(f"🧠 Running LLM inference for search query: '{request.query}'")
         start_time = time.time()
-        outputs = crew.kickoff(inputs={"query": request.query})
+        # Identical searches already in flight share one generation
+        outputs = await search_flight.do(
+            normalize_key(request.query),
+            lambda: llm_pool.run(crew.kickoff, inputs={"query": request.query})
+        )
         end_time = time.time()
         print(f"⏱️ Search completed in {end_time - start_time:.2f} seconds")
         
@@ -137,75 +315,118 @@ Return exactly 5 lines of output, numbered 0 through 4, each in this exact forma
                 idx_str, rest = line.split(":", 1)
                 idx_str = idx_str.strip()
                 rest = rest.strip()
-                # e.g. "[LINK] Paper Title - https://arxiv.org/abs/..."
+                # e.g. "[LINK] Paper Title - https://arxiv.org/abs/..."; titles may contain " - " too
                 if " - " in rest:
-                    title_part, link_part = rest.split(" - ", 1)
+                    title_part, link_part = rest.rsplit(" - ", 1)
                     papers.append({
                         "index": int(idx_str),
                         "title": title_part.replace("[LINK]", "").strip(),
-                        "link": link_part.strip()
+                        "link": link_part.strip(),
+                        # Summaries and audio are addressed by this, not by position
+                        "key": paper_key(link_part)
                     })
         
         print(f"📄 Parsed {len(papers)} papers")
         
         if not papers:
-            # Generate default response if parsing failed
-            default_response = "0: Sample Paper Title - https://arxiv.org/abs/sample\n"
-            default_response += "1: Another Paper Title - https://arxiv.org/abs/sample2\n"
-            default_response += "2: Third Paper Title - https://arxiv.org/abs/sample3\n"
-            default_response += "3: Fourth Paper Title - https://arxiv.org/abs/sample4\n"
-            default_response += "4: Fifth Paper Title - https://arxiv.org/abs/sample5"
-            print("⚠️ No papers parsed, returning default response")
-            return Response(content=default_response, media_type="text/plain")
+            # Made-up sample papers would be cached and summarized as if real
+            print("⚠️ No papers parsed from the search output")
+            raise HTTPException(status_code=502, detail="The model did not return any papers")
         
-        cache["active_results"] = papers
         # Return both title and link to frontend
-        minimal = [f"{p['index']}: {p['title']} - {p['link']}" for p in papers]
-        result = "\n".join(minimal)  # Fix the syntax error here
-        cache[request.query] = result
-        print(f"✅ Returning search result: {result[:100]}...")
-        return Response(content=result, media_type="text/plain")
+        print(f"✅ Returning {len(papers)} search results")
+        return publish_results(papers, http_request, query=request.query, query_vector=query_vector)
         
+    except (HTTPException, QueueFullError):
+        raise
     except Exception as e:
         import traceback
         print(f"❌ Error in search endpoint: {str(e)}")
         print(traceback.format_exc())
-        # Return a fallback response so the frontend doesn't break
-        fallback = "0: Error retrieving papers - please try again\n"
-        return Response(content=fallback, media_type="text/plain")
+        raise HTTPException(status_code=502, detail=f"Error retrieving papers: {e}")
 
 class DirectPaperRequest(BaseModel):
     paper_id: str
 
-@app.post("/upload-pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    # Generate a unique filename
-    file_id = str(uuid4())
-    file_location = UPLOAD_DIR / f"{file_id}.pdf"
-    
-    # Save the uploaded file
-    try:
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    finally:
-        file.file.close()
-    
-    # Process the PDF using the existing writer agent
-    writer = CustomAgent(
+class BatchSummaryRequest(BaseModel):
+    # Search result indices, arXiv IDs or paper links, in any mix
+    papers: List[str]
+    # Result set the indices refer to; defaults to the session's latest search
+    search_id: Optional[str] = None
+
+def summary_writer() -> CustomAgent:
+    return CustomAgent(
         role="Technical Writer",
         goal="Write concise summaries of research papers",
         backstory="PhD in Computer Science with expertise in summarization.",
         tools=[summarize_text],
-        llm=llama_llm
+        llm=get_llm()
     )
+
+# Bumped when the stored form of a summary changes, so older entries are not served
+SUMMARY_FORMAT = "clean-1"
+
+def summary_key(source: str, crew: CustomCrew, variant: str = "") -> str:
+    return content_key(source, variant, SUMMARY_FORMAT, [task.fingerprint() for task in crew.tasks])
+
+def cache_summary(key: str, raw_summary: str) -> str:
+    """Clean a generated summary and cache it under its content key.
+
+    Every path that generates a summary goes through here, so a paper's
+    summary has the same form whichever endpoint produced it first.
+    """
+    summary = clean_summary(raw_summary)
+    summary_cache.set(key, summary)
+    return summary
+
+async def run_summary(source: str, crew: CustomCrew, inputs: dict,
+                      prepare=None, variant: str = "") -> str:
+    """Summarize once per source document, prompt, model and sampling params.
+
+    The key changes whenever any of those change, so stale summaries are
+    never served after a prompt or model update. `prepare` runs on the
+    inference pool before the crew, only on a cache miss; `variant` must
+    capture anything it does that affects the result.
+    """
+    key = summary_key(source, crew, variant)
+    summary = summary_cache.get(key)
+    if summary is None:
+        # Identical requests already in flight share one generation
+        summary = await summary_flight.do(
+            key, lambda: llm_pool.run(generate_summary, source, crew, inputs, prepare, variant))
+    return summary
+
+def generate_summary(source: str, crew: CustomCrew, inputs: dict,
+                     prepare=None, variant: str = "") -> str:
+    """Blocking part of run_summary, also used by the job workers."""
+    key = summary_key(source, crew, variant)
+    summary = summary_cache.get(key)
+    if summary is None:
+        if prepare:
+            prepare()
+        outputs = crew.kickoff(inputs=inputs)
+        # Extract the final string from the response
+        summary = cache_summary(key, list(outputs.values())[0])
+    return summary
+
+async def save_upload(request: Request):
+    """Stream an uploaded PDF into the content-addressed store; returns its id, path and SHA-256."""
+    with stage("file_io.save_upload"):
+        return await pdf_store.receive(request)
+
+def pdf_summary_job(file_location: str, digest: str, sections: dict):
+    """Crew, cache source, inputs, prepare step and variant for summarizing an uploaded PDF."""
+    # Process the PDF using the existing writer agent
+    writer = summary_writer()
     
     summarize_task = CustomTask(
-        description=f"""Summarize the PDF paper located at: {file_location}.
+        description="""Summarize the PDF paper located at: {paper_location}.
 Return in around 100 words only the paragraph with no extra text
 """,
         expected_output="Summary of the paper in the specified format",
         agent=writer,
-        tools=["summarize_text"]
+        tools=["summarize_text"],
+        max_tokens=SUMMARY_MAX_TOKENS
     )
     
     crew = CustomCrew(
@@ -213,62 +434,101 @@ Return in around 100 words only the paragraph with no extra text
         agents=[writer]
     )
     
-    outputs = crew.kickoff(inputs={"paper_location": str(file_location)})
-    # Extract the final string from the response
-    final_summary = list(outputs.values())[0]
+    def condense_paper():
+        # Map-reduce the full text so the writer's prompt is the reduce step
+        condensed = summarizer.condense(sections_to_text(sections), writer.llm)
+        summarize_task.context = [condensed]
+
+    # Identical uploads resolve to the same summary via the PDF's SHA-256
+    return (crew, f"sha256:{digest}", {"paper_location": str(file_location)},
+            condense_paper, summarizer.settings_fingerprint())
+
+@app.post("/upload-pdf", openapi_extra=UPLOAD_OPENAPI)
+async def upload_pdf(request: Request):
+    file_id, file_location, digest = await save_upload(request)
+    
+    # Extract the paper text off the event loop; cached by file hash
+    try:
+        sections = await asyncio.to_thread(extract_sections, str(file_location), digest)
+    except Exception as e:
+        print(f"❌ Could not extract text from {file_location}: {e}")
+        raise HTTPException(status_code=422, detail=f"Could not read PDF: {e}")
+    
+    crew, source, inputs, prepare, variant = pdf_summary_job(file_location, digest, sections)
+    final_summary = await run_summary(source, crew, inputs=inputs, prepare=prepare, variant=variant)
     
     # Store in cache with the file_id as key
-    cache[file_id] = final_summary
+    summary_cache.set(file_id, final_summary)
     
     # Return the ID with the summary for frontend tracking
     return Response(content=f"{file_id}:{final_summary}", media_type="text/plain")
 
-@app.post("/summarize-direct")
-async def summarize_direct(request: DirectPaperRequest):
-    paper_id = request.paper_id.strip()
-    
-    # Generate unique ID for this summary
-    summary_id = str(uuid4())
-    
+def direct_summary_job(paper_id: str, writer: CustomAgent = None):
+    """Crew, cache source and inputs for summarizing a paper by arXiv ID or URL."""
     # Process paper ID (could be arXiv ID or full URL)
-    if "arxiv.org" in paper_id:
-        # Extract the ID from the URL
-        import re
-        arxiv_id = re.search(r'(\d+\.\d+)', paper_id)
-        if arxiv_id:
-            paper_id = arxiv_id.group(1)
+    arxiv_id = canonical_arxiv_id(paper_id)
+    if arxiv_id:
+        paper_id = arxiv_id
     
     # Create a writer agent to summarize the paper
-    writer = CustomAgent(
-        role="Technical Writer",
-        goal="Write concise summaries of research papers",
-        backstory="PhD in Computer Science with expertise in summarization.",
-        tools=[summarize_text],
-        llm=llama_llm
-    )
-    
+    writer = writer or summary_writer()
     summarize_task = CustomTask(
-        description=f"""Summarize the paper with ID: {paper_id}.
+        description="""Summarize the paper with ID: {paper_id}.
         Return in around 100 words only the paragraph with no extra text
 Provide a short, plain text overview with no disclaimers, references, or extra formatting.
 """,
         expected_output="Summary of the paper in the specified format",
         agent=writer,
-        tools=["summarize_text"]
+        tools=["summarize_text"],
+        max_tokens=SUMMARY_MAX_TOKENS
     )
-    
     crew = CustomCrew(
         tasks=[summarize_task],
         agents=[writer]
     )
-    
-    outputs = crew.kickoff(inputs={"paper_id": paper_id})
-    # Extract the final string from the response
-    final_summary = list(outputs.values())[0].strip()
+    source = f"arxiv:{arxiv_id}" if arxiv_id else f"paper:{paper_id}"
+    return crew, source, {"paper_id": paper_id}
+
+def search_result(request: Request, paper_index: int, search_id: str = None) -> dict:
+    papers = session_results(request, search_id)
+    if paper_index < 0 or paper_index >= len(papers):
+        raise HTTPException(status_code=404, detail="Index out of range.")
+    return papers[paper_index]
+
+def result_summary_job(paper: dict, writer: CustomAgent = None):
+    """Crew, cache source and inputs for summarizing a search result."""
+    return paper_summary_job(paper["link"], paper["title"], writer)
+
+def paper_summary_job(link: str, title: str, writer: CustomAgent = None):
+    """Crew, cache source and inputs for summarizing a search result by its link and title."""
+    writer = writer or summary_writer()
+    summarize_task = CustomTask(
+        description="""Summarize the paper titled "{title}" from {paper_id}.
+        Return in around 100 words only the paragraph with no extra text
+Provide a short, plain text overview with no disclaimers, references, or extra formatting.
+""",
+        expected_output="A concise summary paragraph about the paper",
+        agent=writer,
+        tools=["summarize_text"],
+        max_tokens=SUMMARY_MAX_TOKENS
+    )
+    crew = CustomCrew(
+        tasks=[summarize_task],
+        agents=[writer]
+    )
+    arxiv_id = canonical_arxiv_id(link)
+    source = f"arxiv:{arxiv_id}" if arxiv_id else f"link:{link}"
+    return crew, source, {"paper_id": link, "title": title}
+
+@app.post("/summarize-direct")
+async def summarize_direct(request: DirectPaperRequest):
+    crew, source, inputs = direct_summary_job(request.paper_id.strip())
+    final_summary = await run_summary(source, crew, inputs=inputs)
     
     # Store in cache with both the paper_id and a unique summary_id
-    cache[paper_id] = final_summary
-    cache[summary_id] = final_summary
+    summary_id = str(uuid4())
+    summary_cache.set(inputs["paper_id"], final_summary)
+    summary_cache.set(summary_id, final_summary)
     
     # Return the ID with the summary
     return Response(content=f"{summary_id}:{final_summary}", media_type="text/plain")
@@ -277,147 +537,431 @@ Provide a short, plain text overview with no disclaimers, references, or extra f
 @app.post("/store-summary/{summary_id}")
 async def store_summary(summary_id: str, request: dict):
     if "summary" in request:
-        cache[summary_id] = request["summary"]
+        summary_cache.set(summary_id, request["summary"])
         return Response(content="Summary stored", media_type="text/plain")
     else:
         raise HTTPException(status_code=400, detail="No summary provided")
 
 @app.get("/summarize/{paper_index}")
-async def summarize(paper_index: int):
-    if "active_results" not in cache:
-        raise HTTPException(status_code=404, detail="No papers in cache.")
-    papers = cache["active_results"]
-    if paper_index < 0 or paper_index >= len(papers):
-        raise HTTPException(status_code=404, detail="Index out of range.")
-    link = papers[paper_index]["link"]
-    title = papers[paper_index]["title"]
+async def summarize(paper_index: int, request: Request, search_id: str = None):
+    paper = search_result(request, paper_index, search_id)
+    crew, source, inputs = result_summary_job(paper)
+    final_summary = await run_summary(source, crew, inputs=inputs)
 
-    writer = CustomAgent(
-        role="Technical Writer",
-        goal="Write concise summaries of research papers",
-        backstory="PhD in Computer Science with expertise in summarization.",
-        tools=[summarize_text],
-        llm=llama_llm
-    )
-    summarize_task = CustomTask(
-        description=f"""Summarize the paper titled "{title}" from {link}.
-        Return in around 100 words only the paragraph with no extra text
-Provide a short, plain text overview with no disclaimers, references, or extra formatting.
-""",
-        expected_output="A concise summary paragraph about the paper",
-        agent=writer,
-        tools=["summarize_text"]
-    )
-    crew = CustomCrew(
-        tasks=[summarize_task],
-        agents=[writer]
+    # Store in cache under the paper's stable key, which /audio accepts
+    summary_cache.set(f"paper:{paper['key']}", final_summary)
+    return Response(content=final_summary, media_type="text/plain",
+                    headers={"X-Paper-Key": paper["key"]})
+
+BATCH_MAX_PAPERS = int(os.getenv("BATCH_MAX_PAPERS", "20"))
+
+def batch_summary_job(paper: str, writer: CustomAgent, request: Request, search_id: str = None):
+    """Crew, cache source, inputs, cache keys to store under and the returned id for one batch entry."""
+    if paper.isdigit():
+        result = search_result(request, int(paper), search_id)
+        crew, source, inputs = result_summary_job(result, writer)
+        return crew, source, inputs, [f"paper:{result['key']}"], result["key"]
+    crew, source, inputs = direct_summary_job(paper, writer)
+    summary_id = str(uuid4())
+    return crew, source, inputs, [inputs["paper_id"], summary_id], summary_id
+
+@app.post("/summarize-batch")
+async def summarize_batch(request: BatchSummaryRequest, http_request: Request):
+    """Summarize several papers as one scheduled job, streaming a JSON line per paper.
+
+    Cached papers are returned first. The rest run back to back in a single
+    inference-pool slot with one shared writer agent, so the agent's prompt
+    prefix stays evaluated in the model context between papers. Papers that
+    resolve to the same source are generated once.
+    """
+    papers = [paper.strip() for paper in request.papers if paper.strip()]
+    if not papers:
+        raise HTTPException(status_code=400, detail="No papers given.")
+    if len(papers) > BATCH_MAX_PAPERS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_PAPERS} papers per batch.")
+
+    writer = summary_writer()
+    ready = []
+    failed = []
+    pending = {}  # cache key -> (crew, inputs, [(position, paper, store_keys, summary_id)])
+    for position, paper in enumerate(papers):
+        try:
+            crew, source, inputs, store_keys, summary_id = batch_summary_job(
+                paper, writer, http_request, request.search_id)
+        except HTTPException as e:
+            failed.append({"position": position, "paper": paper, "error": e.detail})
+            continue
+        key = summary_key(source, crew)
+        target = (position, paper, store_keys, summary_id)
+        summary = summary_cache.get(key)
+        if summary is not None:
+            ready.append((summary, True, target))
+        elif key in pending:
+            pending[key][2].append(target)
+        else:
+            pending[key] = (crew, inputs, [target])
+
+    def generate():
+        for key, (crew, inputs, _) in pending.items():
+            # Another request may have finished this paper while we waited
+            summary = summary_cache.get(key)
+            if summary is None:
+                try:
+                    summary = cache_summary(key, list(crew.kickoff(inputs=inputs).values())[0])
+                except Exception as e:
+                    print(f"❌ Error summarizing {inputs.get('paper_id')}: {e}")
+                    yield key, None, str(e)
+                    continue
+            yield key, summary, None
+
+    # Admission happens here, so a full queue is a 503 before any output
+    results = stream_from_pool(llm_pool, generate) if pending else None
+
+    def line(summary, cached, target):
+        position, paper, store_keys, summary_id = target
+        for store_key in store_keys:
+            summary_cache.set(store_key, summary)
+        return json.dumps({"position": position, "paper": paper, "id": summary_id,
+                           "summary": summary, "cached": cached}) + "\n"
+
+    async def body():
+        start_time = time.time()
+        completed = len(ready)
+        for item in failed:
+            yield json.dumps(item) + "\n"
+        for summary, cached, target in ready:
+            yield line(summary, cached, target)
+        try:
+            if results is not None:
+                async for key, summary, error in results:
+                    for target in pending[key][2]:
+                        if error is None:
+                            completed += 1
+                            yield line(summary, False, target)
+                        else:
+                            failed.append({"position": target[0], "paper": target[1], "error": error})
+                            yield json.dumps(failed[-1]) + "\n"
+        except Exception as e:
+            print(f"❌ Error while streaming batch summaries: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            if results is not None:
+                await results.aclose()
+        print(f"⏱️ Batch of {len(papers)} papers finished in {time.time() - start_time:.2f} seconds")
+        yield json.dumps({"done": True, "completed": completed, "failed": len(failed),
+                          "seconds": round(time.time() - start_time, 3)}) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_summary(source: str, crew: CustomCrew, inputs: dict, store_keys, summary_id: str):
+    """Server-Sent Events of the summary tokens, cached once the stream completes.
+
+    Identical streams share one generation; one that starts late replays
+    the tokens so far. Raises QueueFullError before the response starts if
+    the pool is full.
+    """
+    key = summary_key(source, crew)
+    cached = summary_cache.get(key)
+    # Once every client of the generation has gone away, the model is freed for others
+    tokens = None if cached is not None else summary_stream_flight.stream(
+        key, lambda: stream_from_pool(llm_pool, lambda: crew.tasks[0].stream(inputs)))
+
+    async def events():
+        start_time = time.time()
+        parts = []
+        try:
+            if cached is not None:
+                final_summary = cached
+                yield sse_event("token", {"text": cached})
+            else:
+                async for token in tokens:
+                    if not parts:
+                        print(f"⏱️ Time to first token: {time.time() - start_time:.2f} seconds")
+                    parts.append(token)
+                    yield sse_event("token", {"text": token})
+                final_summary = cache_summary(key, "".join(parts))
+            for store_key in store_keys:
+                summary_cache.set(store_key, final_summary)
+            yield sse_event("done", {"summary": final_summary, "id": summary_id})
+        except Exception as e:
+            print(f"❌ Error while streaming summary: {e}")
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            if tokens is not None:
+                await tokens.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    outputs = crew.kickoff(inputs={"paper_id": link})
-    # Extract the final string from the response
-    raw_summary = list(outputs.values())[0]
-    
-    # Clean up the summary by removing references, citations, and formatting artifacts
-    final_summary = clean_summary(raw_summary.strip())
 
-    # Store in cache
-    cache[paper_index] = final_summary
-    return Response(content=final_summary, media_type="text/plain")
+@app.post("/summarize-direct/stream")
+async def summarize_direct_stream(request: DirectPaperRequest):
+    crew, source, inputs = direct_summary_job(request.paper_id.strip())
+    summary_id = str(uuid4())
+    return stream_summary(source, crew, inputs, [inputs["paper_id"], summary_id], summary_id)
+
+@app.get("/summarize/{paper_index}/stream")
+async def summarize_stream(paper_index: int, request: Request, search_id: str = None):
+    paper = search_result(request, paper_index, search_id)
+    crew, source, inputs = result_summary_job(paper)
+    return stream_summary(source, crew, inputs, [f"paper:{paper['key']}"], paper["key"])
+
+def audio_file_response(request: Request, path: Path, etag: str, filename: str):
+    """Serve an audio artifact with validators and single-range support."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Audio file not found. Generate it again.")
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        # The URL is keyed by paper, not content, so revalidate; a 304 costs nothing
+        "Cache-Control": "no-cache",
+        "Content-Disposition": f"inline; filename={filename}",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if not range_header or request.headers.get("if-range", etag) != etag:
+        return FileResponse(path=path, media_type="audio/wav", headers=headers)
+
+    # A Range we cannot parse (several ranges, other units, bad syntax) is
+    # ignored as RFC 9110 asks, and the whole file is sent
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return FileResponse(path=path, media_type="audio/wav", headers=headers)
+    size = stat.st_size
+    if match.group(1):
+        start = int(match.group(1))
+        if match.group(2) and int(match.group(2)) < start:
+            return FileResponse(path=path, media_type="audio/wav", headers=headers)
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    else:
+        # Suffix range: the last N bytes; "-0" asks for none of them
+        suffix = int(match.group(2))
+        start = max(size - suffix, 0) if suffix else size
+        end = size - 1
+    if start >= size:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+    def read_range(chunk_size=64 * 1024):
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
 
-# Remove the audio generation cache - always generate new audio files
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(read_range(), status_code=206,
+                             media_type="audio/wav", headers=headers)
+
+def lookup_summary(paper_id: str) -> str:
+    # Paper keys of search results first, then upload and summary ids
+    summary_text = summary_cache.get(f"paper:{paper_id}")
+    if summary_text is None:
+        summary_text = summary_cache.get(paper_id)
+    if summary_text is None:
+        raise HTTPException(status_code=404, detail="No summary found. Summarize first.")
+    return summary_text
+
+def require_speech(summary_text: str):
+    try:
+        sentences_to_speak(summary_text)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def require_espeak():
+    # Memoized, so this no longer spawns espeak on every request
+    if espeak_required() and not check_espeak():
+        instructions = install_instructions()
+        error_msg = f"Missing dependency: espeak not found. {instructions}"
+        raise HTTPException(status_code=500, detail=error_msg)
+
+# Audio is cached as files named by a hash of the summary text and voice settings
 @app.post("/audio/{paper_id}")
 @app.get("/audio/{paper_id}")  # Keep GET for backward compatibility
-async def get_audio(paper_id: str):
-    # Try to convert to int for backwards compatibility with search results
-    try:
-        numeric_id = int(paper_id)
-        if numeric_id in cache:
-            summary_text = cache[numeric_id]
-        else:
-            # If not found, check if the string ID exists in cache
-            if paper_id in cache:
-                summary_text = cache[paper_id]
-            else:
-                raise HTTPException(status_code=404, detail="No summary found. Summarize first.")
-    except ValueError:
-        # Handle as string ID
-        if paper_id in cache:
-            summary_text = cache[paper_id]
-        else:
-            raise HTTPException(status_code=404, detail="No summary found. Summarize first.")
+async def get_audio(paper_id: str, request: Request):
+    summary_text = lookup_summary(paper_id)
+    artifact_key = audio_artifact_key(summary_text)
+    output_path = AUDIO_DIR / f"{artifact_key}.wav"
     
-    # Set a consistent path for audio files
-    audio_file = f"uploads/audio/audio_{paper_id}.mp3"
-    output_path = Path(audio_file)
-    
-    # Always delete the existing audio file to force regeneration
-    if output_path.exists():
+    if not output_path.exists():
         try:
-            output_path.unlink()
-            print(f"Deleted existing audio file: {output_path}")
+            require_speech(summary_text)
+            require_espeak()
+            print(f"Generating new audio for paper ID: {paper_id}")
+            # Concurrent requests for the same text share one synthesis
+            await audio_flight.do(
+                artifact_key,
+                lambda: tts_pool.run(generate_audio_file, summary_text, str(output_path))
+            )
+        except ImportError:
+            raise HTTPException(
+                status_code=500, 
+                detail="Text-to-Speech library not installed. Run 'pip install TTS' to install."
+            )
+        except (HTTPException, QueueFullError):
+            raise  # Re-raise HTTPExceptions and load shedding
         except Exception as e:
-            print(f"Warning: Could not delete existing audio file: {e}")
+            print(f"Error generating audio: {str(e)}")
+            raise HTTPException(
+                status_code=500, 
+                detail=f"Failed to generate audio: {str(e)}"
+            )
     
-    try:
-        print(f"Generating new audio for paper ID: {paper_id}")
-        
-        # Always generate a new audio file
+    audio_cache.set(paper_id, {
+        "artifact": artifact_key,
+        "path": str(output_path),
+        "text_length": len(summary_text),
+        "voice": voice_settings(),
+    })
+
+    return audio_file_response(request, output_path, f'"{artifact_key}"',
+                               f"audio_{paper_id}.wav")
+
+@app.get("/audio/{paper_id}/stream")
+async def stream_audio(paper_id: str, request: Request):
+    """Stream WAV audio sentence by sentence while it is being synthesized."""
+    summary_text = lookup_summary(paper_id)
+    artifact_key = audio_artifact_key(summary_text)
+    output_path = AUDIO_DIR / f"{artifact_key}.wav"
+    if output_path.exists():
+        return audio_file_response(request, output_path, f'"{artifact_key}"',
+                                   f"audio_{paper_id}.wav")
+    require_speech(summary_text)
+    require_espeak()
+
+    # Sentences are synthesized in parallel and relayed in order; the full
+    # file is saved once the stream completes, for later range requests
+    chunks = stream_from_pool(
+        tts_pool, lambda: generate_audio_stream(summary_text, str(output_path)))
+
+    async def body():
+        start_time = time.time()
+        started = False
         try:
-            from audio_generator import check_espeak, install_instructions, generate_audio_file
-            
-            if not check_espeak():
-                instructions = install_instructions()
-                error_msg = f"Missing dependency: espeak not found. {instructions}"
-                raise HTTPException(status_code=500, detail=error_msg)
-            
-            # Generate the audio file
-            generate_audio_file(summary_text, str(output_path))
-        except ImportError:
-            # If audio_generator.py doesn't exist, try direct TTS import
-            try:
-                from TTS.api import TTS
-                tts = TTS(model_name="tts_models/en/ljspeech/vits", gpu=False)
-                tts.tts_to_file(text=summary_text[:2000], file_path=str(output_path))
-            except ImportError:
-                raise HTTPException(
-                    status_code=500, 
-                    detail="Text-to-Speech library not installed. Run 'pip install TTS' to install."
-                )
-            except Exception as e:
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"TTS error: {str(e)}"
-                )
-    except HTTPException:
-        raise  # Re-raise HTTPExceptions
-    except Exception as e:
-        print(f"Error generating audio: {str(e)}")
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Failed to generate audio: {str(e)}"
-        )
-    
-    # Return the audio file with cache prevention headers
-    return FileResponse(
-        path=output_path, 
-        media_type="audio/mpeg",
-        headers={
-            "Content-Disposition": f"attachment; filename=audio_{paper_id}.mp3",
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0",
-            # Add a random value to prevent any caching
-            "ETag": f"\"{uuid4()}\"", 
-        }
-    )
+            async for pcm, sample_rate in chunks:
+                if not started:
+                    print(f"⏱️ Time to first audio: {time.time() - start_time:.2f} seconds")
+                    yield wav_header(sample_rate)
+                    started = True
+                yield pcm
+        except Exception as e:
+            print(f"❌ Error while streaming audio: {e}")
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(body(), media_type="audio/wav",
+                             headers={"Cache-Control": "no-cache"})
+
+# Background jobs: submitting returns a job id at once and a separate worker
+# process (job_worker.py) does the work, so nothing depends on the connection
+job_store = JobStore()
+
+def job_accepted(job: dict):
+    return JSONResponse(status_code=202, content={
+        "id": job["id"], "status": job["status"], "url": f"/jobs/{job['id']}"})
+
+@app.post("/jobs/summarize-direct")
+async def submit_direct_summary(request: DirectPaperRequest):
+    return job_accepted(job_store.submit("summarize-direct", {"paper_id": request.paper_id.strip()}))
+
+@app.post("/jobs/summarize/{paper_index}")
+async def submit_result_summary(paper_index: int, request: Request, search_id: str = None):
+    # Resolve the search result now, so the job does not depend on the session
+    paper = search_result(request, paper_index, search_id)
+    return job_accepted(job_store.submit("summarize-paper", {
+        "key": paper["key"], "link": paper["link"], "title": paper["title"]}))
+
+@app.post("/jobs/upload-pdf", openapi_extra=UPLOAD_OPENAPI)
+async def submit_pdf_summary(request: Request):
+    file_id, file_location, digest = await save_upload(request)
+    return job_accepted(job_store.submit("upload-pdf", {
+        "file_id": file_id, "path": str(file_location), "digest": digest}))
+
+@app.post("/jobs/audio/{paper_id}")
+async def submit_audio(paper_id: str):
+    summary_text = lookup_summary(paper_id)
+    require_speech(summary_text)
+    return job_accepted(job_store.submit("audio", {"paper_id": paper_id, "summary": summary_text}))
+
+@app.get("/jobs")
+async def list_jobs(status: str = None, limit: int = 50):
+    return job_store.list(status=status, limit=min(limit, 500))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+def publish_job_summary(result: dict) -> dict:
+    """Store a finished job's summary under its ids, as part of completing the job.
+
+    Workers write to the shared cache backend (CACHE_BACKEND=sqlite), so
+    /audio and friends find the summary whether or not anyone polls the job.
+    """
+    for store_key in result["store_keys"]:
+        summary_cache.set(store_key, result["summary"])
+    return result
+
+@job_handler("summarize-direct")
+def direct_summary_worker(payload: dict, progress):
+    crew, source, inputs = direct_summary_job(payload["paper_id"])
+    progress(0.1, "Generating summary")
+    summary = generate_summary(source, crew, inputs)
+    summary_id = str(uuid4())
+    return publish_job_summary({"id": summary_id, "summary": summary,
+                                "store_keys": [inputs["paper_id"], summary_id]})
+
+@job_handler("summarize-paper")
+def result_summary_worker(payload: dict, progress):
+    crew, source, inputs = paper_summary_job(payload["link"], payload["title"])
+    progress(0.1, "Generating summary")
+    summary = generate_summary(source, crew, inputs)
+    return publish_job_summary({"id": payload["key"], "summary": summary,
+                                "store_keys": [f"paper:{payload['key']}"]})
+
+@job_handler("upload-pdf")
+def pdf_summary_worker(payload: dict, progress):
+    sections = extract_sections(payload["path"], payload["digest"])
+    progress(0.2, f"Extracted {sections['pages']} pages")
+    crew, source, inputs, prepare, variant = pdf_summary_job(payload["path"], payload["digest"], sections)
+    summary = generate_summary(source, crew, inputs, prepare=prepare, variant=variant)
+    return publish_job_summary({"id": payload["file_id"], "summary": summary,
+                                "store_keys": [payload["file_id"]]})
+
+@job_handler("audio")
+def audio_worker(payload: dict, progress):
+    artifact_key = audio_artifact_key(payload["summary"])
+    output_path = AUDIO_DIR / f"{artifact_key}.wav"
+    if not output_path.exists():
+        require_espeak()
+        generate_audio_file(payload["summary"], str(output_path),
+                            progress=lambda done, total: progress(done / total, f"Sentence {done} of {total}"))
+    return {"id": payload["paper_id"], "artifact": artifact_key, "url": f"/audio/{payload['paper_id']}"}
 
 # Helper function to clean up summaries
+@stage("clean_summary")
 def clean_summary(raw_text: str) -> str:
     # Remove reference sections
     if "[REFERENCES]" in raw_text:
         raw_text = raw_text.split("[REFERENCES]")[0]
     
     # Remove any URLs, citations, and other common artifacts
-    import re
     raw_text = re.sub(r'http[s]?://\S+', '', raw_text)  # Remove URLs
     raw_text = re.sub(r'\[\d+\]', '', raw_text)         # Remove citations like [1]
     raw_text = re.sub(r'\n+', ' ', raw_text)            # Replace line breaks with spaces
@@ -431,4 +975,42 @@ def clean_summary(raw_text: str) -> str:
 
 @app.get("/health")
 async def health_check():
-    return Response(content="ok", media_type="text/plain")
\ No newline at end of file
+    return Response(content="ok", media_type="text/plain")
+
+@app.get("/stats")
+async def stats():
+    return {"models": model_stats(), "tts": get_tts_pool().stats(), "pools": pool_stats(), "singleflight": flight_stats(),
+            "prompt_prefix": prefix_cache_stats(),
+            "jobs": job_store.counts(),
+            "uploads": pdf_store.stats(),
+            "arxiv_index": arxiv_index.stats() if arxiv_index is not None else None,
+            "tools": {spec.name: spec.stats() for spec in (process_pdf, summarize_text, generate_audio)},
+            "caches": cache_stats(),
+            "semantic_cache": query_cache.stats()}
+
+def collect_stats():
+    """Queue depth, cache and job figures from the stats above, as Prometheus samples."""
+    pools = pool_stats()
+    caches = {**cache_stats(), "semantic_queries": query_cache.stats(), "prompt_prefix": prefix_cache_stats()}
+    yield ("paper_pool_running", "gauge", "Jobs running on each inference pool.",
+           [({"pool": name}, stats["running"]) for name, stats in pools.items()])
+    yield ("paper_pool_waiting", "gauge", "Jobs queued for each inference pool.",
+           [({"pool": name}, stats["waiting"]) for name, stats in pools.items()])
+    yield ("paper_pool_rejected_total", "counter", "Requests shed because a pool queue was full.",
+           [({"pool": name}, stats["rejected"]) for name, stats in pools.items()])
+    yield ("paper_cache_hits_total", "counter", "Cache hits.",
+           [({"cache": name}, stats["hits"]) for name, stats in caches.items()])
+    yield ("paper_cache_misses_total", "counter", "Cache misses.",
+           [({"cache": name}, stats["misses"]) for name, stats in caches.items()])
+    yield ("paper_cache_hit_ratio", "gauge", "Share of cache lookups that hit.",
+           [({"cache": name}, stats["hit_rate"]) for name, stats in caches.items()])
+    yield ("paper_singleflight_duplicates_total", "counter", "Requests that joined an identical one in flight.",
+           [({"flight": name}, stats["duplicates"]) for name, stats in flight_stats().items()])
+    yield ("paper_jobs", "gauge", "Background jobs by status.",
+           [({"status": status}, count) for status, count in job_store.counts().items()])
+
+register_collector(collect_stats)
+
+@app.get("/metrics")
+async def metrics():
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
\ No newline at end of file
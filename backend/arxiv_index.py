@@ -0,0 +1,256 @@
+"""Local full-text index over arXiv metadata snapshots, ranked with SQLite FTS5 BM25.
+
+Snapshots are the public arXiv metadata dump: one JSON object per line with
+id, title, abstract, authors, categories and update_date. Files are ingested
+incrementally; a file that only grew is resumed from where the last run
+stopped, and a paper seen again (a newer version) replaces its old entry.
+
+    python arxiv_index.py ingest [FILE_OR_DIR ...]
+    python arxiv_index.py search "graph neural networks"
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARXIV_INDEX_PATH = os.getenv("ARXIV_INDEX_PATH", "./uploads/arxiv_index.db")
+ARXIV_SNAPSHOT_DIR = os.getenv("ARXIV_SNAPSHOT_DIR", "./data/arxiv")
+INGEST_BATCH_SIZE = 5000
+# BM25 column weights for title, abstract and authors
+BM25_WEIGHTS = (10.0, 1.0, 0.5)
+SNAPSHOT_PATTERNS = ("*.json", "*.jsonl", "*.json.gz", "*.jsonl.gz")
+# Bytes at the start of a file, and just before the resume point, that must
+# be unchanged for an ingest to resume instead of starting over
+FINGERPRINT_HEAD = 64 * 1024
+FINGERPRINT_TAIL = 4 * 1024
+
+
+class ArxivIndex:
+    def __init__(self, path=ARXIV_INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._ingest_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS papers (
+                    rowid INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL UNIQUE,
+                    title TEXT NOT NULL,
+                    abstract TEXT NOT NULL,
+                    authors TEXT NOT NULL,
+                    categories TEXT,
+                    updated TEXT
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+                    title, abstract, authors, content='papers', content_rowid='rowid',
+                    tokenize='porter unicode61'
+                );
+                CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+                    INSERT INTO papers_fts (rowid, title, abstract, authors)
+                    VALUES (new.rowid, new.title, new.abstract, new.authors);
+                END;
+                CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+                    INSERT INTO papers_fts (papers_fts, rowid, title, abstract, authors)
+                    VALUES ('delete', old.rowid, old.title, old.abstract, old.authors);
+                    INSERT INTO papers_fts (rowid, title, abstract, authors)
+                    VALUES (new.rowid, new.title, new.abstract, new.authors);
+                END;
+                CREATE TABLE IF NOT EXISTS ingested_files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    byte_offset INTEGER NOT NULL,
+                    records INTEGER NOT NULL,
+                    finished_at REAL,
+                    fingerprint TEXT
+                );
+            """)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(ingested_files)")]
+            if "fingerprint" not in columns:
+                # Entries from before fingerprints cannot prove a resume is safe; they start over
+                conn.execute("ALTER TABLE ingested_files ADD COLUMN fingerprint TEXT")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def paper_count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def available(self) -> bool:
+        return self._connect().execute("SELECT 1 FROM papers LIMIT 1").fetchone() is not None
+
+    @staticmethod
+    def _row(record):
+        clean = lambda text: " ".join((text or "").split())
+        return (record["id"], clean(record.get("title")), clean(record.get("abstract")),
+                clean(record.get("authors")), record.get("categories"), record.get("update_date"))
+
+    def _upsert(self, conn, rows):
+        conn.executemany("""
+            INSERT INTO papers (id, title, abstract, authors, categories, updated)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                title = excluded.title, abstract = excluded.abstract, authors = excluded.authors,
+                categories = excluded.categories, updated = excluded.updated
+            WHERE excluded.updated IS NOT papers.updated""", rows)
+
+    @staticmethod
+    def _fingerprint(path, offset):
+        """SHA-256 of the offset, the file's first bytes and the bytes just before offset."""
+        digest = hashlib.sha256(str(offset).encode("ascii"))
+        with open(path, "rb") as f:
+            digest.update(f.read(min(offset, FINGERPRINT_HEAD)))
+            tail_start = max(offset - FINGERPRINT_TAIL, FINGERPRINT_HEAD)
+            if tail_start < offset:
+                f.seek(tail_start)
+                digest.update(f.read(offset - tail_start))
+        return digest.hexdigest()
+
+    def ingest_file(self, path) -> int:
+        """Index new records of one snapshot file; returns how many were read."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        conn = self._connect()
+        done = conn.execute(
+            "SELECT size, mtime, byte_offset, finished_at, fingerprint FROM ingested_files WHERE path = ?",
+            (path,)).fetchone()
+        if done and done[0] == stat.st_size and done[1] == stat.st_mtime and done[3]:
+            return 0
+        compressed = path.endswith(".gz")
+        # Plain files that only grew resume where they stopped; gzip cannot seek cheaply.
+        # Anything else at the same path, e.g. a replaced snapshot, is read from the start.
+        offset = 0
+        if done and not compressed and 0 < done[2] <= stat.st_size and \
+                done[4] == self._fingerprint(path, done[2]):
+            offset = done[2]
+        elif done:
+            with conn:
+                conn.execute("UPDATE ingested_files SET records = 0 WHERE path = ?", (path,))
+
+        start_time = time.time()
+        records = 0
+        rows = []
+        opener = gzip.open if compressed else open
+        with self._ingest_lock, opener(path, "rb") as f:
+            if offset:
+                f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Still being written; picked up next time
+                offset += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rows.append(self._row(json.loads(line)))
+                except (ValueError, KeyError) as e:
+                    print(f"⚠️ Skipping malformed record in {path}: {e}")
+                    continue
+                if len(rows) >= INGEST_BATCH_SIZE:
+                    records += self._commit_batch(conn, path, stat, offset, rows)
+                    rows = []
+            records += self._commit_batch(conn, path, stat, offset, rows, finished=True)
+        print(f"📚 Indexed {records} arXiv records from {path} in {time.time() - start_time:.2f} seconds")
+        return records
+
+    def _commit_batch(self, conn, path, stat, offset, rows, finished=False):
+        # Rows and the file offset commit together, so an interrupted ingest resumes exactly
+        fingerprint = None if path.endswith(".gz") else self._fingerprint(path, offset)
+        with conn:
+            self._upsert(conn, rows)
+            conn.execute("""
+                INSERT INTO ingested_files (path, size, mtime, byte_offset, records, finished_at, fingerprint)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET
+                    size = excluded.size, mtime = excluded.mtime, byte_offset = excluded.byte_offset,
+                    records = ingested_files.records + excluded.records,
+                    finished_at = excluded.finished_at, fingerprint = excluded.fingerprint""",
+                         (path, stat.st_size, stat.st_mtime, offset, len(rows),
+                          time.time() if finished else None, fingerprint))
+        return len(rows)
+
+    def ingest_directory(self, directory=ARXIV_SNAPSHOT_DIR) -> int:
+        """Index every snapshot file in a directory that is new or has changed."""
+        if not os.path.isdir(directory):
+            return 0
+        files = sorted({p for pattern in SNAPSHOT_PATTERNS for p in Path(directory).glob(pattern)})
+        return sum(self.ingest_file(str(p)) for p in files)
+
+    @staticmethod
+    def _match_expression(query, operator):
+        # Quote every word so user input is never parsed as FTS5 syntax
+        terms = re.findall(r"\w+", query.lower())
+        return f" {operator} ".join(f'"{term}"' for term in terms)
+
+    def search(self, query, limit=5):
+        """Best-matching papers for a free-text query, all terms first, then any term."""
+        conn = self._connect()
+        for operator in ("AND", "OR"):
+            expression = self._match_expression(query, operator)
+            if not expression:
+                return []
+            rows = conn.execute(f"""
+                SELECT p.id, p.title, p.authors, p.categories, p.updated,
+                       bm25(papers_fts, {', '.join(map(str, BM25_WEIGHTS))}) AS score
+                FROM papers_fts JOIN papers p ON p.rowid = papers_fts.rowid
+                WHERE papers_fts MATCH ?
+                ORDER BY score LIMIT ?""", (expression, limit)).fetchall()
+            if rows:
+                return [{
+                    "id": paper_id,
+                    "title": title,
+                    "link": f"https://arxiv.org/abs/{paper_id}",
+                    "authors": authors,
+                    "categories": categories,
+                    "updated": updated,
+                    # bm25() is lower-is-better; flip it for readability
+                    "score": round(-score, 3),
+                } for paper_id, title, authors, categories, updated, score in rows]
+        return []
+
+    def stats(self):
+        conn = self._connect()
+        files, records = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(records), 0) FROM ingested_files").fetchone()
+        return {"papers": self.paper_count(), "files": files, "records_read": records}
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in ("ingest", "search"):
+        print(__doc__)
+        return 1
+    index = ArxivIndex()
+    if argv[1] == "ingest":
+        for target in argv[2:] or [ARXIV_SNAPSHOT_DIR]:
+            if os.path.isdir(target):
+                index.ingest_directory(target)
+            else:
+                index.ingest_file(target)
+        print(index.stats())
+    else:
+        start_time = time.time()
+        for paper in index.search(" ".join(argv[2:]), limit=10):
+            print(f"{paper['score']:8.3f}  {paper['id']}  {paper['title']}")
+        print(f"⏱️ {(time.time() - start_time) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,12 +1,38 @@
 """Simple audio generation module with fallbacks for missing dependencies."""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
+import hashlib
+import json
+import multiprocessing
 import os
+import queue
+import re
+import struct
 import subprocess
 import sys
 import platform
+import threading
+import time
+import wave
+from llm_registry import model_server_client, use_local_models
+from metrics import STAGE_SECONDS, record_synthesis
 
+TTS_MODEL_NAME = os.getenv("TTS_MODEL_NAME", "tts_models/en/ljspeech/vits")
+# One engine per concurrent synthesis; defaults to the TTS executor's width
+TTS_POOL_SIZE = int(os.getenv("TTS_POOL_SIZE", os.getenv("TTS_CONCURRENCY", "1")))
+# Worker processes that synthesize sentences in parallel, each with its own
+# engine; 0 synthesizes in this process using the engine pool instead
+TTS_PROCESSES = int(os.getenv("TTS_PROCESSES", str(max(1, min(4, (os.cpu_count() or 2) // 2)))))
+# "fake" swaps Coqui TTS for fake_backends.FakeTTSEngine (benchmarks without espeak)
+TTS_BACKEND = os.getenv("TTS_BACKEND", "coqui")
+MAX_SENTENCE_CHARS = 400
+SENTENCE_PAUSE_SECONDS = 0.25
+
+@lru_cache(maxsize=None)
 def check_espeak():
-    """Check if espeak or espeak-ng is installed."""
+    """Check if espeak or espeak-ng is installed (memoized per process)."""
     try:
         # Try to run espeak --version
         subprocess.run(
@@ -29,6 +55,11 @@ def check_espeak():
         except FileNotFoundError:
             return False
 
+def espeak_required():
+    """Whether this process synthesizes with engines that need espeak."""
+    # With a model server, espeak is needed where the engines run, not here
+    return model_server_client() is None and TTS_BACKEND != "fake"
+
 def install_instructions():
     """Return platform-specific espeak installation instructions."""
     system = platform.system().lower()
@@ -41,9 +72,264 @@ def install_instructions():
     else:
         return "Please install espeak for your platform"
 
-def generate_audio_file(text, output_path):
-    """Generate audio from text using TTS with dependency checks."""
-    if not check_espeak():
+class TTSEnginePool:
+    """Keeps loaded TTS engines around so requests never pay for model load."""
+
+    def __init__(self, model_name, size):
+        self.model_name = model_name
+        self.size = size
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.load_seconds = 0.0
+        self.syntheses = 0
+        self.synthesis_seconds = 0.0
+        self.audio_seconds = 0.0
+        self.last_rtf = None
+
+    def _create_engine(self):
+        start_time = time.time()
+        if TTS_BACKEND == "fake":
+            from fake_backends import FakeTTSEngine
+            return FakeTTSEngine()
+        # Lazy import TTS to avoid errors if it's not needed
+        from TTS.api import TTS
+        # Use CPU to avoid GPU-related issues
+        engine = TTS(model_name=self.model_name, gpu=False)
+        self.load_seconds += time.time() - start_time
+        print(f"🎵 Loaded TTS engine {self._created}/{self.size} in {time.time() - start_time:.2f} seconds")
+        return engine
+
+    def _reserve(self):
+        """Claim a slot for a new engine if the pool is not full yet."""
+        with self._lock:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _build(self):
+        try:
+            return self._create_engine()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def engine(self):
+        """Borrow an idle engine, creating one if the pool is not full yet."""
+        try:
+            engine = self._idle.get_nowait()
+        except queue.Empty:
+            engine = self._build() if self._reserve() else self._idle.get()
+        try:
+            yield engine
+        finally:
+            self._idle.put(engine)
+
+    def warm_up(self):
+        """Load every engine and run one short synthesis through each."""
+        while self._reserve():
+            engine = self._build()
+            engine.tts("Warming up.")
+            self._idle.put(engine)
+
+    def record(self, elapsed, duration):
+        """Account one synthesis, including ones run in worker processes."""
+        with self._lock:
+            self.syntheses += 1
+            self.synthesis_seconds += elapsed
+            self.audio_seconds += duration
+            self.last_rtf = elapsed / duration if duration else None
+        record_synthesis(elapsed, duration)
+
+    def synthesize(self, text):
+        """Return (samples, sample_rate, seconds) for the text."""
+        with self.engine() as engine:
+            start_time = time.time()
+            samples = engine.tts(text)
+            return samples, engine.synthesizer.output_sample_rate, time.time() - start_time
+
+    def stats(self):
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "engines": self._created,
+                "size": self.size,
+                "load_seconds": round(self.load_seconds, 3),
+                "syntheses": self.syntheses,
+                "audio_seconds": round(self.audio_seconds, 3),
+                "synthesis_seconds": round(self.synthesis_seconds, 3),
+                "mean_rtf": round(self.synthesis_seconds / self.audio_seconds, 3)
+                            if self.audio_seconds else None,
+                "last_rtf": round(self.last_rtf, 3) if self.last_rtf is not None else None,
+            }
+
+_tts_pool = TTSEnginePool(TTS_MODEL_NAME, TTS_POOL_SIZE)
+
+def get_tts_pool():
+    return _tts_pool
+
+def prepare_text(text):
+    """Clean text to avoid issues"""
+    return " ".join(text.split())
+
+def voice_settings():
+    """Everything besides the text that changes the synthesized audio."""
+    return {"model": TTS_MODEL_NAME, "pause": SENTENCE_PAUSE_SECONDS}
+
+def audio_artifact_key(text):
+    """Content hash naming the audio file for a text under the current voice settings."""
+    payload = json.dumps({"text": prepare_text(text), **voice_settings()}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def split_sentences(text):
+    """Split text into sentences small enough to synthesize independently."""
+    sentences = []
+    for sentence in re.split(r'(?<=[.!?])\s+', prepare_text(text)):
+        # Fold fragments like "e.g." or "Fig. 2" into the previous sentence
+        if sentences and len(sentence) < 20:
+            sentences[-1] += " " + sentence
+            continue
+        while len(sentence) > MAX_SENTENCE_CHARS:
+            cut = sentence.rfind(",", 0, MAX_SENTENCE_CHARS)
+            if cut < MAX_SENTENCE_CHARS // 2:
+                cut = sentence.rfind(" ", 0, MAX_SENTENCE_CHARS)
+            cut = cut if cut > 0 else MAX_SENTENCE_CHARS
+            sentences.append(sentence[:cut + 1].strip())
+            sentence = sentence[cut + 1:].strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+def sentences_to_speak(text):
+    """Sentences of the text; a text with none (empty or only whitespace) is a ValueError."""
+    sentences = split_sentences(text)
+    if not sentences:
+        raise ValueError("The text is empty; there is nothing to turn into speech")
+    return sentences
+
+def _to_pcm16(samples):
+    import numpy as np
+    audio = np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0)
+    return (audio * 32767).astype("<i2").tobytes()
+
+def _synthesize_pcm(sentence):
+    """Synthesize one sentence to 16-bit PCM; runs in a worker process or a thread."""
+    client = model_server_client()
+    if client is not None:
+        return tuple(client.request("synthesize", sentence=sentence))
+    samples, sample_rate, seconds = get_tts_pool().synthesize(sentence)
+    return _to_pcm16(samples), sample_rate, seconds
+
+def _init_worker_process():
+    # Worker processes exist only where the engines are local; they never
+    # forward to a model server, even if the setting reached them
+    use_local_models()
+    # Each worker process loads and warms exactly one engine of its own
+    global _tts_pool
+    _tts_pool = TTSEnginePool(TTS_MODEL_NAME, 1)
+    _tts_pool.warm_up()
+
+def _ping():
+    return os.getpid()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_sentence_executor():
+    """Process pool for sentence synthesis (thread pool when TTS_PROCESSES=0)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if model_server_client() is not None:
+                # The model server owns the engines; threads just wait on it
+                _executor = ThreadPoolExecutor(max_workers=max(1, TTS_PROCESSES),
+                                               thread_name_prefix="tts-remote")
+            elif TTS_PROCESSES > 0:
+                # spawn rather than fork: torch and llama.cpp threads do not survive fork
+                _executor = ProcessPoolExecutor(
+                    max_workers=TTS_PROCESSES,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker_process,
+                )
+            else:
+                _executor = ThreadPoolExecutor(max_workers=TTS_POOL_SIZE,
+                                               thread_name_prefix="tts-sentence")
+        return _executor
+
+def warm_up_tts():
+    """Load the engines that will serve requests before traffic arrives."""
+    if model_server_client() is not None:
+        return  # Loaded by the model server
+    if TTS_PROCESSES > 0:
+        executor = get_sentence_executor()
+        wait([executor.submit(_ping) for _ in range(TTS_PROCESSES)])
+    else:
+        get_tts_pool().warm_up()
+
+def wav_header(sample_rate, data_size=0xFFFFFFFF - 36):
+    """16-bit mono WAV header; the default sizes mark a stream of unknown length."""
+    return (b"RIFF" + struct.pack("<I", data_size + 36) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+            + b"data" + struct.pack("<I", data_size))
+
+def synthesize_sentences(text):
+    """Yield (pcm16_bytes, sample_rate) per sentence, in order, synthesized in parallel."""
+    executor = get_sentence_executor()
+    futures = [executor.submit(_synthesize_pcm, sentence) for sentence in sentences_to_speak(text)]
+    try:
+        for index, future in enumerate(futures):
+            pcm, sample_rate, seconds = future.result()
+            get_tts_pool().record(seconds, len(pcm) / 2 / sample_rate)
+            if index:
+                pcm = bytes(2 * int(sample_rate * SENTENCE_PAUSE_SECONDS)) + pcm
+            yield pcm, sample_rate
+    finally:
+        # Stop queued sentences if the consumer went away
+        for future in futures:
+            future.cancel()
+
+def generate_audio_stream(text, output_path):
+    """Yield PCM chunks as sentences finish, saving the complete audio to output_path.
+
+    Nothing is saved if the consumer stops early.
+    """
+    # Write next to the target and rename, so readers never see a partial file
+    partial_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.part"
+    writer = None
+    write_seconds = 0.0
+    try:
+        for pcm, sample_rate in synthesize_sentences(text):
+            start_time = time.perf_counter()
+            if writer is None:
+                writer = wave.open(partial_path, "wb")
+                writer.setnchannels(1)
+                writer.setsampwidth(2)
+                writer.setframerate(sample_rate)
+            writer.writeframes(pcm)
+            write_seconds += time.perf_counter() - start_time
+            yield pcm, sample_rate
+        if writer is not None:
+            start_time = time.perf_counter()
+            writer.close()
+            writer = None
+            os.replace(partial_path, output_path)
+            write_seconds += time.perf_counter() - start_time
+            STAGE_SECONDS.observe(write_seconds, stage="file_io.audio_write")
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+def generate_audio_file(text, output_path, progress=None):
+    """Generate audio from text using TTS with dependency checks.
+
+    progress, if given, is called with (sentences done, total sentences).
+    """
+    if espeak_required() and not check_espeak():
         instructions = install_instructions()
         error_msg = f"Missing dependency: espeak not found. {instructions}"
         print(f"❌ {error_msg}")
@@ -56,21 +342,16 @@ def generate_audio_file(text, output_path):
         
         print(f"🎵 Generating audio file at {output_path}")
         
-        # Lazy import TTS to avoid errors if it's not needed
         try:
-            from TTS.api import TTS
-            # Use CPU to avoid GPU-related issues
-            tts = TTS(model_name="tts_models/en/ljspeech/vits", gpu=False)
-            
-            # Clean and limit text to avoid issues
-            cleaned_text = text.replace('\n', ' ').strip()
-            if len(cleaned_text) > 2000:
-                cleaned_text = cleaned_text[:2000] + "..."
-                
-            print(f"Generating audio for text of length: {len(cleaned_text)}")
+            print(f"Generating audio for text of length: {len(prepare_text(text))}")
             
-            # Generate the audio file
-            tts.tts_to_file(text=cleaned_text, file_path=output_path)
+            # Sentences are synthesized in parallel with already-loaded engines
+            total = len(sentences_to_speak(text))
+            for done, _ in enumerate(generate_audio_stream(text, output_path), start=1):
+                if progress:
+                    progress(done, total)
+            if not output_file.exists():
+                raise RuntimeError(f"No audio was written to {output_path}")
             
             print(f"✅ Audio generation complete: {output_path}")
             return True
@@ -0,0 +1,345 @@
+"""Benchmark the API endpoints offline, with the fake LLM and TTS backends.
+
+    python benchmark.py                          # every scenario, 10 requests, 4 at a time
+    python benchmark.py -s search -s audio -n 50 -c 8 --llm-tps 30 --tts-rtf 0.5
+    python benchmark.py --save-baseline          # record the results as the baseline
+    python benchmark.py --compare                # compare with it; exits 1 on a regression
+
+The app runs in this process against an empty scratch directory, so every
+run starts with cold caches, and each request uses distinct inputs unless
+--distinct says otherwise. The fakes (fake_backends.py) take as long as a
+model of the configured speed would, so the numbers measure the code
+around the models: queueing, caching, crews, PDF handling and audio I/O.
+With --url, a running server is measured instead (start it with
+LLM_BACKEND=fake TTS_BACKEND=fake for comparable numbers); memory is then
+not sampled.
+"""
+import argparse
+import asyncio
+import atexit
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmark_baseline.json")
+SCENARIOS = ("search", "upload-pdf", "summarize-direct", "summarize", "audio")
+# Relative change beyond which a metric counts as a regression
+DEFAULT_TOLERANCE = 0.15
+RESULTS_PER_SEARCH = 5
+TOPICS = ("diffusion", "graph", "retrieval", "robotics", "speech", "protein", "quantum", "vision",
+          "language", "reinforcement", "federated", "causal", "sparse", "optimization", "privacy")
+
+
+def configure_environment(args):
+    """Select the fakes and isolate every file the app writes; must run before importing api."""
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "TTS_BACKEND": "fake",
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.llm_tps),
+        "FAKE_LLM_PROMPT_TOKENS_PER_SECOND": str(args.prompt_tps),
+        "FAKE_TTS_RTF": str(args.tts_rtf),
+        "CACHE_BACKEND": "memory",
+        "LLM_VERBOSE": "0",
+        "WARM_UP_ON_STARTUP": "0",
+        "ARXIV_INGEST_ON_STARTUP": "0",
+    })
+    os.environ.pop("MODEL_SERVER_ADDRESS", None)
+    # Sentences synthesized in this process, so peak RSS covers the TTS work
+    os.environ.setdefault("TTS_PROCESSES", "0")
+    sys.path.insert(0, BACKEND_DIR)
+    scratch = tempfile.mkdtemp(prefix="paper-bench-")
+    atexit.register(shutil.rmtree, scratch, ignore_errors=True)
+    os.chdir(scratch)
+
+
+def search_query(i):
+    rng = random.Random(i)
+    return " ".join(rng.sample(TOPICS, 3)) + f" methods {i}"
+
+
+def make_pdf(lines):
+    """Minimal one-page PDF with the given text lines."""
+    def escape(text):
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    content = "BT /F1 10 Tf 50 780 Td 12 TL " + " ".join(f"({escape(line)}) '" for line in lines) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        "/Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    pdf += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    pdf += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n").encode("latin-1")
+    return pdf
+
+
+def paper_pdf(i):
+    rng = random.Random(i)
+    topic = " ".join(rng.sample(TOPICS, 2))
+    body = [" ".join(rng.choice(TOPICS) for _ in range(12)) for _ in range(40)]
+    return make_pdf([f"Advances in {topic} {i}", "Abstract", *body[:6], "1 Introduction", *body[6:]])
+
+
+def summary_text(i):
+    rng = random.Random(i)
+    return " ".join(
+        " ".join(rng.choice(TOPICS) for _ in range(rng.randint(8, 14))).capitalize() + "."
+        for _ in range(5))
+
+
+async def prepare(client, scenario, count, distinct):
+    """Untimed setup; returns one coroutine factory per measured request."""
+    inputs = [i % distinct for i in range(count)]
+    if scenario == "search":
+        return [lambda i=i: client.post("/search", json={"query": search_query(i)}) for i in inputs]
+    if scenario == "upload-pdf":
+        return [lambda i=i: client.post("/upload-pdf", files={
+                    "file": (f"paper-{i}.pdf", paper_pdf(i), "application/pdf")}) for i in inputs]
+    if scenario == "summarize-direct":
+        return [lambda i=i: client.post("/summarize-direct", json={"paper_id": f"2301.{i + 1:05d}"})
+                for i in inputs]
+    if scenario == "summarize":
+        # Distinct papers come from enough distinct searches
+        search_ids = []
+        for i in range(math.ceil(distinct / RESULTS_PER_SEARCH)):
+            response = await client.post("/search", json={"query": f"setup {search_query(10_000 + i)}"})
+            response.raise_for_status()
+            search_ids.append(response.headers["X-Search-Id"])
+        return [lambda i=i: client.get(f"/summarize/{i % RESULTS_PER_SEARCH}",
+                                       params={"search_id": search_ids[i // RESULTS_PER_SEARCH]})
+                for i in inputs]
+    if scenario == "audio":
+        for i in range(distinct):
+            response = await client.post(f"/store-summary/bench-{i}", json={"summary": summary_text(i)})
+            response.raise_for_status()
+        return [lambda i=i: client.post(f"/audio/bench-{i}") for i in inputs]
+    raise ValueError(f"Unknown scenario '{scenario}'")
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    low, high = math.floor(position), math.ceil(position)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+class MemorySampler:
+    """Peak resident memory of this process, sampled in the background."""
+
+    def __init__(self, interval=0.05):
+        from llm_registry import resident_memory_mb
+        self._read = resident_memory_mb
+        self.interval = interval
+        self.peak = self._read() or 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._read() or 0.0)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._read() or 0.0)
+
+
+async def run_scenario(client, scenario, args, measure_memory):
+    requests = await prepare(client, scenario, args.requests, args.distinct or args.requests)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, statuses = [], []
+
+    async def one(make_request):
+        async with semaphore:
+            start_time = time.perf_counter()
+            try:
+                response = await make_request()
+                statuses.append(response.status_code)
+                if response.is_success:
+                    latencies.append(time.perf_counter() - start_time)
+            except Exception as e:
+                statuses.append(type(e).__name__)
+
+    sampler = MemorySampler() if measure_memory else contextlib.nullcontext()
+    with sampler:
+        start_time = time.perf_counter()
+        await asyncio.gather(*(one(make_request) for make_request in requests))
+        wall_seconds = time.perf_counter() - start_time
+
+    milliseconds = lambda seconds: round(seconds * 1000, 1) if seconds is not None else None
+    return {
+        "requests": len(requests),
+        "ok": len(latencies),
+        "shed": statuses.count(503),
+        "errors": len(statuses) - len(latencies) - statuses.count(503),
+        "p50_ms": milliseconds(percentile(latencies, 0.50)),
+        "p95_ms": milliseconds(percentile(latencies, 0.95)),
+        "p99_ms": milliseconds(percentile(latencies, 0.99)),
+        "mean_ms": milliseconds(sum(latencies) / len(latencies)) if latencies else None,
+        "throughput_rps": round(len(latencies) / wall_seconds, 3) if wall_seconds else None,
+        "wall_seconds": round(wall_seconds, 3),
+        "peak_rss_mb": round(sampler.peak, 1) if measure_memory else None,
+    }
+
+
+async def run(args):
+    import httpx
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+    else:
+        import api
+        # No lifespan events with an in-process transport; warm up like startup would
+        await asyncio.to_thread(api.warm_up_all)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app),
+                                   base_url="http://benchmark", timeout=None)
+    results = {}
+    async with client:
+        for scenario in args.scenarios:
+            log(f"▶️ {scenario}: {args.requests} requests, {args.concurrency} at a time")
+            results[scenario] = await run_scenario(client, scenario, args, measure_memory=not args.url)
+    return results
+
+
+def config_of(args):
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "distinct": args.distinct or args.requests,
+        "llm_tokens_per_second": args.llm_tps,
+        "prompt_tokens_per_second": args.prompt_tps,
+        "tts_rtf": args.tts_rtf,
+        "target": args.url or "in-process",
+    }
+
+
+def print_report(results):
+    columns = ("ok", "shed", "errors", "p50_ms", "p95_ms", "p99_ms", "throughput_rps", "peak_rss_mb")
+    log(f"\n{'scenario':<18}" + "".join(f"{name:>16}" for name in columns))
+    for scenario, result in results.items():
+        log(f"{scenario:<18}" + "".join(f"{str(result[name]):>16}" for name in columns))
+
+
+# Latency and memory should not grow, throughput should not drop
+HIGHER_IS_WORSE = ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+LOWER_IS_WORSE = ("throughput_rps",)
+
+
+def compare(results, baseline, tolerance):
+    """Print the change of every metric against the baseline; return the regressions."""
+    if baseline["config"] != results["config"]:
+        log(f"⚠️ Baseline was recorded with a different configuration: {baseline['config']}")
+    regressions = []
+    log(f"\nChange against baseline recorded {baseline['recorded_at']} (tolerance {tolerance:.0%}):")
+    for scenario, result in results["scenarios"].items():
+        before = baseline["scenarios"].get(scenario)
+        if before is None:
+            log(f"  {scenario}: not in baseline")
+            continue
+        changes = []
+        for metric in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if metric in HIGHER_IS_WORSE else change < -tolerance
+            changes.append(f"{metric} {change:+.1%}{' ❌' if worse else ''}")
+            if worse:
+                regressions.append(f"{scenario} {metric}: {old} -> {new}")
+        log(f"  {scenario}: " + ", ".join(changes))
+    return regressions
+
+
+_report = sys.stdout
+
+
+def log(message):
+    print(message, file=_report, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API with fake LLM and TTS backends.")
+    parser.add_argument("-s", "--scenario", dest="scenarios", action="append", choices=SCENARIOS,
+                        help="endpoint scenario to run (repeatable; default: all)")
+    parser.add_argument("-n", "--requests", type=int, default=10, help="measured requests per scenario")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--distinct", type=int, default=0,
+                        help="distinct inputs per scenario; fewer than --requests exercises the caches")
+    parser.add_argument("--llm-tps", type=float, default=40.0, help="fake LLM generation tokens/second")
+    parser.add_argument("--prompt-tps", type=float, default=400.0, help="fake LLM prompt tokens/second")
+    parser.add_argument("--tts-rtf", type=float, default=0.3, help="fake TTS real-time factor")
+    parser.add_argument("--url", help="measure a running server instead of an in-process app")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline results file")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare with the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative change that counts as a regression")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the server's own logging")
+    args = parser.parse_args()
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    baseline_path = os.path.abspath(args.baseline)
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    if not args.url:
+        configure_environment(args)
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            # Server logs go to the void; the report goes to the real stdout
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        scenarios = asyncio.run(run(args))
+
+    results = {
+        "config": config_of(args),
+        "scenarios": scenarios,
+        "platform": {"python": platform.python_version(), "machine": platform.machine(),
+                     "cpus": os.cpu_count()},
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    print_report(scenarios)
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        log(f"\n💾 Baseline saved to {baseline_path}")
+    elif args.compare:
+        if not os.path.exists(baseline_path):
+            log(f"⚠️ No baseline at {baseline_path}; run with --save-baseline first")
+            return 2
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            log("\n❌ Regressions:\n  " + "\n  ".join(regressions))
+            return 1
+        log("\n✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
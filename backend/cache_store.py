@@ -0,0 +1,207 @@
+"""Namespaced, bounded caches with an optional SQLite backend shared across workers."""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # "memory" or "sqlite"
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "./uploads/cache.db")
+DEFAULT_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+# A TTL of 0 keeps entries until they are evicted by size
+DEFAULT_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    """Per-process LRU store; lost on restart."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _entries(self, namespace):
+        return self._data.setdefault(namespace, OrderedDict())
+
+    def get(self, namespace, key):
+        with self._lock:
+            entries = self._entries(namespace)
+            item = entries.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, value = item
+            if expires_at is not None and expires_at < time.time():
+                del entries[key]
+                return _MISSING
+            entries.move_to_end(key)
+            return value
+
+    def set(self, namespace, key, value, expires_at, max_entries):
+        with self._lock:
+            entries = self._entries(namespace)
+            entries[key] = (expires_at, value)
+            entries.move_to_end(key)
+            while len(entries) > max_entries:
+                entries.popitem(last=False)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._entries(namespace).pop(key, None)
+
+    def size(self, namespace):
+        with self._lock:
+            return len(self._entries(namespace))
+
+
+class SQLiteBackend:
+    """On-disk LRU store shared by every worker process pointing at the same file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )""")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key)).fetchone()
+        if row is None:
+            return _MISSING
+        now = time.time()
+        with conn:
+            if row[1] is not None and row[1] < now:
+                conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+                return _MISSING
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                         (now, namespace, key))
+        return json.loads(row[0])
+
+    def set(self, namespace, key, value, expires_at, max_entries):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), expires_at, time.time()))
+            conn.execute("""
+                DELETE FROM cache WHERE namespace = ? AND key IN (
+                    SELECT key FROM cache WHERE namespace = ?
+                    ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)""",
+                         (namespace, namespace, max_entries))
+
+    def delete(self, namespace, key):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def size(self, namespace):
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM cache WHERE namespace = ?", (namespace,)).fetchone()
+        return row[0]
+
+
+class NamespacedCache:
+    """One logical cache (e.g. summaries) with its own size and TTL limits.
+
+    Keys are always strings; values must be JSON-serializable so they can
+    live in the SQLite backend.
+    """
+
+    def __init__(self, namespace, backend, max_entries=DEFAULT_MAX_ENTRIES,
+                 ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.namespace = namespace
+        self.backend = backend
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.backend.get(self.namespace, str(key))
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = time.time() + ttl if ttl else None
+        self.backend.set(self.namespace, str(key), value, expires_at, self.max_entries)
+
+    def delete(self, key):
+        self.backend.delete(self.namespace, str(key))
+
+    def __contains__(self, key):
+        return self.backend.get(self.namespace, str(key)) is not _MISSING
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.backend.size(self.namespace),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+_backend = None
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        if CACHE_BACKEND == "sqlite":
+            _backend = SQLiteBackend(CACHE_DB_PATH)
+        else:
+            _backend = MemoryBackend()
+    return _backend
+
+
+def get_cache(namespace):
+    """Return the cache for a namespace, configured from CACHE_<NAMESPACE>_* env vars."""
+    with _caches_lock:
+        if namespace not in _caches:
+            prefix = f"CACHE_{namespace.upper()}_"
+            _caches[namespace] = NamespacedCache(
+                namespace,
+                _get_backend(),
+                max_entries=int(os.getenv(prefix + "MAX_ENTRIES", str(DEFAULT_MAX_ENTRIES))),
+                ttl_seconds=float(os.getenv(prefix + "TTL_SECONDS", str(DEFAULT_TTL_SECONDS))),
+            )
+        return _caches[namespace]
+
+
+def cache_stats():
+    return {namespace: cache.stats() for namespace, cache in _caches.items()}
@@ -0,0 +1,32 @@
+"""Test setup: fake model backends and a scratch working directory.
+
+Backend modules read their settings from the environment when imported, so
+this runs first. The fake LLM and TTS stand-ins (fake_backends.py) answer
+without models, and every relative path (uploads, caches, job database)
+lands in a temporary directory instead of the checkout.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+collect_ignore = ["test_llama.py"]  # Manual smoke test against the real model
+
+os.environ.update({
+    "LLM_BACKEND": "fake",
+    "TTS_BACKEND": "fake",
+    "TTS_PROCESSES": "0",
+    "MODEL_SERVER_ADDRESS": "",
+    "CACHE_BACKEND": "memory",
+    "FAKE_LLM_TOKENS_PER_SECOND": "100000",
+    "FAKE_LLM_PROMPT_TOKENS_PER_SECOND": "1000000",
+    "FAKE_TTS_RTF": "0",
+    "SEMANTIC_CACHE_EMBEDDINGS": "hash",
+    "ARXIV_INGEST_ON_STARTUP": "0",
+    "WARM_UP_ON_STARTUP": "0",
+    "EVENT_LOG_LEVEL": "off",
+})
+
+_scratch = tempfile.mkdtemp(prefix="paper-tests-")
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.chdir(_scratch)
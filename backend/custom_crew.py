@@ -1,7 +1,155 @@
-from typing import List, Dict, Callable
+import contextvars
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Callable, Iterator, Optional
 from langchain_community.llms import LlamaCpp
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
+from cache_store import get_cache
+from metrics import enabled, event, stage
+
+AGENT_PROMPT_TEMPLATE = """[ROLE] {role}
+[GOAL] {goal}
+[BACKSTORY] {backstory}
+[CONTEXT] {context}
+[TASK] {task}
+Response:"""
+AGENT_PROMPT = PromptTemplate(
+    input_variables=["context", "task", "role", "goal", "backstory"],
+    template=AGENT_PROMPT_TEMPLATE
+)
+# Everything before [CONTEXT] depends only on the agent, so its KV state is reusable
+AGENT_PREFIX_TEMPLATE = AGENT_PROMPT_TEMPLATE[:AGENT_PROMPT_TEMPLATE.index("[CONTEXT]")]
+
+# The model starting another prompt section means the answer is over
+AGENT_STOP = ["\n[ROLE]", "\n[CONTEXT]", "\n[TASK]"]
+
+# LlamaCpp fields that change what a given prompt generates
+SAMPLING_PARAMS = ["temperature", "max_tokens", "top_p", "top_k", "repeat_penalty", "n_ctx"]
+
+def _digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def llm_identity(llm) -> Dict:
+    """Model file and sampling params, i.e. what makes two LLM handles interchangeable."""
+    model_path = getattr(llm, "model_path", None)
+    return {
+        "model": os.path.basename(model_path) if model_path else type(llm).__name__,
+        "params": {name: getattr(llm, name, None) for name in SAMPLING_PARAMS},
+    }
+
+# Results of LLM-backed tools, shared across workers like other generations
+tool_results = get_cache("tool_results")
+LOCAL_MEMO_SIZE = 128
+# Tasks a parallel crew runs at once. LLM calls on one model still take turns
+# through its lock, so this mostly overlaps tools, I/O and other models.
+CREW_MAX_WORKERS = int(os.getenv("CREW_MAX_WORKERS", "2"))
+
+class ToolSpec:
+    """A tool together with the task inputs it reads and what running it costs.
+
+    A tool only runs when its required inputs are present in the task
+    inputs, and receives them as keyword arguments. LLM-backed tools cost a
+    full generation, so their results are memoized in the shared cache per
+    input and model; cheap tools are memoized in-process.
+    """
+
+    def __init__(self, func: Callable, inputs: List[str], required: List[str] = None,
+                 llm_backed: bool = False, memoize: bool = True):
+        # Unwrap crewai Tool objects so the tool keeps its function name
+        self.func = getattr(func, "func", func)
+        self.name = getattr(self.func, "__name__", str(func))
+        self.inputs = list(inputs)
+        self.required = list(self.inputs if required is None else required)
+        self.llm_backed = llm_backed
+        self.memoize = memoize
+        self.calls = 0
+        self.hits = 0
+        self.skipped = 0
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def arguments(self, inputs: Dict) -> Optional[Dict]:
+        """Keyword arguments taken from the task inputs, or None if the tool cannot run."""
+        inputs = inputs or {}
+        present = {name: inputs[name] for name in self.inputs
+                   if inputs.get(name) not in (None, "")}
+        if not present or any(name not in present for name in self.required):
+            return None
+        return present
+
+    def run(self, arguments: Dict, llm=None):
+        if not self.memoize:
+            self.calls += 1
+            with stage(f"tool.{self.name}"):
+                return self.func(**arguments)
+
+        key = _digest({
+            "tool": self.name,
+            "arguments": arguments,
+            "llm": llm_identity(llm) if self.llm_backed and llm is not None else None,
+        })
+        if self.llm_backed:
+            result = tool_results.get(key)
+        else:
+            with self._lock:
+                result = self._memo.get(key)
+                if result is not None:
+                    self._memo.move_to_end(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        self.calls += 1
+        with stage(f"tool.{self.name}"):
+            result = self.func(**arguments)
+        if self.llm_backed:
+            tool_results.set(key, result)
+        else:
+            with self._lock:
+                self._memo[key] = result
+                while len(self._memo) > LOCAL_MEMO_SIZE:
+                    self._memo.popitem(last=False)
+        return result
+
+    def describe(self) -> Dict:
+        return {"inputs": self.inputs, "required": self.required, "llm_backed": self.llm_backed}
+
+    def stats(self) -> Dict:
+        return {**self.describe(), "calls": self.calls, "memo_hits": self.hits,
+                "skipped": self.skipped}
+
+def tool_spec(inputs: List[str], required: List[str] = None, llm_backed: bool = False,
+              memoize: bool = True):
+    """Declare which task inputs a tool reads and whether it calls the LLM."""
+    def decorator(func):
+        return ToolSpec(func, inputs, required=required, llm_backed=llm_backed, memoize=memoize)
+    return decorator
+
+def as_tool_spec(tool) -> ToolSpec:
+    """Wrap an undeclared callable, reading its parameters from the signature.
+
+    Nothing is known about its cost or side effects, so it is not memoized.
+    """
+    if isinstance(tool, ToolSpec):
+        return tool
+    func = getattr(tool, "func", tool)
+    parameters = inspect.signature(func).parameters.values()
+    return ToolSpec(
+        tool,
+        inputs=[p.name for p in parameters],
+        required=[p.name for p in parameters if p.default is inspect.Parameter.empty],
+        memoize=False,
+    )
 
 class CustomAgent:
     def __init__(self, role: str, goal: str, backstory: str, tools: List[Callable], 
@@ -9,82 +157,291 @@ class CustomAgent:
         self.role = role
         self.goal = goal
         self.backstory = backstory
-        # Handle tools that may not have a __name__ attribute
-        self.tools = {getattr(tool, "__name__", str(tool)): tool for tool in tools}
+        self.tools = {spec.name: spec for spec in map(as_tool_spec, tools)}
         self.llm = llm
         self.verbose = verbose
-        
-    def execute_task(self, task_description: str, context: str = "") -> str:
-        prompt = PromptTemplate(
-            input_variables=["context", "task", "role", "goal", "backstory"],
-            template="""[ROLE] {role}
-[GOAL] {goal}
-[BACKSTORY] {backstory}
-[CONTEXT] {context}
-[TASK] {task}
-Response:"""
-        )
-        
-        chain = LLMChain(
-            llm=self.llm,
-            prompt=prompt,
-            verbose=True  # Enable verbose logging
-        )
-        
-        print(f"Executing task with prompt:\n{prompt.format(context=context, task=task_description, role=self.role, goal=self.goal, backstory=self.backstory)}")
-        return chain.run({
+        # Built once per agent and generation settings; the model restores the
+        # saved KV state of the fixed prefix first. The prompt is logged as a
+        # debug event instead of by a verbose chain, so it is only formatted
+        # when wanted.
+        self._chains = {}
+        self.chain = self._chain({})
+
+    def _chain(self, limits: Dict) -> LLMChain:
+        key = json.dumps(limits, sort_keys=True)
+        chain = self._chains.get(key)
+        if chain is None:
+            chain = self._chains[key] = LLMChain(
+                llm=self.llm,
+                prompt=AGENT_PROMPT,
+                llm_kwargs={"prompt_prefix": self.prompt_prefix(), **limits}
+            )
+        return chain
+
+    def _log_prompt(self, task_description: str, context: str):
+        if self.verbose and enabled("debug"):
+            event("agent.prompt", "debug", role=self.role,
+                  prompt=self.format_prompt(task_description, context))
+
+    def execute_task(self, task_description: str, context: str = "",
+                     generation: Dict = None) -> str:
+        """Run one prompt; generation holds stop sequences and model kwargs such as max_tokens."""
+        self._log_prompt(task_description, context)
+        limits = dict(generation or {})
+        stop = limits.pop("stop", AGENT_STOP)
+        return self._chain(limits).run({
             "role": self.role,
             "goal": self.goal,
             "backstory": self.backstory,
             "context": context,
-            "task": task_description
+            "task": task_description,
+            "stop": stop,
+        })
+
+    def prompt_prefix(self) -> str:
+        """The start of every prompt this agent sends, identical across requests."""
+        return AGENT_PREFIX_TEMPLATE.format(role=self.role, goal=self.goal, backstory=self.backstory)
+
+    def fingerprint(self) -> str:
+        """Hash of everything about this agent that shapes its output."""
+        return _digest({
+            "template": AGENT_PROMPT_TEMPLATE,
+            "role": self.role,
+            "goal": self.goal,
+            "backstory": self.backstory,
+            **llm_identity(self.llm),
         })
 
+    def format_prompt(self, task_description: str, context: str = "") -> str:
+        return AGENT_PROMPT_TEMPLATE.format(
+            role=self.role,
+            goal=self.goal,
+            backstory=self.backstory,
+            context=context,
+            task=task_description
+        )
+
+    def stream_task(self, task_description: str, context: str = "",
+                    generation: Dict = None) -> Iterator[str]:
+        """Yield response tokens as the model produces them."""
+        self._log_prompt(task_description, context)
+        prompt = self.format_prompt(task_description, context)
+        limits = dict(generation or {})
+        stop = limits.pop("stop", AGENT_STOP)
+        for chunk in self.llm.stream(prompt, stop=stop, prompt_prefix=self.prompt_prefix(), **limits):
+            yield chunk
+
 class CustomTask:
     def __init__(self, description: str, expected_output: str, agent: CustomAgent, 
-                 tools: List[str], context: List[str] = None):
+                 tools: List[str], context: List[str] = None,
+                 depends_on: List["CustomTask"] = None, grammar: str = None,
+                 stop: List[str] = None, max_tokens: int = None, draft_tokens: int = None,
+                 inputs: Dict = None, upstream_input: str = None):
         self.description = description
         self.expected_output = expected_output
         self.agent = agent
         self.tools = tools
         self.context = context or []
+        # Tasks whose outputs this one needs; they are passed in as context
+        self.depends_on = depends_on or []
+        # Inputs of this task alone, over the crew's (e.g. the paper of one of several summaries)
+        self.inputs = dict(inputs or {})
+        # Tool input that receives the upstream outputs, so a tool can work on them
+        self.upstream_input = upstream_input
+        # GBNF grammar the output must match; generation ends once it is complete
+        self.grammar = grammar
+        self.stop = list(stop or [])
+        # Token budget for this task's answer, below the model-wide max_tokens
+        self.max_tokens = max_tokens
+        # Tokens the draft model proposes per pass when speculative decoding
+        # is on (DRAFT_MODEL_PATH); 0 turns it off for this task
+        self.draft_tokens = draft_tokens
+
+    def generation(self) -> Dict:
+        """Stop sequences and model kwargs that bound this task's answer."""
+        generation = {"stop": AGENT_STOP + self.stop}
+        if self.max_tokens:
+            generation["max_tokens"] = self.max_tokens
+        if self.grammar:
+            generation["grammar"] = self.grammar
+        if self.draft_tokens is not None:
+            generation["draft_tokens"] = self.draft_tokens
+        # Speculative decoding stats are reported per agent role
+        generation["draft_label"] = self.agent.role
+        return generation
         
-    def execute(self, inputs: Dict) -> str:
-        context = "\n".join(self.context)
-        task_input = self.description.format(**inputs)
+    def _prepare(self, inputs: Dict, upstream: List[str] = None):
+        inputs = {**inputs, **self.inputs}
+        if self.upstream_input and upstream:
+            inputs[self.upstream_input] = "\n\n".join(upstream)
+        with stage("prompt_build"):
+            context = "\n".join(self.context + list(upstream or []))
+            task_input = self.description.format(**inputs)
         
-        # Use tools if specified
+        # Only run tools whose declared inputs are present; a tool called with
+        # the wrong inputs would just add a wasted (possibly LLM) call
         for tool_name in self.tools:
-            if tool_name in self.agent.tools:
-                tool_result = self.agent.tools[tool_name](inputs)
-                context += f"\nTool {tool_name} output: {tool_result}"
+            spec = self.agent.tools.get(tool_name)
+            if spec is None:
+                continue
+            arguments = spec.arguments(inputs)
+            if arguments is None:
+                spec.skipped += 1
+                if self.agent.verbose:
+                    event("tool.skipped", "debug", tool=tool_name, needs=spec.required or spec.inputs)
+                continue
+            tool_result = spec.run(arguments, llm=self.agent.llm)
+            context += f"\nTool {tool_name} output: {tool_result}"
         
+        return task_input, context
+
+    def execute(self, inputs: Dict, upstream: List[str] = None) -> str:
+        task_input, context = self._prepare(inputs, upstream)
         return self.agent.execute_task(
             task_description=task_input,
-            context=context
+            context=context,
+            generation=self.generation()
         )
 
+    def stream(self, inputs: Dict, upstream: List[str] = None) -> Iterator[str]:
+        task_input, context = self._prepare(inputs, upstream)
+        return self.agent.stream_task(
+            task_description=task_input,
+            context=context,
+            generation=self.generation()
+        )
+
+    def fingerprint(self) -> str:
+        """Hash of the unformatted task prompt, its context and its agent, independent of inputs."""
+        return _digest({
+            "agent": self.agent.fingerprint(),
+            "description": self.description,
+            "expected_output": self.expected_output,
+            "tools": {name: self.agent.tools[name].describe()
+                      for name in self.tools if name in self.agent.tools},
+            "context": self.context,
+            "inputs": self.inputs,
+            "upstream_input": self.upstream_input,
+            "depends_on": [task.fingerprint() for task in self.depends_on],
+            # The draft length changes how fast the answer comes, not what it is
+            "generation": {key: value for key, value in self.generation().items()
+                           if key not in ("draft_tokens", "draft_label")},
+        })
+
+class CrewOutput(dict):
+    """Task outputs keyed by task description, in task order, plus per-task timings."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timings = {}
+        self.total_seconds = 0.0
+
 class CustomCrew:
+    """Runs tasks either one after another or as a dependency graph.
+
+    "sequential" runs tasks in order, each receiving the outputs of its
+    dependencies, or of every earlier task if it declares none. "parallel"
+    starts every task as soon as its dependencies have finished, at most
+    max_workers at a time.
+    """
+
     def __init__(self, tasks: List[CustomTask], agents: List[CustomAgent], 
-                 process: str = "sequential", verbose: bool = True):
+                 process: str = "sequential", verbose: bool = True,
+                 max_workers: int = CREW_MAX_WORKERS):
+        if process not in ("sequential", "parallel"):
+            raise ValueError(f"Unknown process '{process}', expected 'sequential' or 'parallel'")
         self.tasks = tasks
         self.agents = agents
         self.process = process
         self.verbose = verbose
-        
-    def kickoff(self, inputs: Dict = None) -> Dict:
+        self.max_workers = max(1, max_workers)
+        self._check_dependencies()
+
+    def _check_dependencies(self):
+        known = set(map(id, self.tasks))
+        for task in self.tasks:
+            for dependency in task.depends_on:
+                if id(dependency) not in known:
+                    raise ValueError(f"Task '{task.description[:50]}' depends on a task outside the crew")
+        # Kahn's algorithm: any task never freed sits on a cycle
+        remaining = {id(task): {id(d) for d in task.depends_on} for task in self.tasks}
+        while remaining:
+            ready = [task_id for task_id, deps in remaining.items() if not deps & remaining.keys()]
+            if not ready:
+                raise ValueError("Task dependencies contain a cycle")
+            for task_id in ready:
+                del remaining[task_id]
+        if self.process == "sequential":
+            position = {id(task): index for index, task in enumerate(self.tasks)}
+            for task in self.tasks:
+                if any(position[id(d)] > position[id(task)] for d in task.depends_on):
+                    raise ValueError(f"Task '{task.description[:50]}' depends on a later task; "
+                                     f"reorder the tasks or use process='parallel'")
+
+    def _run_task(self, task: CustomTask, inputs: Dict, upstream: List[str],
+                  timings: Dict, crew_start: float) -> str:
+        if self.verbose:
+            event("task.started", "info", task=task.description, agent=task.agent.role)
+        start_time = time.time()
+        with stage("task"):
+            result = task.execute(inputs, upstream=upstream)
+        timings[task.description] = {
+            "started_at": round(start_time - crew_start, 3),
+            "seconds": round(time.time() - start_time, 3),
+        }
+        if self.verbose:
+            event("task.finished", "info", task=task.description, agent=task.agent.role,
+                  seconds=timings[task.description]["seconds"], result=result[:200])
+        return result
+
+    def _run_sequential(self, inputs: Dict, timings: Dict, crew_start: float) -> Dict:
         results = {}
         context = []
-        
         for task in self.tasks:
-            if self.verbose:
-                print(f"Executing task: {task.description}")
-                
-            result = task.execute(inputs)
-            results[task.description] = result
-            context.append(result)
-            
-            if self.verbose:
-                print(f"Task result: {result[:200]}...")
-                
+            upstream = [results[id(d)] for d in task.depends_on] if task.depends_on else context
+            results[id(task)] = self._run_task(task, inputs, list(upstream), timings, crew_start)
+            context.append(results[id(task)])
+        return results
+
+    def _run_parallel(self, inputs: Dict, timings: Dict, crew_start: float) -> Dict:
+        results = {}
+        waiting = list(self.tasks)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="crew-task") as pool:
+            def launch_ready():
+                for task in list(waiting):
+                    if all(id(d) in results for d in task.depends_on):
+                        waiting.remove(task)
+                        upstream = [results[id(d)] for d in task.depends_on]
+                        # Tasks log and time under the trace of the request that started the crew
+                        future = pool.submit(contextvars.copy_context().run, self._run_task,
+                                             task, inputs, upstream, timings, crew_start)
+                        running[future] = task
+
+            launch_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        results[id(task)] = future.result()
+                    except Exception:
+                        for other in running:
+                            other.cancel()
+                        raise
+                launch_ready()
         return results
+
+    def kickoff(self, inputs: Dict = None) -> CrewOutput:
+        inputs = inputs or {}
+        timings = {}
+        crew_start = time.time()
+        if self.process == "parallel":
+            results = self._run_parallel(inputs, timings, crew_start)
+        else:
+            results = self._run_sequential(inputs, timings, crew_start)
+
+        output = CrewOutput((task.description, results[id(task)]) for task in self.tasks)
+        output.timings = {task.description: timings[task.description] for task in self.tasks}
+        output.total_seconds = round(time.time() - crew_start, 3)
+        return output
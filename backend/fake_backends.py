@@ -0,0 +1,194 @@
+"""Deterministic stand-ins for the LLM and TTS engines, for benchmarks on machines without the models.
+
+Select them with LLM_BACKEND=fake and TTS_BACKEND=fake. Outputs depend only
+on the prompt or text, and every call takes as long as the configured speed
+says it would on real hardware, so timings reflect the code around the models.
+"""
+import hashlib
+import os
+import random
+import time
+from typing import Iterator, List, Optional
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "20"))
+FAKE_LLM_PROMPT_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_PROMPT_TOKENS_PER_SECOND", "400"))
+# Length of a free-text answer; max_tokens still caps it
+FAKE_LLM_OUTPUT_TOKENS = int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", "120"))
+# Synthesis time divided by the duration of the audio produced
+FAKE_TTS_RTF = float(os.getenv("FAKE_TTS_RTF", "0.3"))
+FAKE_TTS_WORDS_PER_SECOND = 2.5
+FAKE_TTS_SAMPLE_RATE = 22050
+
+WORDS = ("model", "training", "attention", "graph", "diffusion", "language", "retrieval",
+         "benchmark", "transformer", "latent", "policy", "robust", "sparse", "vision",
+         "learning", "data", "results", "method", "network", "inference", "scaling")
+
+
+def _rng(text):
+    return random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+
+
+def count_tokens(text):
+    # Roughly what a LLaMA tokenizer gives for English prose
+    return max(1, len(text) // 4)
+
+
+class FakeLlamaCpp(LLM):
+    """Answers like LlamaCpp would, at a configured prompt-processing and generation speed.
+
+    Calls take turns on model_lock like a real llama.cpp context, so
+    contention between requests shows up in the timings too.
+    """
+
+    model_path: str = "fake-llama.gguf"
+    temperature: float = 0.7
+    max_tokens: int = 2000
+    top_p: float = 0.95
+    top_k: int = 40
+    repeat_penalty: float = 1.1
+    n_ctx: int = 2048
+    tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND
+    prompt_tokens_per_second: float = FAKE_LLM_PROMPT_TOKENS_PER_SECOND
+    output_tokens: int = FAKE_LLM_OUTPUT_TOKENS
+
+    @classmethod
+    def from_config(cls, config):
+        fields = ("model_path", "temperature", "max_tokens", "n_ctx")
+        return cls(**{name: config[name] for name in fields if name in config})
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-llamacpp"
+
+    def _answer(self, prompt):
+        rng = _rng(prompt)
+        if "numbered 0 through 4" in prompt:
+            # The search task's exact output format
+            return "\n".join(
+                f"{i}: {' '.join(rng.choice(WORDS) for _ in range(5)).title()}"
+                f" - https://arxiv.org/abs/{rng.randint(2001, 2412)}.{rng.randint(1, 99999):05d}"
+                for i in range(5))
+        sentences = []
+        words = 0
+        while words < self.output_tokens * 3 // 4:
+            sentence = [rng.choice(WORDS) for _ in range(rng.randint(8, 16))]
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            words += len(sentence)
+        return " ".join(sentences)
+
+    def _tokens(self, prompt, stop, max_tokens):
+        text = self._answer(prompt)
+        for marker in stop or []:
+            text = text.split(marker, 1)[0]
+        pieces = [word + " " for word in text.split(" ")]
+        pieces[-1] = pieces[-1].rstrip()
+        return pieces[:max_tokens or self.max_tokens]
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                prompt_prefix=None, **kwargs) -> Iterator[GenerationChunk]:
+        from llm_registry import model_lock
+        from metrics import record_generation
+        with model_lock(self):
+            prompt_seconds = count_tokens(prompt) / self.prompt_tokens_per_second
+            time.sleep(prompt_seconds)
+            start_time = time.time()
+            generated = 0
+            try:
+                for piece in self._tokens(prompt, stop, kwargs.get("max_tokens")):
+                    time.sleep(1 / self.tokens_per_second)
+                    generated += 1
+                    if run_manager:
+                        run_manager.on_llm_new_token(piece)
+                    yield GenerationChunk(text=piece)
+            finally:
+                record_generation(count_tokens(prompt), prompt_seconds, generated, time.time() - start_time)
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    def get_num_tokens(self, text: str) -> int:
+        return count_tokens(text)
+
+
+class FakeLlamaState:
+    """What llama_cpp.Llama.save_state returns: tokens, their logits and llama.cpp's own state."""
+
+    def __init__(self, input_ids, scores, n_tokens, llama_state):
+        self.input_ids = input_ids
+        self.scores = scores
+        self.n_tokens = n_tokens
+        self.llama_state = llama_state
+        self.llama_state_size = len(llama_state)
+
+
+class FakeLlamaClient:
+    """The slice of llama_cpp.Llama that prompt_cache uses, evaluating at the fake prompt speed."""
+
+    def __init__(self, model_path="fake-llama.gguf", n_ctx=2048, n_vocab=1000, kv_bytes_per_token=1024,
+                 prompt_tokens_per_second=FAKE_LLM_PROMPT_TOKENS_PER_SECOND):
+        self.model_path = model_path
+        self._n_ctx = n_ctx
+        self._n_vocab = n_vocab
+        self.kv_bytes_per_token = kv_bytes_per_token
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.input_ids = []
+        self.tokens_evaluated = 0
+
+    def n_ctx(self):
+        return self._n_ctx
+
+    def n_vocab(self):
+        return self._n_vocab
+
+    def tokenize(self, text: bytes, add_bos=True, special=False):
+        return [hash(word) % self._n_vocab for word in text.decode("utf-8").split()]
+
+    def reset(self):
+        self.input_ids = []
+
+    def eval(self, tokens):
+        time.sleep(len(tokens) / self.prompt_tokens_per_second)
+        self.input_ids = self.input_ids + list(tokens)
+        self.tokens_evaluated += len(tokens)
+
+    def save_state(self):
+        import numpy as np
+        n_tokens = len(self.input_ids)
+        return FakeLlamaState(np.array(self.input_ids, dtype=np.intc),
+                              np.zeros((n_tokens, self._n_vocab), dtype=np.float32),
+                              n_tokens, bytes(n_tokens * self.kv_bytes_per_token))
+
+    def load_state(self, state):
+        self.input_ids = state.input_ids.tolist()
+
+
+def fake_embedding(text, dim=512):
+    """Unit vector that depends only on the words of the text."""
+    import numpy as np
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in text.lower().split():
+        vector += np.random.default_rng(int.from_bytes(_rng(word).randbytes(8), "little")).standard_normal(dim)
+    norm = float(np.linalg.norm(vector))
+    return (vector / norm if norm else vector).tolist()
+
+
+class _FakeSynthesizer:
+    output_sample_rate = FAKE_TTS_SAMPLE_RATE
+
+
+class FakeTTSEngine:
+    """Quiet tone of the length speech of the text would have, after RTF x that long."""
+
+    synthesizer = _FakeSynthesizer()
+
+    def __init__(self, rtf=FAKE_TTS_RTF):
+        self.rtf = rtf
+
+    def tts(self, text):
+        import numpy as np
+        duration = max(0.5, len(text.split()) / FAKE_TTS_WORDS_PER_SECOND)
+        time.sleep(duration * self.rtf)
+        t = np.arange(int(duration * FAKE_TTS_SAMPLE_RATE), dtype=np.float32) / FAKE_TTS_SAMPLE_RATE
+        return 0.05 * np.sin(2 * np.pi * 220 * t)
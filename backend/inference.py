@@ -0,0 +1,276 @@
+"""Bounded executors that keep blocking LLM and TTS work off the event loop."""
+import asyncio
+import contextvars
+import functools
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import QUEUE_WAIT_SECONDS
+
+
+class QueueFullError(Exception):
+    """Raised when a pool's wait queue is full and the request must be shed."""
+
+    def __init__(self, pool_name: str, retry_after: int):
+        super().__init__(f"{pool_name} pool is saturated, retry in {retry_after}s")
+        self.pool_name = pool_name
+        self.retry_after = retry_after
+
+
+class InferencePool:
+    def __init__(self, name: str, max_workers: int, max_queue: int,
+                 initial_estimate: float = 10.0):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._running = 0
+        self._waiting = 0
+        self._completed = 0
+        self._rejected = 0
+        # Moving average of how long one job occupies a worker
+        self._avg_seconds = initial_estimate
+
+    def retry_after(self) -> int:
+        """Seconds until a worker is likely to free up for a new request."""
+        backlog = self._waiting / self.max_workers + 1
+        return max(1, math.ceil(self._avg_seconds * backlog))
+
+    def _admit(self):
+        with self._lock:
+            if self._running + self._waiting >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise QueueFullError(self.name, self.retry_after())
+            self._waiting += 1
+
+    def _execute(self, fn, queued_at):
+        with self._lock:
+            self._waiting -= 1
+            self._running += 1
+        start_time = time.time()
+        QUEUE_WAIT_SECONDS.observe(start_time - queued_at, pool=self.name)
+        try:
+            return fn()
+        finally:
+            elapsed = time.time() - start_time
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+
+    def submit(self, fn, *args, **kwargs) -> asyncio.Future:
+        """Queue a blocking callable, raising QueueFullError right away if full."""
+        self._admit()
+        # Run in a copy of the caller's context, so the request's trace id follows the job
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, self._execute,
+                                 functools.partial(fn, *args, **kwargs), time.time())
+        try:
+            future = self._executor.submit(call)
+        except Exception:
+            with self._lock:
+                self._waiting -= 1
+            raise
+        return asyncio.wrap_future(future)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking callable on the pool, or raise QueueFullError."""
+        return await self.submit(fn, *args, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "waiting": self._waiting,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_seconds": round(self._avg_seconds, 3),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Broadcast:
+    """One async iterator read by any number of listeners, each from the first item."""
+
+    def __init__(self, source):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.listeners = 0
+        self._changed = asyncio.get_running_loop().create_future()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.get_running_loop().create_future()
+        changed.set_result(None)
+
+    async def _pump(self, source):
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = ConnectionAbortedError("stream stopped")
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            await source.aclose()
+
+    async def listen(self):
+        self.listeners += 1
+        index = 0
+        try:
+            while True:
+                while index < len(self.items):
+                    yield self.items[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed
+        finally:
+            self.listeners -= 1
+            # The last listener leaving stops the source, freeing the model
+            if not self.listeners and not self.done:
+                self.task.cancel()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls (or streams) for the same key onto one shared task."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight = {}
+        self.leaders = 0
+        self.duplicates = 0
+
+    async def do(self, key, fn):
+        """Await fn() for this key, joining an identical call already in flight."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.duplicates += 1
+        else:
+            self.leaders += 1
+            # A separate task so a disconnecting leader doesn't cancel the followers
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._finished, key))
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every waiter went away
+
+    def stream(self, key, start):
+        """Items of the async iterator start() returns, shared with an identical stream in flight.
+
+        A caller that joins late first gets every item produced so far. The
+        shared stream stops once all of its callers have gone away. Errors
+        from start() itself, such as QueueFullError, are raised right here.
+        """
+        broadcast = self._inflight.get(key)
+        if broadcast is not None:
+            self.duplicates += 1
+        else:
+            broadcast = _Broadcast(start())
+            self.leaders += 1
+            self._inflight[key] = broadcast
+            broadcast.task.add_done_callback(functools.partial(self._stream_finished, key, broadcast))
+        return broadcast.listen()
+
+    def _stream_finished(self, key, broadcast, task):
+        if self._inflight.get(key) is broadcast:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "duplicates": self.duplicates,
+        }
+
+
+def stream_from_pool(pool: InferencePool, make_iterator):
+    """Run a blocking iterator on the pool, relaying its items to an async generator.
+
+    Admission happens right away, so QueueFullError is raised before any
+    response starts. Closing the async generator stops the producer.
+    """
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def produce():
+        try:
+            for item in make_iterator():
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(items.put_nowait, item)
+        finally:
+            loop.call_soon_threadsafe(items.put_nowait, finished)
+
+    job = pool.submit(produce)
+
+    async def relay():
+        try:
+            while True:
+                item = await items.get()
+                if item is finished:
+                    break
+                yield item
+            await job  # Surface errors raised by the producer
+        finally:
+            stop.set()
+
+    return relay()
+
+
+def normalize_key(*parts) -> str:
+    """Case- and whitespace-insensitive key for coalescing equivalent requests."""
+    return "|".join(" ".join(str(part).lower().split()) for part in parts)
+
+
+# llama.cpp contexts are not thread-safe, so one worker per loaded model is the
+# sensible default; extra workers only help while other work (tools, I/O) runs.
+llm_pool = InferencePool(
+    "llm",
+    max_workers=int(os.getenv("INFERENCE_CONCURRENCY", "1")),
+    max_queue=int(os.getenv("INFERENCE_QUEUE_SIZE", "8")),
+    initial_estimate=30.0,
+)
+tts_pool = InferencePool(
+    "tts",
+    max_workers=int(os.getenv("TTS_CONCURRENCY", "1")),
+    max_queue=int(os.getenv("TTS_QUEUE_SIZE", "4")),
+    initial_estimate=15.0,
+)
+
+
+search_flight = SingleFlight("search")
+summary_flight = SingleFlight("summary")
+# SSE summaries: a stream for a summary already streaming to someone else joins it
+summary_stream_flight = SingleFlight("summary_stream")
+audio_flight = SingleFlight("audio")
+
+
+def pool_stats() -> dict:
+    return {pool.name: pool.stats() for pool in (llm_pool, tts_pool)}
+
+
+def flight_stats() -> dict:
+    return {flight.name: flight.stats()
+            for flight in (search_flight, summary_flight, summary_stream_flight, audio_flight)}
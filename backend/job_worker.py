@@ -0,0 +1,47 @@
+"""Run background job workers: python job_worker.py [--workers N]
+
+Workers are independent of the API server. Jobs are persisted in
+JOB_DB_PATH, so queued work survives restarts of either side and jobs
+left running by a killed worker are picked up again.
+"""
+import argparse
+import multiprocessing
+from cache_store import CACHE_BACKEND
+
+
+def serve():
+    import api  # noqa: F401  Registers the job handlers
+    from jobs import run_worker
+    try:
+        run_worker()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Execute queued summary and audio jobs.")
+    # Every worker loads its own model, so memory grows with this number
+    parser.add_argument("--workers", type=int, default=1, help="worker processes to start")
+    args = parser.parse_args()
+
+    if CACHE_BACKEND != "sqlite":
+        print("⚠️ CACHE_BACKEND is not 'sqlite': workers will not share caches with the API; "
+              "summaries are only returned through /jobs and /audio will not find them")
+    if args.workers <= 1:
+        serve()
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=serve, name=f"job-worker-{i}") for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
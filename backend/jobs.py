@@ -0,0 +1,221 @@
+"""Persistent job queue: the API records work in SQLite, worker processes execute it."""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from uuid import uuid4
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "./uploads/jobs.db")
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+# A running job whose worker has not checked in for this long is re-queued
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+HEARTBEAT_SECONDS = min(10.0, JOB_STALE_SECONDS / 4)
+
+_handlers = {}
+
+
+def job_handler(kind):
+    """Register the function that executes jobs of a kind.
+
+    It is called as handler(payload, progress) in a worker process and
+    returns a JSON-serializable result; progress(fraction, message)
+    reports how far along it is.
+    """
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+class JobStore:
+    """Jobs and their status, progress and results in one SQLite file.
+
+    The API and every worker process open the same file; WAL mode lets the
+    API read status while workers write progress.
+    """
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    message TEXT,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    heartbeat_at REAL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def submit(self, kind, payload) -> dict:
+        job_id = str(uuid4())
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(payload), time.time()))
+        return self.get(job_id)
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def list(self, status=None, limit=50):
+        query = "SELECT * FROM jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        return [self._to_dict(row) for row in self._connect().execute(query, params)]
+
+    def claim(self, worker_id, kinds):
+        """Mark the oldest queued job of the given kinds as running on this worker."""
+        if not kinds:
+            return None
+        conn = self._connect()
+        placeholders = ", ".join("?" for _ in kinds)
+        while True:
+            row = conn.execute(
+                f"SELECT id FROM jobs WHERE status = 'queued' AND kind IN ({placeholders}) "
+                f"ORDER BY created_at LIMIT 1", list(kinds)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            with conn:
+                claimed = conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ? AND status = 'queued'",
+                    (worker_id, now, now, row["id"])).rowcount
+            # Another worker may have claimed it between the two statements
+            if claimed:
+                return self.get(row["id"])
+
+    def heartbeat(self, job_id):
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def progress(self, job_id, fraction, message=None):
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE jobs SET progress = ?, message = ?, heartbeat_at = ? WHERE id = ?",
+                         (round(min(max(fraction, 0.0), 1.0), 3), message, time.time(), job_id))
+
+    def complete(self, job_id, result):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', progress = 1, result = ?, finished_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id))
+
+    def fail(self, job_id, error):
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                         (error, time.time(), job_id))
+
+    def release(self, job_id):
+        """Put a job back in the queue, e.g. when its worker is shutting down."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, attempts = attempts - 1 "
+                "WHERE id = ? AND status = 'running'", (job_id,))
+
+    def requeue_stale(self):
+        """Re-queue running jobs whose worker died, failing them after JOB_MAX_ATTEMPTS."""
+        conn = self._connect()
+        cutoff = time.time() - JOB_STALE_SECONDS
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Worker stopped responding', finished_at = ? "
+                "WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+                (time.time(), cutoff, JOB_MAX_ATTEMPTS))
+            return conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL "
+                "WHERE status = 'running' AND heartbeat_at < ?", (cutoff,)).rowcount
+
+    def counts(self):
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        return {status: count for status, count in rows}
+
+
+def run_job(store, job):
+    """Execute one claimed job, recording its result or error."""
+    handler = _handlers[job["kind"]]
+    stop = threading.Event()
+
+    def beat():
+        # Separate connection per thread; keeps long single steps from looking dead
+        while not stop.wait(HEARTBEAT_SECONDS):
+            store.heartbeat(job["id"])
+
+    threading.Thread(target=beat, name=f"job-heartbeat-{job['id'][:8]}", daemon=True).start()
+    start_time = time.time()
+    try:
+        result = handler(job["payload"], lambda fraction, message=None: store.progress(job["id"], fraction, message))
+        store.complete(job["id"], result)
+        print(f"✅ Job {job['id']} ({job['kind']}) finished in {time.time() - start_time:.2f} seconds")
+    except (KeyboardInterrupt, SystemExit):
+        store.release(job["id"])
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        store.fail(job["id"], str(e) or type(e).__name__)
+        print(f"❌ Job {job['id']} ({job['kind']}) failed: {e}")
+    finally:
+        stop.set()
+
+
+def run_worker(store=None, worker_id=None, stop=None):
+    """Claim and execute jobs until stopped; every registered kind is accepted."""
+    store = store or JobStore()
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop = stop or threading.Event()
+    print(f"👷 Job worker {worker_id} handling: {', '.join(sorted(_handlers))}")
+    while not stop.is_set():
+        requeued = store.requeue_stale()
+        if requeued:
+            print(f"🔁 Re-queued {requeued} jobs from stopped workers")
+        job = store.claim(worker_id, list(_handlers))
+        if job is None:
+            stop.wait(JOB_POLL_SECONDS)
+            continue
+        run_job(store, job)
@@ -0,0 +1,318 @@
+"""Shared registry for the LLM handles used by the API, agents and tools."""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from metrics import record_generation, stage
+
+load_dotenv()
+
+# Every module asks the registry for its model instead of building its own
+# LlamaCpp, so each configured model is loaded exactly once per process.
+MODEL_CONFIGS = {
+    "default": {
+        "model_path": os.getenv("MODEL_PATH", "./models/llama-2-7b.Q4_K_M.gguf"),
+        "temperature": float(os.getenv("LLM_TEMPERATURE", "0.7")),
+        "max_tokens": int(os.getenv("LLM_MAX_TOKENS", "2000")),
+        "n_ctx": int(os.getenv("LLM_N_CTX", "2048")),
+        "n_gpu_layers": int(os.getenv("GPU_LAYERS", "40")),
+        "n_batch": int(os.getenv("LLM_N_BATCH", "512")),
+        "f16_kv": True,            # Use half-precision for key/value cache
+        "verbose": os.getenv("LLM_VERBOSE", "1") == "1",
+        # Optional small model of the same family for speculative decoding
+        "draft_model_path": os.getenv("DRAFT_MODEL_PATH"),
+    }
+}
+
+# When set, models live in a separate model-server process (model_server.py)
+# and every API worker talks to it instead of loading its own copy
+MODEL_SERVER_ADDRESS = os.getenv("MODEL_SERVER_ADDRESS")
+
+# "fake" swaps llama.cpp for fake_backends.FakeLlamaCpp (benchmarks without the model)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "llamacpp")
+
+# Context size of embedding-mode instances; they only ever see short queries
+EMBEDDING_N_CTX = int(os.getenv("EMBEDDING_N_CTX", "512"))
+
+_models = {}
+_drafts = {}
+_embedders = {}
+_stats = {}
+_load_lock = threading.Lock()
+_model_locks = {}
+_serialized_class = None
+_client = None
+_client_lock = threading.Lock()
+
+
+def use_local_models():
+    """Load models in this process even if MODEL_SERVER_ADDRESS is set (the server itself).
+
+    The variable is also blanked in the environment, so processes spawned
+    from here (TTS workers) do not pick it up again, from .env either, and
+    send their work back to this server.
+    """
+    global MODEL_SERVER_ADDRESS
+    MODEL_SERVER_ADDRESS = None
+    os.environ["MODEL_SERVER_ADDRESS"] = ""
+
+
+def model_server_client():
+    """Shared connection to the model server, or None when models are loaded locally."""
+    global _client
+    if not MODEL_SERVER_ADDRESS:
+        return None
+    with _client_lock:
+        if _client is None:
+            from model_server import ModelClient
+            _client = ModelClient(MODEL_SERVER_ADDRESS)
+        return _client
+
+
+def register_model(name, **config):
+    """Register (or override) the configuration for a named model."""
+    if name in _models:
+        raise ValueError(f"Model '{name}' is already loaded")
+    MODEL_CONFIGS[name] = config
+
+
+def resident_memory_mb():
+    """Return the resident set size of this process in MiB."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and KiB elsewhere
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return None
+
+
+def model_lock(llm):
+    """Re-entrant lock serializing calls into one llama.cpp context.
+
+    A llama.cpp context is not thread-safe, and the inference pool may call
+    the shared handle from several worker threads.
+    """
+    return _model_locks.setdefault(id(llm), threading.RLock())
+
+
+def _llama_timings(llm):
+    """llama.cpp's cumulative (prompt tokens, prompt seconds, generated tokens, generation seconds)."""
+    try:
+        import llama_cpp
+        timings = llama_cpp.llama_get_timings(llm.client._ctx.ctx)
+    except (ImportError, AttributeError):
+        return None
+    return timings.n_p_eval, timings.t_p_eval_ms / 1000, timings.n_eval, timings.t_eval_ms / 1000
+
+
+@contextmanager
+def _measured(llm):
+    # Called with the model lock held, so the difference is this call's alone
+    before = _llama_timings(llm)
+    try:
+        yield
+    finally:
+        after = _llama_timings(llm)
+        if before is not None and after is not None:
+            record_generation(*(a - b for a, b in zip(after, before)))
+
+
+_grammars = {}
+
+
+def _compiled_grammar(llm, kwargs):
+    """Replace a GBNF text in kwargs by a parsed LlamaGrammar, parsed once per model.
+
+    Grammars travel as text so they can reach a model server; the parsed
+    object keeps parse state, so models running at the same time get their own.
+    """
+    grammar = kwargs.get("grammar")
+    if isinstance(grammar, str):
+        key = (id(llm), grammar)
+        compiled = _grammars.get(key)
+        if compiled is None:
+            from llama_cpp import LlamaGrammar
+            compiled = _grammars[key] = LlamaGrammar.from_string(grammar, verbose=False)
+        kwargs["grammar"] = compiled
+    return kwargs
+
+
+def _llm_class():
+    global _serialized_class
+    if _serialized_class is None:
+        from langchain_community.llms import LlamaCpp
+        from prompt_cache import prefix_cache
+
+        from speculative import speculation
+
+        class SerializedLlamaCpp(LlamaCpp):
+            # prompt_prefix: start of the prompt whose saved KV state to restore
+            # first; restoring and generating happen under one hold of the lock
+            @contextmanager
+            def _generating(self, prompt_prefix, kwargs):
+                with model_lock(self):
+                    if prompt_prefix:
+                        with stage("prompt_prefix_restore"):
+                            prefix_cache.restore(self, prompt_prefix)
+                    with _measured(self), speculation(self.client, kwargs):
+                        yield _compiled_grammar(self, kwargs)
+
+            def _call(self, prompt, stop=None, run_manager=None, prompt_prefix=None, **kwargs):
+                if self.streaming:
+                    # LlamaCpp._call would stream through _stream anyway; going
+                    # there directly keeps each call measured once
+                    return "".join(chunk.text for chunk in self._stream(
+                        prompt, stop=stop, run_manager=run_manager, prompt_prefix=prompt_prefix, **kwargs))
+                with self._generating(prompt_prefix, kwargs) as kwargs:
+                    return super()._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
+
+            def _stream(self, prompt, stop=None, run_manager=None, prompt_prefix=None, **kwargs):
+                with self._generating(prompt_prefix, kwargs) as kwargs:
+                    yield from super()._stream(prompt, stop=stop, run_manager=run_manager, **kwargs)
+
+        _serialized_class = SerializedLlamaCpp
+    return _serialized_class
+
+
+def log_gpu_diagnostics(config):
+    print("\n" + "=" * 50)
+    print("🔍 GPU USAGE DIAGNOSTICS:")
+    print(f"GPU_LAYERS set to: {config['n_gpu_layers']}")
+    print(f"CUDA_VISIBLE_DEVICES: {os.environ.get('CUDA_VISIBLE_DEVICES', 'Not Set')}")
+    try:
+        import torch
+        print(f"PyTorch CUDA available: {torch.cuda.is_available()}")
+        if torch.cuda.is_available():
+            print(f"PyTorch CUDA device: {torch.cuda.get_device_name(0)}")
+    except ImportError:
+        print("PyTorch not installed, skipping GPU test")
+    except Exception as e:
+        print(f"❌ GPU test failed: {e}")
+    print("=" * 50 + "\n")
+
+
+def _load(name):
+    client = model_server_client()
+    if client is not None:
+        from model_server import RemoteLlamaCpp
+        llm = RemoteLlamaCpp.connect(client, name)
+        _stats[name] = {"model_path": llm.model_path, "server": MODEL_SERVER_ADDRESS,
+                        "loaded_at": time.time()}
+        print(f"🔗 Using model '{name}' from the model server at {MODEL_SERVER_ADDRESS}")
+        return llm
+    if name not in MODEL_CONFIGS:
+        raise KeyError(f"Unknown model '{name}'")
+    config = dict(MODEL_CONFIGS[name])
+    draft_model_path = config.pop("draft_model_path", None)
+    if LLM_BACKEND == "fake":
+        from fake_backends import FakeLlamaCpp
+        _stats[name] = {"model_path": config["model_path"], "backend": "fake", "loaded_at": time.time()}
+        return FakeLlamaCpp.from_config(config)
+    if config.get("verbose"):
+        log_gpu_diagnostics(config)
+    print(f"🔍 Loading model '{name}' from {config['model_path']}")
+
+    rss_before = resident_memory_mb()
+    start_time = time.time()
+    if draft_model_path:
+        from speculative import DraftModel
+        print(f"🔍 Loading draft model for '{name}' from {draft_model_path}")
+        draft = _drafts[name] = DraftModel(draft_model_path, n_ctx=config["n_ctx"])
+        # LlamaCpp hands model_kwargs on to llama_cpp.Llama, which then verifies the drafts
+        config["model_kwargs"] = {**config.get("model_kwargs", {}), "draft_model": draft}
+    llm = _llm_class()(**config)
+    if draft_model_path:
+        _drafts[name].check_compatible(llm.client)
+    load_seconds = time.time() - start_time
+    rss_after = resident_memory_mb()
+
+    _stats[name] = {
+        "model_path": config["model_path"],
+        "load_seconds": round(load_seconds, 3),
+        "loaded_at": time.time(),
+        "rss_delta_mb": round(rss_after - rss_before, 1) if rss_before is not None else None,
+        "draft_model_path": draft_model_path,
+    }
+    print(f"✅ Model '{name}' loaded in {load_seconds:.2f} seconds")
+    return llm
+
+
+def get_llm(name="default"):
+    """Return the shared handle for a model, loading it on first use."""
+    llm = _models.get(name)
+    if llm is not None:
+        return llm
+    with _load_lock:
+        if name not in _models:
+            _models[name] = _load(name)
+        return _models[name]
+
+
+def embed(text, name="default"):
+    """Mean-pooled embedding of a short text from a model's weights.
+
+    A context created for generation cannot return embeddings, so the model
+    is opened a second time in embedding mode with a small context; the
+    memory-mapped weights are shared with the generating instance.
+    """
+    client = model_server_client()
+    if client is not None:
+        return client.request("embed", text=text, model=name)
+    if LLM_BACKEND == "fake":
+        from fake_backends import fake_embedding
+        return fake_embedding(text)
+    embedder = _embedders.get(name)
+    if embedder is None:
+        with _load_lock:
+            if name not in _embedders:
+                from llama_cpp import Llama
+                config = MODEL_CONFIGS[name]
+                _embedders[name] = Llama(model_path=config["model_path"], embedding=True,
+                                         n_ctx=EMBEDDING_N_CTX, n_gpu_layers=config.get("n_gpu_layers", 0),
+                                         verbose=False)
+            embedder = _embedders[name]
+    with model_lock(embedder):
+        vectors = embedder.embed(text)
+    # Models without a pooling layer return one vector per token
+    if vectors and isinstance(vectors[0], list):
+        vectors = [sum(column) / len(vectors) for column in zip(*vectors)]
+    return vectors
+
+
+def warm_up(names=None):
+    """Load the given models (all configured ones by default) ahead of traffic."""
+    for name in names or list(MODEL_CONFIGS):
+        get_llm(name)
+
+
+def is_loaded(name="default"):
+    return name in _models
+
+
+def model_stats():
+    """Load time and memory figures for every configured model."""
+    client = model_server_client()
+    if client is not None:
+        try:
+            server = client.request("stats")
+        except (OSError, RuntimeError) as e:
+            server = {"error": str(e)}
+        return {"resident_memory_mb": resident_memory_mb(), "server": server}
+    return {
+        "resident_memory_mb": resident_memory_mb(),
+        "models": {
+            name: {"loaded": name in _models, **_stats.get(name, {}),
+                   **({"speculative": _drafts[name].stats()} if name in _drafts else {})}
+            for name in MODEL_CONFIGS
+        },
+    }
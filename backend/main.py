@@ -1,14 +1,27 @@
-from crewai import Crew
-from tasks import search_task, summarize_task, podcast_task
+import sys
+from custom_crew import CustomCrew
+from tasks import summarize_task, podcast_task, audio_task
 
-def main():
-    crew = Crew(
-        tasks=[search_task(), summarize_task(), podcast_task()],
-        verbose=2
+# "Attention Is All You Need" and BERT
+DEFAULT_PAPERS = ["1706.03762", "1810.04805"]
+
+def main(paper_ids=DEFAULT_PAPERS, output_path="podcast.wav"):
+    # The summaries do not depend on each other, so they run side by side;
+    # the script waits for all of them and the audio for the script
+    summaries = [summarize_task(paper_id) for paper_id in paper_ids]
+    script = podcast_task(depends_on=summaries)
+    audio = audio_task(output_path, depends_on=[script])
+    tasks = [*summaries, script, audio]
+    crew = CustomCrew(
+        tasks=tasks,
+        agents=[task.agent for task in tasks],
+        process="parallel"
     )
     
     result = crew.kickoff()
-    print(f"Final result:\n{result}")
+    print(f"Podcast script:\n{result[script.description]}")
+    print(f"Final result:\n{result[audio.description]}")
+    print(f"Timings: {result.timings} (total {result.total_seconds}s)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv[1:] or DEFAULT_PAPERS)
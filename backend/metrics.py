@@ -0,0 +1,219 @@
+"""Stage timings as Prometheus histograms, per-request trace ids and structured log events.
+
+Histograms are kept in-process and rendered in the Prometheus text format
+by /metrics, together with gauges read from the existing stats (queue
+depth, cache hit rates) at scrape time. The trace id of the request being
+served lives in a context variable, so every stage and event recorded on
+its behalf, including in pool threads, carries it.
+"""
+import contextvars
+import json
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from uuid import uuid4
+
+# Events below this level are dropped before any formatting happens
+EVENT_LOG_LEVEL = os.getenv("EVENT_LOG_LEVEL", "info")
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40, "off": 100}
+_threshold = LEVELS.get(EVENT_LOG_LEVEL, 20)
+
+# Seconds, from sub-millisecond cache lookups to multi-minute PDF summaries
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+RATIO_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5)
+
+trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+def new_trace(value=None) -> str:
+    """Start a trace for the current request; returns its id."""
+    value = value or uuid4().hex[:16]
+    trace_id.set(value)
+    return value
+
+
+def enabled(level) -> bool:
+    return LEVELS[level] >= _threshold
+
+
+def event(name, level="info", **fields):
+    """Write one JSON line; free when the level is disabled, so pass raw values, not f-strings."""
+    if LEVELS[level] < _threshold:
+        return
+    record = {"ts": round(time.time(), 3), "level": level, "event": name, "trace_id": trace_id.get()}
+    record.update(fields)
+    print(json.dumps(record, default=str, ensure_ascii=False), file=sys.stdout, flush=True)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in series]
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                  for key, value in values]
+        return lines
+
+
+STAGE_SECONDS = Histogram("paper_stage_seconds", "Time spent in each pipeline stage.", ["stage"])
+HTTP_SECONDS = Histogram("paper_http_request_seconds", "Time to produce an HTTP response.",
+                         ["method", "route", "status"])
+QUEUE_WAIT_SECONDS = Histogram("paper_queue_wait_seconds", "Time a job waited for a pool worker.", ["pool"])
+PROMPT_TOKENS_PER_SECOND = Histogram("paper_llm_prompt_eval_tokens_per_second",
+                                     "Prompt evaluation speed per LLM call.", buckets=RATE_BUCKETS)
+GENERATION_TOKENS_PER_SECOND = Histogram("paper_llm_generation_tokens_per_second",
+                                         "Token generation speed per LLM call.", buckets=RATE_BUCKETS)
+LLM_TOKENS = Counter("paper_llm_tokens_total", "Tokens processed by the LLM.", ["kind"])
+SPECULATIVE_ACCEPTANCE = Histogram("paper_speculative_acceptance_ratio",
+                                   "Share of draft tokens the main model kept, per LLM call.", ["task"],
+                                   buckets=RATIO_BUCKETS)
+SPECULATIVE_TOKENS = Counter("paper_speculative_tokens_total",
+                             "Draft tokens proposed and accepted, and tokens generated with and without drafts.",
+                             ["task", "kind"])
+TTS_RTF = Histogram("paper_tts_real_time_factor", "Synthesis time divided by audio duration, per sentence.",
+                    buckets=RTF_BUCKETS)
+TTS_AUDIO_SECONDS = Counter("paper_tts_audio_seconds_total", "Seconds of audio synthesized.")
+
+_metrics = [STAGE_SECONDS, HTTP_SECONDS, QUEUE_WAIT_SECONDS, PROMPT_TOKENS_PER_SECOND,
+            GENERATION_TOKENS_PER_SECOND, LLM_TOKENS, SPECULATIVE_ACCEPTANCE, SPECULATIVE_TOKENS,
+            TTS_RTF, TTS_AUDIO_SECONDS]
+_collectors = []
+
+
+@contextmanager
+def stage(name, **fields):
+    """Time a block as one pipeline stage, also when it raises."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start_time
+        STAGE_SECONDS.observe(seconds, stage=name)
+        if enabled("debug"):
+            event("stage", "debug", stage=name, ms=round(seconds * 1000, 2), **fields)
+
+
+def record_generation(prompt_tokens, prompt_seconds, generated_tokens, generation_seconds):
+    """Account one LLM call, split into prompt evaluation and generation."""
+    LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+    LLM_TOKENS.inc(generated_tokens, kind="generated")
+    if prompt_tokens and prompt_seconds > 0:
+        PROMPT_TOKENS_PER_SECOND.observe(prompt_tokens / prompt_seconds)
+    if generated_tokens and generation_seconds > 0:
+        GENERATION_TOKENS_PER_SECOND.observe(generated_tokens / generation_seconds)
+    STAGE_SECONDS.observe(prompt_seconds, stage="llm_prompt_eval")
+    STAGE_SECONDS.observe(generation_seconds, stage="llm_generation")
+    if enabled("debug"):
+        event("llm.generation", "debug", prompt_tokens=prompt_tokens, generated_tokens=generated_tokens,
+              prompt_ms=round(prompt_seconds * 1000, 1), generation_ms=round(generation_seconds * 1000, 1))
+
+
+def record_speculation(task, proposed, accepted, generated, speculative):
+    """Account one LLM call made with a draft model (or one of its plain-decoding baselines)."""
+    if not speculative:
+        SPECULATIVE_TOKENS.inc(generated, task=task, kind="generated_baseline")
+        return
+    SPECULATIVE_TOKENS.inc(proposed, task=task, kind="proposed")
+    SPECULATIVE_TOKENS.inc(accepted, task=task, kind="accepted")
+    SPECULATIVE_TOKENS.inc(generated, task=task, kind="generated")
+    if proposed:
+        SPECULATIVE_ACCEPTANCE.observe(accepted / proposed, task=task)
+    if enabled("debug"):
+        event("llm.speculation", "debug", task=task, proposed=proposed, accepted=accepted, generated=generated)
+
+
+def record_synthesis(seconds, audio_seconds):
+    STAGE_SECONDS.observe(seconds, stage="tts_synthesis")
+    TTS_AUDIO_SECONDS.inc(audio_seconds)
+    if audio_seconds:
+        TTS_RTF.observe(seconds / audio_seconds)
+
+
+def register_collector(collect):
+    """Add a callable returning (name, type, documentation, [(labels dict, value)]) tuples at scrape time."""
+    _collectors.append(collect)
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+    for collect in _collectors:
+        for name, kind, documentation, samples in collect():
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                if value is not None:
+                    lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} "
+                                 f"{_format_value(value)}")
+    return "\n".join(lines) + "\n"
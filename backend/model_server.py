@@ -0,0 +1,295 @@
+"""Model server: one process owns the llama.cpp and TTS models, API workers connect to it.
+
+Run it with `python model_server.py` and start the API workers with the same
+MODEL_SERVER_ADDRESS; get_llm() then returns a RemoteLlamaCpp instead of
+loading the model in every worker. Requests from one connection are
+multiplexed: each carries an id, runs on the server's thread pool, and its
+replies (a result, or a series of stream chunks) are tagged with that id.
+"""
+import argparse
+import inspect
+import itertools
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+from typing import Any, Iterator, List, Optional
+from dotenv import load_dotenv
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+load_dotenv()
+
+# A path is a Unix socket; host:port is TCP, which requires an authkey
+DEFAULT_ADDRESS = "./uploads/model-server.sock"
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY")
+# Requests handled at once; calls into one model still take turns via its lock
+MODEL_SERVER_THREADS = int(os.getenv("MODEL_SERVER_THREADS", "8"))
+
+
+def parse_address(address):
+    """Turn 'host:port' into a TCP address and anything else into a socket path."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and "/" not in address:
+        return host, int(port)
+    return address
+
+
+def _authkey(address):
+    if MODEL_SERVER_AUTHKEY:
+        return MODEL_SERVER_AUTHKEY.encode("utf-8")
+    if isinstance(address, tuple):
+        # Messages are pickled, so an open TCP port would run anyone's code
+        raise RuntimeError("MODEL_SERVER_AUTHKEY must be set to serve models over TCP")
+    return None
+
+
+class ModelClient:
+    """One multiplexed connection to the model server, shared by every thread in a process."""
+
+    def __init__(self, address):
+        self.address = parse_address(address)
+        self._conn = None
+        self._ids = itertools.count()
+        self._pending = {}
+        self._send_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+
+    def _connection(self):
+        with self._connect_lock:
+            if self._conn is None:
+                self._conn = Client(self.address, authkey=_authkey(self.address))
+                threading.Thread(target=self._read, args=(self._conn,),
+                                 name="model-client-reader", daemon=True).start()
+            return self._conn
+
+    def _read(self, conn):
+        try:
+            while True:
+                message = conn.recv()
+                replies = self._pending.get(message["id"])
+                if replies is not None:
+                    replies.put(message)
+        except (EOFError, OSError) as e:
+            with self._connect_lock:
+                if self._conn is conn:
+                    self._conn = None  # Reconnect on the next request
+            for replies in list(self._pending.values()):
+                replies.put({"error": f"Connection to model server lost: {e or type(e).__name__}"})
+
+    def _send(self, message):
+        with self._send_lock:
+            self._connection().send(message)
+
+    def _start(self, op, params):
+        request_id = next(self._ids)
+        replies = queue.Queue()
+        self._pending[request_id] = replies
+        try:
+            self._send({"id": request_id, "op": op, "params": params})
+        except Exception:
+            self._pending.pop(request_id, None)
+            raise
+        return request_id, replies
+
+    def request(self, op, **params):
+        """Run one operation on the server and return its result."""
+        request_id, replies = self._start(op, params)
+        try:
+            message = replies.get()
+        finally:
+            self._pending.pop(request_id, None)
+        if "error" in message:
+            raise RuntimeError(f"Model server: {message['error']}")
+        return message["result"]
+
+    def stream(self, op, **params) -> Iterator:
+        """Yield the chunks of a streaming operation; closing early cancels it on the server."""
+        request_id, replies = self._start(op, params)
+        finished = False
+        try:
+            while True:
+                message = replies.get()
+                if "error" in message:
+                    finished = True
+                    raise RuntimeError(f"Model server: {message['error']}")
+                if message.get("done"):
+                    finished = True
+                    return
+                yield message["chunk"]
+        finally:
+            self._pending.pop(request_id, None)
+            if not finished:
+                try:
+                    self._send({"id": request_id, "op": "cancel", "params": {}})
+                except OSError:
+                    pass
+
+
+class RemoteLlamaCpp(LLM):
+    """LangChain LLM whose calls run on the model server.
+
+    It mirrors the served model's path and sampling params so cache keys
+    (llm_identity) match those of a locally loaded model.
+    """
+
+    client: Any = None
+    model_name: str = "default"
+    model_path: Optional[str] = None
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    top_p: Optional[float] = None
+    top_k: Optional[int] = None
+    repeat_penalty: Optional[float] = None
+    n_ctx: Optional[int] = None
+
+    @classmethod
+    def connect(cls, client: ModelClient, model_name: str = "default"):
+        return cls(client=client, model_name=model_name,
+                   **client.request("describe", model=model_name))
+
+    @property
+    def _llm_type(self) -> str:
+        return "remote-llamacpp"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        return self.client.request("generate", model=self.model_name, prompt=prompt,
+                                   stop=stop, kwargs=kwargs)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs) -> Iterator[GenerationChunk]:
+        for text in self.client.stream("stream", model=self.model_name, prompt=prompt,
+                                       stop=stop, kwargs=kwargs):
+            if run_manager:
+                run_manager.on_llm_new_token(text)
+            yield GenerationChunk(text=text)
+
+    def get_num_tokens(self, text: str) -> int:
+        return self.client.request("num_tokens", model=self.model_name, text=text)
+
+
+class ModelServer:
+    """Serves generation, embeddings, tokenization and speech synthesis from models loaded once."""
+
+    def __init__(self, address, threads=MODEL_SERVER_THREADS):
+        self.address = parse_address(address)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="model-server")
+        self.connections = 0
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)  # Left behind by a previous run
+        with Listener(self.address, authkey=_authkey(self.address)) as listener:
+            print(f"🧠 Model server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"⚠️ Rejected model server connection: {e}")
+                    continue
+                self.connections += 1
+                threading.Thread(target=self._serve_connection, args=(conn,),
+                                 name=f"model-conn-{self.connections}", daemon=True).start()
+
+    def _serve_connection(self, conn):
+        send_lock = threading.Lock()
+        active = {}
+
+        def reply(message):
+            with send_lock:
+                try:
+                    conn.send(message)
+                except OSError:
+                    pass  # Client went away; its requests are cancelled below
+
+        try:
+            while True:
+                message = conn.recv()
+                if message["op"] == "cancel":
+                    cancelled = active.get(message["id"])
+                    if cancelled is not None:
+                        cancelled.set()
+                    continue
+                active[message["id"]] = threading.Event()
+                self.executor.submit(self._handle, message, active, reply)
+        except (EOFError, OSError):
+            for cancelled in list(active.values()):
+                cancelled.set()
+        finally:
+            conn.close()
+
+    def _handle(self, message, active, reply):
+        request_id = message["id"]
+        cancelled = active[request_id]
+        try:
+            operation = getattr(self, f"op_{message['op']}", None)
+            if operation is None:
+                raise ValueError(f"Unknown operation '{message['op']}'")
+            result = operation(**message["params"])
+            if inspect.isgenerator(result):
+                for chunk in result:
+                    if cancelled.is_set():
+                        result.close()  # Frees the model for other requests
+                        return
+                    reply({"id": request_id, "chunk": chunk})
+                reply({"id": request_id, "done": True})
+            else:
+                reply({"id": request_id, "result": result})
+        except Exception as e:
+            reply({"id": request_id, "error": f"{type(e).__name__}: {e}"})
+        finally:
+            active.pop(request_id, None)
+
+    def op_describe(self, model):
+        from custom_crew import SAMPLING_PARAMS
+        from llm_registry import get_llm
+        llm = get_llm(model)
+        return {"model_path": llm.model_path,
+                **{name: getattr(llm, name, None) for name in SAMPLING_PARAMS}}
+
+    def op_generate(self, model, prompt, stop=None, kwargs=None):
+        from llm_registry import get_llm
+        return get_llm(model).invoke(prompt, stop=stop, **(kwargs or {}))
+
+    def op_stream(self, model, prompt, stop=None, kwargs=None):
+        from llm_registry import get_llm
+        yield from get_llm(model).stream(prompt, stop=stop, **(kwargs or {}))
+
+    def op_num_tokens(self, model, text):
+        from llm_registry import get_llm
+        return get_llm(model).get_num_tokens(text)
+
+    def op_embed(self, text, model="default"):
+        from llm_registry import embed
+        return embed(text, model)
+
+    def op_synthesize(self, sentence):
+        from audio_generator import _synthesize_pcm, get_sentence_executor
+        return get_sentence_executor().submit(_synthesize_pcm, sentence).result()
+
+    def op_stats(self):
+        from audio_generator import get_tts_pool
+        from llm_registry import model_stats
+        return {"models": model_stats(), "tts": get_tts_pool().stats(),
+                "connections": self.connections}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the LLM and TTS models to API workers.")
+    parser.add_argument("--address", default=os.getenv("MODEL_SERVER_ADDRESS") or DEFAULT_ADDRESS,
+                        help="Unix socket path or host:port")
+    parser.add_argument("--no-tts", action="store_true", help="do not pre-load the TTS engines")
+    args = parser.parse_args()
+
+    import llm_registry
+    llm_registry.use_local_models()
+    llm_registry.warm_up()
+    if not args.no_tts:
+        from audio_generator import warm_up_tts
+        warm_up_tts()
+    ModelServer(args.address).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
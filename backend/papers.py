@@ -0,0 +1,61 @@
+"""Helpers for identifying papers by content rather than by request."""
+import hashlib
+import json
+import re
+from urllib.parse import urlparse
+
+# Archives that had old-style identifiers (hep-th/9901001) before April 2007
+OLD_STYLE_ARCHIVES = (
+    "acc-phys", "adap-org", "alg-geom", "ao-sci", "astro-ph", "atom-ph", "bayes-an", "chao-dyn",
+    "chem-ph", "cmp-lg", "comp-gas", "cond-mat", "cs", "dg-ga", "funct-an", "gr-qc", "hep-ex",
+    "hep-lat", "hep-ph", "hep-th", "math", "math-ph", "mtrl-th", "nlin", "nucl-ex", "nucl-th",
+    "patt-sol", "physics", "plasm-ph", "q-alg", "q-bio", "quant-ph", "solv-int", "supr-con",
+)
+
+# New-style (2301.12345v2) and old-style (hep-th/9901001v1, math.AG/0101001) arXiv identifiers
+ARXIV_ID_PATTERN = re.compile(
+    r'(\d{4}\.\d{4,5}(?:v\d+)?|(?:' + "|".join(map(re.escape, OLD_STYLE_ARCHIVES)) +
+    r')(?:\.[A-Z]{2})?/\d{7}(?:v\d+)?)'
+)
+
+
+def canonical_arxiv_id(text: str):
+    """The arXiv ID (with version, if given) of a bare ID or an arxiv.org URL, else None.
+
+    Links to other sites never yield an ID, even when their path happens to
+    look like one, so they cannot share cache keys with arXiv papers.
+    """
+    text = text.strip()
+    if "://" in text or re.match(r'(?:www\.|export\.)?arxiv\.org/', text, re.IGNORECASE):
+        url = urlparse(text if "://" in text else f"https://{text}")
+        host = (url.hostname or "").lower()
+        if host != "arxiv.org" and not host.endswith(".arxiv.org"):
+            return None
+        text = re.sub(r'^/(?:abs|pdf)/', '', url.path.rstrip("/"))
+        text = re.sub(r'\.pdf$', '', text)
+    else:
+        text = re.sub(r'^arxiv:\s*', '', text, flags=re.IGNORECASE)
+    match = ARXIV_ID_PATTERN.fullmatch(text)
+    return match.group(1) if match else None
+
+
+def paper_key(link: str) -> str:
+    """Stable, URL-safe key for a paper: its arXiv ID if it has one, else a hash of the link."""
+    arxiv_id = canonical_arxiv_id(link)
+    if arxiv_id:
+        return "arxiv-" + arxiv_id.replace("/", "_")
+    return "link-" + hashlib.sha256(link.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def file_sha256(path, chunk_size=1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_key(*parts) -> str:
+    """Stable SHA-256 over JSON-serializable parts, for content-addressed cache keys."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,123 @@
+"""Streaming PDF text extraction with per-file caching of the extracted sections."""
+import mmap
+import re
+import time
+from cache_store import get_cache
+from metrics import stage
+from papers import file_sha256
+
+# Bump when the extraction logic changes so cached sections are re-parsed
+EXTRACTOR_VERSION = 1
+
+ABSTRACT_START = re.compile(r'\babstract\b[\s.:—-]*', re.IGNORECASE)
+ABSTRACT_END = re.compile(
+    r'\n\s*(?:(?:1|I)\.?\s+)?(?:introduction|keywords|index terms)\b', re.IGNORECASE)
+REFERENCES_HEADING = re.compile(
+    r'^\s*(?:\d+\.?\s+)?(?:references|bibliography)\s*$', re.IGNORECASE | re.MULTILINE)
+
+extraction_cache = get_cache("extractions")
+
+
+def _pdf_reader(stream):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("PDF support not installed. Run 'pip install pypdf' to install.")
+    return PdfReader(stream)
+
+
+def iter_pages(pdf_path):
+    """Yield (page_number, text, seconds) one page at a time.
+
+    The file is memory-mapped rather than read into memory, so only the
+    pages currently being parsed are resident.
+    """
+    with open(pdf_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        reader = _pdf_reader(mapped)
+        for number, page in enumerate(reader.pages, start=1):
+            start_time = time.time()
+            text = page.extract_text() or ""
+            yield number, text, time.time() - start_time
+
+
+def count_pages(pdf_path) -> int:
+    with open(pdf_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return len(_pdf_reader(mapped).pages)
+
+
+def _split_front_matter(text):
+    """Split the text before the references into title, abstract and body."""
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    title = lines[0] if lines else ""
+
+    abstract = ""
+    body = text
+    start = ABSTRACT_START.search(text[:20000])
+    if start:
+        end = ABSTRACT_END.search(text, start.end())
+        stop = end.start() if end else min(len(text), start.end() + 3000)
+        abstract = text[start.end():stop].strip()
+        body = text[stop:]
+    return title, abstract, body.strip()
+
+
+@stage("pdf_extract")
+def extract_sections(pdf_path, digest=None, max_pages=None) -> dict:
+    """Extract title, abstract, body and references, cached by file hash."""
+    digest = digest or file_sha256(pdf_path)
+    key = f"{digest}:v{EXTRACTOR_VERSION}:{max_pages}"
+    cached = extraction_cache.get(key)
+    if cached is not None:
+        return cached
+
+    body_pages = []
+    reference_pages = []
+    page_seconds = []
+    in_references = False
+    start_time = time.time()
+
+    for number, text, seconds in iter_pages(pdf_path):
+        page_seconds.append(round(seconds, 4))
+        if in_references:
+            reference_pages.append(text)
+        else:
+            # The last matching heading on the page, in case "References" also
+            # appears earlier as ordinary text
+            headings = list(REFERENCES_HEADING.finditer(text))
+            if headings:
+                in_references = True
+                body_pages.append(text[:headings[-1].start()])
+                reference_pages.append(text[headings[-1].end():])
+            else:
+                body_pages.append(text)
+        if max_pages and number >= max_pages:
+            break
+
+    title, abstract, body = _split_front_matter("\n".join(body_pages))
+    total_seconds = time.time() - start_time
+    sections = {
+        "sha256": digest,
+        "title": title,
+        "abstract": abstract,
+        "body": body,
+        "references": "\n".join(reference_pages).strip(),
+        "pages": len(page_seconds),
+        "timings": {
+            "total_seconds": round(total_seconds, 3),
+            "page_seconds": page_seconds,
+        },
+    }
+    print(f"📄 Extracted {len(page_seconds)} pages from {pdf_path} in {total_seconds:.2f} seconds "
+          f"(slowest page {max(page_seconds, default=0):.3f}s)")
+    extraction_cache.set(key, sections)
+    return sections
+
+
+def sections_to_text(sections, max_chars=None) -> str:
+    """Render extracted sections as plain text for an agent's context."""
+    parts = [f"Title: {sections['title']}"]
+    if sections["abstract"]:
+        parts.append(f"Abstract: {sections['abstract']}")
+    parts.append(sections["body"])
+    text = "\n".join(parts)
+    return text[:max_chars] if max_chars else text
@@ -0,0 +1,156 @@
+"""Saved llama.cpp KV state for fixed prompt prefixes, so only the varying tail is evaluated."""
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from papers import content_key
+
+load_dotenv()
+
+PREFIX_CACHE_MODE = os.getenv("PROMPT_PREFIX_CACHE", "ram")  # "ram", "disk" or "off"
+PREFIX_CACHE_DIR = os.getenv("PROMPT_PREFIX_CACHE_DIR", "./uploads/kv_cache")
+# States are large: a 500-token prefix of a 7B model with a 32k vocabulary is
+# ~256 MB of f16 KV cells plus ~64 MB of logits (n_tokens x n_vocab float32),
+# so memory is bounded in bytes. Disk mode keeps every state on disk, with
+# the most recently used ones in memory within this limit.
+PREFIX_CACHE_MAX_BYTES = int(os.getenv("PROMPT_PREFIX_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def state_bytes(state) -> int:
+    """Memory held by a llama_cpp LlamaState: llama.cpp's own state plus the copied logits."""
+    return int(state.llama_state_size) + state.scores.nbytes + state.input_ids.nbytes
+
+
+class PrefixStateCache:
+    """KV state of evaluated prompt prefixes, restored before each generation.
+
+    llama.cpp only re-evaluates the tokens after the longest prefix shared
+    with what is already in its context. Loading the saved state of an
+    agent's fixed preamble therefore leaves just the per-request context and
+    task text to be prompt-processed, even when other prompts (map steps,
+    other agents) ran in between.
+    """
+
+    def __init__(self, mode=PREFIX_CACHE_MODE, directory=PREFIX_CACHE_DIR,
+                 max_bytes=PREFIX_CACHE_MAX_BYTES):
+        self.mode = mode
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._states = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.too_large = 0
+        self.tokens_reused = 0
+        self.restore_seconds = 0.0
+        if mode == "disk":
+            os.makedirs(directory, exist_ok=True)
+
+    def _key(self, client, prefix):
+        library = sys.modules[type(client).__module__.split(".")[0]]
+        # Saved state is only valid for the same weights, context size and library
+        return content_key(client.model_path, client.n_ctx(), getattr(library, "__version__", ""), prefix)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.state")
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._states.get(key)
+            if entry is not None:
+                self._states.move_to_end(key)
+                return entry[0]
+        if self.mode != "disk" or not os.path.exists(self._path(key)):
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"⚠️ Ignoring unreadable prefix state {key}: {e}")
+            return None
+        self.disk_hits += 1
+        self._remember(key, state)
+        return state
+
+    def _remember(self, key, state):
+        size = state_bytes(state)
+        with self._lock:
+            if size > self.max_bytes:
+                # Still on disk in disk mode; in RAM mode it is evaluated each time
+                self.too_large += 1
+                return
+            previous = self._states.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._states[key] = (state, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._states.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def _put(self, key, state):
+        self._remember(key, state)
+        if self.mode == "disk":
+            # Write then rename so other workers never read a partial file
+            partial = self._path(key) + f".{os.getpid()}.part"
+            with open(partial, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(partial, self._path(key))
+
+    def restore(self, llm, prefix) -> bool:
+        """Load the KV state for `prefix` into the model's context, evaluating it on a miss.
+
+        The caller must hold model_lock(llm) until its generation finishes,
+        so no other prompt replaces the restored state in between.
+        """
+        client = getattr(llm, "client", None)
+        if self.mode == "off" or client is None or not hasattr(client, "save_state"):
+            return False
+
+        start_time = time.time()
+        key = self._key(client, prefix)
+        state = self._get(key)
+        if state is not None:
+            client.load_state(state)
+            self.hits += 1
+            self.tokens_reused += state.n_tokens
+        else:
+            # Evaluating the prefix now costs nothing extra: the generation
+            # that follows starts from it instead of from scratch
+            client.reset()
+            client.eval(client.tokenize(prefix.encode("utf-8"), special=True))
+            self._put(key, client.save_state())
+            self.misses += 1
+        self.restore_seconds += time.time() - start_time
+        return True
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "entries": len(self._states),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "too_large": self.too_large,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "tokens_reused": self.tokens_reused,
+            "restore_seconds": round(self.restore_seconds, 3),
+        }
+
+
+prefix_cache = PrefixStateCache()
+
+
+def prefix_cache_stats():
+    return prefix_cache.stats()
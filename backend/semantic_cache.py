@@ -0,0 +1,228 @@
+"""Semantic query cache: reuses the result of an earlier query that means the same thing.
+
+Queries are embedded, projected to a fixed size and kept as rows of one
+float32 matrix. A lookup never scans the whole matrix: random-hyperplane
+LSH tables narrow it to the rows that could clear the similarity threshold,
+and at most SEMANTIC_CACHE_MAX_CANDIDATES of those are scored, in one
+batched cosine product. Real query embeddings are clustered around a
+direction the embedder gives every text, so hyperplanes through the origin
+barely split them; vectors are hashed relative to the mean of the first
+cached rows instead. A query in a dense region still hits some large
+buckets, so the smallest (most selective) buckets are taken first.
+"""
+import os
+import threading
+import time
+import zlib
+from itertools import islice
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "model" embeds with the loaded LLM's weights, "hash" with character n-grams
+SEMANTIC_CACHE_EMBEDDINGS = os.getenv("SEMANTIC_CACHE_EMBEDDINGS", "model")
+# Minimum cosine similarity for a hit; n-gram vectors score paraphrases lower
+DEFAULT_THRESHOLDS = {"model": 0.92, "hash": 0.85}
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0")) or None
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "100000"))
+SEMANTIC_CACHE_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "256"))
+# Most rows a lookup scores, whatever the bucket sizes
+SEMANTIC_CACHE_MAX_CANDIDATES = int(os.getenv("SEMANTIC_CACHE_MAX_CANDIDATES", "2048"))
+# 16 tables of 12 bits find a 0.92-similar row ~97% of the time (a 0.85-similar
+# one ~80%) while keeping each probe to a few dozen candidates at 100k entries
+LSH_TABLES = 16
+LSH_BITS = 12
+# Rows whose mean becomes the origin the hyperplanes split around
+CENTER_ROWS = 1024
+
+
+def hash_embedding(text, dim=SEMANTIC_CACHE_DIM):
+    """Signed feature-hashing of words and character trigrams; needs no model."""
+    vector = np.zeros(dim, dtype=np.float32)
+    padded = f" {text} "
+    features = text.split() + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    return vector
+
+
+class SemanticCache:
+    def __init__(self, capacity=SEMANTIC_CACHE_CAPACITY, dim=SEMANTIC_CACHE_DIM,
+                 threshold=SEMANTIC_CACHE_THRESHOLD, embeddings=SEMANTIC_CACHE_EMBEDDINGS,
+                 tables=LSH_TABLES, bits=LSH_BITS, max_candidates=SEMANTIC_CACHE_MAX_CANDIDATES, seed=0):
+        self.capacity = capacity
+        self.dim = dim
+        self._fixed_threshold = threshold
+        self.embeddings = embeddings
+        self.threshold = threshold or DEFAULT_THRESHOLDS.get(embeddings)
+        self.tables = tables
+        self.max_candidates = max_candidates
+        self._rng = np.random.default_rng(seed)
+        self._planes = self._rng.standard_normal((dim, tables * bits)).astype(np.float32)
+        self._bit_weights = (1 << np.arange(bits)).astype(np.int64)
+        self._center = np.zeros(dim, dtype=np.float32)
+        self._centered = False
+        self._projections = {}
+        # float32 rather than float16: numpy has no fast float16 matrix product
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._codes = np.zeros((capacity, tables), dtype=np.int64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._values = [None] * capacity
+        self._buckets = [{} for _ in range(tables)]
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.truncated = 0
+        self.candidates = 0
+        self.embed_seconds = 0.0
+        self.lookup_seconds = 0.0
+
+    def embed(self, query):
+        """Unit vector for a query, or None when semantic caching is off."""
+        if self.embeddings == "off":
+            return None
+        text = " ".join(query.lower().split())
+        start_time = time.time()
+        if self.embeddings == "model":
+            try:
+                from llm_registry import embed
+                vector = np.asarray(embed(text), dtype=np.float32)
+            except Exception as e:
+                # Vectors from different embedders are not comparable
+                print(f"⚠️ Model embeddings unavailable ({e}); semantic cache switches to hashed n-grams")
+                self.embeddings = "hash"
+                self.threshold = self._fixed_threshold or DEFAULT_THRESHOLDS["hash"]
+                self.clear()
+                vector = hash_embedding(text, self.dim)
+        else:
+            vector = hash_embedding(text, self.dim)
+        self.embed_seconds += time.time() - start_time
+        return self._prepare(vector)
+
+    def _prepare(self, vector):
+        if vector.shape[0] != self.dim:
+            # Random projection keeps cosine similarities approximately intact
+            projection = self._projections.get(vector.shape[0])
+            if projection is None:
+                projection = self._rng.standard_normal((vector.shape[0], self.dim)).astype(np.float32)
+                self._projections[vector.shape[0]] = projection
+            vector = vector @ projection
+        norm = float(np.linalg.norm(vector))
+        # A float64 query would make numpy upcast the whole matrix on every lookup
+        return (vector / norm).astype(np.float32, copy=False) if norm else None
+
+    def _signature(self, vectors):
+        """LSH codes, one per table, of a vector or of each row of a matrix."""
+        bits = ((vectors - self._center) @ self._planes > 0).reshape(*vectors.shape[:-1], self.tables, -1)
+        return bits @ self._bit_weights
+
+    def lookup(self, vector):
+        """Value of the most similar cached query at or above the threshold, else None."""
+        if vector is None:
+            return None
+        start_time = time.time()
+        codes = self._signature(vector)
+        with self._lock:
+            buckets = [bucket for table, code in enumerate(codes)
+                       if (bucket := self._buckets[table].get(int(code)))]
+            value = None
+            slot = None
+            chosen = []
+            budget = self.max_candidates
+            for bucket in sorted(buckets, key=len):
+                if len(bucket) > budget:
+                    # The first bucket that does not fit adds its newest rows and ends the probe
+                    chosen.append(islice(reversed(bucket), budget))
+                    self.truncated += 1
+                    break
+                chosen.append(bucket)
+                budget -= len(bucket)
+            if chosen:
+                candidates = set().union(*chosen)
+                self.candidates += len(candidates)
+                slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+                similarities = self._vectors[slots] @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    slot = int(slots[best])
+            if slot is not None:
+                self._last_used[slot] = time.time()
+                value = self._values[slot]
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        self.lookup_seconds += time.time() - start_time
+        return value
+
+    def add(self, vector, value):
+        if vector is None:
+            return
+        with self._lock:
+            # Under the lock, so a concurrent recentering cannot leave the codes stale
+            codes = self._signature(vector)
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                # Evict the entry that has gone longest without a hit
+                slot = int(np.argmin(self._last_used))
+                for table, code in enumerate(self._codes[slot]):
+                    self._buckets[table][int(code)].pop(slot, None)
+                self.evictions += 1
+            self._vectors[slot] = vector
+            self._codes[slot] = codes
+            self._last_used[slot] = time.time()
+            self._values[slot] = value
+            self._file(slot, codes)
+            if not self._centered and self._size >= CENTER_ROWS:
+                self._recenter()
+
+    def _file(self, slot, codes):
+        # Buckets map rows to None, so they keep the order rows were added in
+        for table, code in enumerate(codes):
+            self._buckets[table].setdefault(int(code), {})[slot] = None
+
+    def _recenter(self):
+        """Hash relative to the mean of the cached rows; called with the lock held, once."""
+        # The shared direction comes from the embedder, not the query mix, so it does not drift
+        self._center = self._vectors[:self._size].mean(axis=0)
+        self._centered = True
+        self._codes[:self._size] = self._signature(self._vectors[:self._size])
+        self._buckets = [{} for _ in range(self.tables)]
+        for slot in range(self._size):
+            self._file(slot, self._codes[slot])
+
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self._values = [None] * self.capacity
+            self._last_used[:] = 0
+            self._buckets = [{} for _ in range(self.tables)]
+            self._center[:] = 0
+            self._centered = False
+
+    def __len__(self):
+        return self._size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "embeddings": self.embeddings,
+            "entries": self._size,
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "truncated_probes": self.truncated,
+            "avg_candidates": round(self.candidates / lookups) if lookups else None,
+            "avg_lookup_ms": round(self.lookup_seconds / lookups * 1000, 3) if lookups else None,
+            "embed_seconds": round(self.embed_seconds, 3),
+            "matrix_mb": round(self._vectors.nbytes / (1024 * 1024), 1),
+        }
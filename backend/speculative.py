@@ -0,0 +1,159 @@
+"""Speculative decoding: a small draft model proposes tokens, the main model verifies them in one batch.
+
+llama-cpp-python does the verification when a Llama is built with a
+draft_model: after each sampled token it asks the draft for the next few
+tokens, evaluates all of them in one batch, keeps them up to the first one
+the main model would not have produced and drops the rest from the KV
+cache. On CPU a batch of a few tokens costs little more than one, so every
+accepted draft token is nearly free. The draft must share the main model's
+vocabulary (e.g. TinyLlama for a LLaMA-2 7B).
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from dotenv import load_dotenv
+from metrics import record_speculation
+
+load_dotenv()
+
+DRAFT_MODEL_PATH = os.getenv("DRAFT_MODEL_PATH")
+# Tokens proposed per verification pass; tasks can override it with draft_tokens
+DRAFT_TOKENS = int(os.getenv("DRAFT_TOKENS", "6"))
+DRAFT_N_THREADS = int(os.getenv("DRAFT_N_THREADS", "0")) or None
+# Every Nth call runs without drafts, measuring the plain speed the speedup is relative to
+DRAFT_BASELINE_EVERY = int(os.getenv("DRAFT_BASELINE_EVERY", "20"))
+
+
+class DraftModel:
+    """Greedy proposals from a small GGUF model, in llama_cpp's LlamaDraftModel interface.
+
+    It is only ever called from inside the main model's generate(), so the
+    main model's lock also serializes this one. Acceptance is worked out
+    from the next call: its input ends with the tokens the main model kept.
+    """
+
+    def __init__(self, model_path=DRAFT_MODEL_PATH, num_pred_tokens=DRAFT_TOKENS, n_ctx=2048,
+                 n_threads=DRAFT_N_THREADS, baseline_every=DRAFT_BASELINE_EVERY):
+        from llama_cpp import Llama
+        self.model_path = model_path
+        self.num_pred_tokens = num_pred_tokens
+        self.baseline_every = baseline_every
+        self.llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads,
+                         n_gpu_layers=0, verbose=False)
+        self._calls = 0
+        self._session = None
+        self._pending = None
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def check_compatible(self, client):
+        if self.llm.n_vocab() != client.n_vocab():
+            raise ValueError(f"Draft model {self.model_path} has a vocabulary of {self.llm.n_vocab()} tokens, "
+                             f"the main model {client.n_vocab()}; speculative decoding needs the same tokenizer")
+
+    def __call__(self, input_ids, **kwargs):
+        session = self._session
+        if session is None:
+            return np.array([], dtype=np.intc)
+        if session["first_call"] is None:
+            session["first_call"] = time.perf_counter()
+        session["passes"] += 1
+        if self._pending is not None:
+            start, proposal = self._pending
+            kept = input_ids[start:start + len(proposal)]
+            accepted = 0
+            while accepted < len(kept) and kept[accepted] == proposal[accepted]:
+                accepted += 1
+            session["proposed"] += len(proposal)
+            session["accepted"] += accepted
+            self._pending = None
+
+        n = session["draft_tokens"]
+        if n <= 0 or len(input_ids) + n >= self.llm.n_ctx():
+            return np.array([], dtype=np.intc)
+        proposal = []
+        # Reuses the draft's KV cache for the prefix it already evaluated
+        for token in self.llm.generate(input_ids.tolist(), top_k=1, temp=0.0, repeat_penalty=1.0):
+            proposal.append(token)
+            if len(proposal) >= n:
+                break
+        self._pending = (len(input_ids), proposal)
+        return np.array(proposal, dtype=np.intc)
+
+    @contextmanager
+    def session(self, draft_tokens=None, label="default"):
+        """Account one generation under a label, with a per-call draft length."""
+        self._calls += 1
+        if draft_tokens is None:
+            draft_tokens = self.num_pred_tokens
+        # Plain decoding every so often, so the speedup is measured, not assumed
+        baseline = bool(self.baseline_every) and self._calls % self.baseline_every == 0
+        self._session = {"draft_tokens": 0 if baseline else draft_tokens, "first_call": None,
+                         "passes": 0, "proposed": 0, "accepted": 0}
+        self._pending = None
+        try:
+            yield
+        finally:
+            session, self._session, self._pending = self._session, None, None
+            if session["first_call"] is not None:
+                self._record(label, session, time.perf_counter() - session["first_call"])
+
+    def _record(self, label, session, seconds):
+        speculative = session["draft_tokens"] > 0
+        # Each verification pass keeps the accepted drafts plus one token of the main model's own
+        generated = session["passes"] + session["accepted"]
+        record_speculation(label, session["proposed"], session["accepted"], generated, speculative)
+        with self._lock:
+            stats = self._stats.setdefault(label, {
+                "draft_tokens": session["draft_tokens"], "calls": 0, "proposed": 0, "accepted": 0,
+                "passes": 0, "speculative_tokens": 0, "speculative_seconds": 0.0,
+                "baseline_tokens": 0, "baseline_seconds": 0.0})
+            if speculative:
+                stats["draft_tokens"] = session["draft_tokens"]
+                stats["calls"] += 1
+                stats["proposed"] += session["proposed"]
+                stats["accepted"] += session["accepted"]
+                stats["passes"] += session["passes"]
+                stats["speculative_tokens"] += generated
+                stats["speculative_seconds"] += seconds
+            else:
+                stats["baseline_tokens"] += generated
+                stats["baseline_seconds"] += seconds
+
+    def stats(self):
+        """Acceptance rate, tokens per main-model pass and measured speedup, per label."""
+        with self._lock:
+            snapshot = {label: dict(stats) for label, stats in self._stats.items()}
+        report = {}
+        for label, stats in snapshot.items():
+            speculative_rate = (stats["speculative_tokens"] / stats["speculative_seconds"]
+                                if stats["speculative_seconds"] else None)
+            baseline_rate = (stats["baseline_tokens"] / stats["baseline_seconds"]
+                             if stats["baseline_seconds"] else None)
+            report[label] = {
+                "draft_tokens": stats["draft_tokens"],
+                "calls": stats["calls"],
+                "acceptance_rate": round(stats["accepted"] / stats["proposed"], 3) if stats["proposed"] else None,
+                "tokens_per_pass": (round(stats["speculative_tokens"] / stats["passes"], 2)
+                                    if stats["passes"] else None),
+                "tokens_per_second": round(speculative_rate, 2) if speculative_rate else None,
+                "baseline_tokens_per_second": round(baseline_rate, 2) if baseline_rate else None,
+                "speedup": (round(speculative_rate / baseline_rate, 2)
+                            if speculative_rate and baseline_rate else None),
+            }
+        return {"model_path": self.model_path, "default_draft_tokens": self.num_pred_tokens, "tasks": report}
+
+
+@contextmanager
+def speculation(client, kwargs):
+    """Apply and strip the per-call draft settings (draft_tokens, draft_label) from LLM kwargs."""
+    draft_tokens = kwargs.pop("draft_tokens", None)
+    label = kwargs.pop("draft_label", None) or "default"
+    draft = getattr(client, "draft_model", None)
+    if not isinstance(draft, DraftModel):
+        yield kwargs
+        return
+    with draft.session(draft_tokens, label):
+        yield kwargs
@@ -0,0 +1,98 @@
+"""Hierarchical map-reduce condensing of documents longer than the model context."""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from cache_store import get_cache
+from custom_crew import llm_identity
+from papers import content_key
+
+MAP_PROMPT = """Summarize the following section of a research paper in 3-4 sentences.
+Keep the problem, methods, key results and numbers. No preamble.
+
+{text}
+
+Summary:"""
+
+# Output budget of one map call and the prompt overhead around each chunk
+MAP_MAX_TOKENS = int(os.getenv("SUMMARY_MAP_MAX_TOKENS", "200"))
+MAP_PROMPT_OVERHEAD = 64
+# How many tokens of condensed text the final (reduce) prompt may receive
+CONTEXT_TOKENS = int(os.getenv("SUMMARY_CONTEXT_TOKENS", "1024"))
+# Map calls share one llama.cpp context through the model lock, so extra
+# workers only overlap tokenization and caching unless a model server is used
+MAP_WORKERS = int(os.getenv("SUMMARY_MAP_WORKERS", "2"))
+MAX_LEVELS = 3
+
+chunk_cache = get_cache("chunk_summaries")
+
+
+def settings_fingerprint() -> str:
+    """Changes whenever condensing would produce different text."""
+    return content_key(MAP_PROMPT, MAP_MAX_TOKENS, CONTEXT_TOKENS)
+
+
+def _split_oversized(piece, llm, max_tokens):
+    """Split a paragraph that alone exceeds the budget, by sentence then by word."""
+    sentences = re.split(r'(?<=[.!?])\s+', piece)
+    if len(sentences) == 1:
+        words = piece.split()
+        # Rough words-per-chunk from this piece's own token density
+        per_chunk = max(1, len(words) * max_tokens // max(llm.get_num_tokens(piece), 1))
+        return [" ".join(words[i:i + per_chunk]) for i in range(0, len(words), per_chunk)]
+    return sentences
+
+
+def chunk_text(text, llm, max_tokens):
+    """Pack paragraphs into chunks of at most max_tokens model tokens."""
+    pending = [p.strip() for p in re.split(r'\n\s*\n', text) if p.strip()]
+    chunks = []
+    current = []
+    current_tokens = 0
+    while pending:
+        piece = pending.pop(0)
+        tokens = llm.get_num_tokens(piece)
+        if tokens > max_tokens:
+            parts = _split_oversized(piece, llm, max_tokens)
+            if len(parts) > 1:
+                pending[:0] = parts
+                continue
+            # A single unbreakable token run; llama.cpp truncates it if needed
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def summarize_chunk(chunk, llm) -> str:
+    """Map step for one chunk, memoized so retries only pay for new chunks."""
+    key = content_key(chunk, MAP_PROMPT, MAP_MAX_TOKENS, llm_identity(llm))
+    summary = chunk_cache.get(key)
+    if summary is None:
+        summary = llm.invoke(MAP_PROMPT.format(text=chunk), max_tokens=MAP_MAX_TOKENS).strip()
+        chunk_cache.set(key, summary)
+    return summary
+
+
+def condense(text, llm, context_tokens=CONTEXT_TOKENS) -> str:
+    """Map-reduce text until it fits in context_tokens, returning partial summaries.
+
+    Text that already fits is returned unchanged; the final paragraph is
+    left to the caller's own prompt so it can change without re-running
+    the map step.
+    """
+    n_ctx = getattr(llm, "n_ctx", 2048)
+    chunk_tokens = n_ctx - MAP_MAX_TOKENS - MAP_PROMPT_OVERHEAD
+    for level in range(MAX_LEVELS):
+        if llm.get_num_tokens(text) <= context_tokens:
+            return text
+        chunks = chunk_text(text, llm, chunk_tokens)
+        print(f"🧩 Condensing level {level}: {len(chunks)} chunks of ≤{chunk_tokens} tokens")
+        with ThreadPoolExecutor(max_workers=MAP_WORKERS, thread_name_prefix="summary-map") as pool:
+            partials = list(pool.map(lambda chunk: summarize_chunk(chunk, llm), chunks))
+        text = "\n\n".join(partials)
+    # Still too long after MAX_LEVELS reductions: keep what fits
+    return chunk_text(text, llm, context_tokens)[0]
@@ -1,27 +1,17 @@
 from custom_crew import CustomAgent, CustomTask
-from langchain_community.llms import LlamaCpp
+from llm_registry import get_llm
 from tools import process_pdf, summarize_text, generate_audio
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Configure Llama model
-llama_llm = LlamaCpp(
-    model_path="./models/llama-2-7b.Q4_K_M.gguf",
-    temperature=0.7,
-    max_tokens=2000,
-    n_ctx=2048,
-    n_gpu_layers=40,
-    verbose=False
-)
-
 def search_task():
     researcher = CustomAgent(
         role="Senior Research Analyst",
         goal="Find and analyze cutting-edge research papers",
         backstory="Expert researcher with 10 years' experience in ML paper analysis.",
         tools=[process_pdf],
-        llm=llama_llm
+        llm=get_llm()
     )
     return CustomTask(
         description="Find 5 recent papers about {query} on arXiv",
@@ -30,32 +20,55 @@ def search_task():
         tools=["process_pdf"]
     )
 
-def summarize_task():
+def summarize_task(paper_id, depends_on=None):
     writer = CustomAgent(
         role="Technical Writer",
         goal="Write concise summaries of research papers",
         backstory="PhD in Computer Science with expertise in summarization.",
-        tools=[summarize_text],
-        llm=llama_llm
+        tools=[process_pdf, summarize_text],
+        llm=get_llm()
     )
+    # The paper is part of the description, so each paper's task has its own output
     return CustomTask(
-        description="Summarize the paper with ID: {paper_id}",
+        description=f"Summarize the paper with ID: {paper_id}",
         expected_output="3-paragraph technical summary in markdown format",
         agent=writer,
-        tools=["summarize_text"]
+        tools=["process_pdf"],
+        inputs={"arxiv_id": paper_id},
+        depends_on=depends_on
+    )
+
+def podcast_task(depends_on=None):
+    podcaster = CustomAgent(
+        role="Podcast Producer",
+        goal="Create engaging audio summaries",
+        backstory="Audio engineer with 5 years' TTS experience.",
+        tools=[generate_audio],
+        llm=get_llm()
+    )
+    return CustomTask(
+        description="Write a short podcast script that presents the summarized papers",
+        expected_output="Podcast script in plain spoken sentences",
+        agent=podcaster,
+        tools=[],
+        depends_on=depends_on
     )
 
-def podcast_task():
+def audio_task(output_path, depends_on=None):
     podcaster = CustomAgent(
         role="Podcast Producer",
         goal="Create engaging audio summaries",
         backstory="Audio engineer with 5 years' TTS experience.",
         tools=[generate_audio],
-        llm=llama_llm
+        llm=get_llm()
     )
+    # The upstream script is what generate_audio reads aloud
     return CustomTask(
-        description="Generate a podcast script for the summary",
-        expected_output="Path to generated MP3 file",
+        description="Report the audio file generated for the podcast script",
+        expected_output="Path to the generated WAV file",
         agent=podcaster,
-        tools=["generate_audio"]
-    )
\ No newline at end of file
+        tools=["generate_audio"],
+        inputs={"output_path": output_path},
+        upstream_input="text",
+        depends_on=depends_on
+    )
@@ -0,0 +1,72 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from arxiv_index import ArxivIndex
+
+
+def write_records(path, ids, mode="w"):
+    with open(path, mode) as f:
+        for paper_id in ids:
+            f.write(json.dumps({"id": paper_id, "title": f"Paper {paper_id} on graph networks",
+                                "abstract": "We study graphs.", "authors": "A. Author",
+                                "categories": "cs.LG", "update_date": "2024-01-01"}) + "\n")
+
+
+def test_grown_file_resumes_where_it_stopped(tmp_path):
+    index = ArxivIndex(str(tmp_path / "index.db"))
+    snapshot = tmp_path / "snapshot.jsonl"
+    write_records(snapshot, [f"2401.{i:05d}" for i in range(10)])
+    assert index.ingest_file(str(snapshot)) == 10
+    write_records(snapshot, [f"2401.{i:05d}" for i in range(10, 15)], mode="a")
+    assert index.ingest_file(str(snapshot)) == 5
+    assert index.ingest_file(str(snapshot)) == 0
+    assert index.paper_count() == 15
+
+
+def test_replaced_file_is_ingested_from_the_start(tmp_path):
+    index = ArxivIndex(str(tmp_path / "index.db"))
+    snapshot = tmp_path / "snapshot.jsonl"
+    write_records(snapshot, [f"2401.{i:05d}" for i in range(10)])
+    index.ingest_file(str(snapshot))
+    # A different, larger file at the same path must not be read from the old offset
+    write_records(snapshot, [f"2402.{i:05d}" for i in range(30)])
+    assert index.ingest_file(str(snapshot)) == 30
+    assert index.paper_count() == 40
+    assert index.search("2402.00000")[0]["id"] == "2402.00000"
+    assert index.stats()["records_read"] == 30
+
+
+@pytest.fixture
+def search_client(tmp_path, monkeypatch):
+    import api
+    index = ArxivIndex(str(tmp_path / "index.db"))
+    monkeypatch.setattr(api, "arxiv_index", index)
+    return index, TestClient(api.app)
+
+
+def test_search_answers_from_the_index(search_client, tmp_path):
+    index, client = search_client
+    snapshot = str(tmp_path / "snapshot.jsonl")
+    write_records(snapshot, [f"2401.{i:05d}" for i in range(10)])
+    index.ingest_file(snapshot)
+    response = client.post("/search", json={"query": "graph networks"})
+    assert response.status_code == 200
+    assert all("https://arxiv.org/abs/2401." in line for line in response.text.splitlines())
+
+
+def test_search_without_index_matches_does_not_ask_the_model(search_client, tmp_path, monkeypatch):
+    import api
+    index, client = search_client
+    snapshot = str(tmp_path / "snapshot.jsonl")
+    write_records(snapshot, ["2401.00001"])
+    index.ingest_file(snapshot)
+    monkeypatch.setattr(api, "get_llm", lambda: pytest.fail("the model was asked to invent papers"))
+    response = client.post("/search", json={"query": "protein folding"})
+    assert response.status_code == 404
+
+
+def test_search_falls_back_to_the_model_while_the_index_is_empty(search_client):
+    _, client = search_client
+    response = client.post("/search", json={"query": "protein folding"})
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 5
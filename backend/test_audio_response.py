@@ -0,0 +1,88 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+import api
+
+client = TestClient(api.app)
+
+
+@pytest.fixture(scope="module")
+def audio():
+    client.post("/store-summary/range-test", json={"summary": "A short summary to turn into speech."})
+    response = client.post("/audio/range-test")
+    assert response.status_code == 200
+    return response.content, response.headers["etag"]
+
+
+def get(headers):
+    return client.get("/audio/range-test", headers=headers)
+
+
+def test_if_none_match_returns_304(audio):
+    _, etag = audio
+    response = get({"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_single_range_returns_206(audio):
+    body, _ = audio
+    response = get({"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-19/{len(body)}"
+    assert response.content == body[10:20]
+
+
+def test_open_and_suffix_ranges(audio):
+    body, _ = audio
+    assert get({"Range": f"bytes={len(body) - 5}-"}).content == body[-5:]
+    response = get({"Range": "bytes=-8"})
+    assert response.status_code == 206
+    assert response.content == body[-8:]
+    # An end past the file is clamped to its last byte
+    assert get({"Range": "bytes=0-99999999"}).content == body
+
+
+@pytest.mark.parametrize("range_header", ["bytes=999999999-", "bytes=-0"])
+def test_unsatisfiable_range_returns_416(audio, range_header):
+    body, _ = audio
+    response = get({"Range": range_header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(body)}"
+
+
+@pytest.mark.parametrize("range_header", ["bytes=0-1,5-9", "items=0-10", "bytes=abc", "bytes=-", "bytes=9-3"])
+def test_unparseable_range_is_ignored(audio, range_header):
+    body, _ = audio
+    response = get({"Range": range_header})
+    assert response.status_code == 200
+    assert response.content == body
+
+
+def test_stale_if_range_returns_whole_file(audio):
+    body, _ = audio
+    response = get({"Range": "bytes=0-9", "If-Range": '"some-other-version"'})
+    assert response.status_code == 200
+    assert response.content == body
+
+
+def test_blank_summary_is_rejected_without_generating():
+    client.post("/store-summary/blank-test", json={"summary": "   \n "})
+    for response in (client.post("/audio/blank-test"), client.get("/audio/blank-test/stream"),
+                     client.post("/jobs/audio/blank-test")):
+        assert response.status_code == 422
+        assert "nothing to turn into speech" in response.json()["detail"]
+
+
+def test_blank_text_raises_instead_of_reporting_success(tmp_path):
+    from audio_generator import generate_audio_file
+    output_path = tmp_path / "blank.wav"
+    with pytest.raises(ValueError):
+        generate_audio_file("  ", str(output_path))
+    assert not output_path.exists()
+
+
+def test_missing_audio_file_is_404(tmp_path):
+    with pytest.raises(HTTPException) as error:
+        api.audio_file_response(None, tmp_path / "gone.wav", '"gone"', "gone.wav")
+    assert error.value.status_code == 404
@@ -0,0 +1,65 @@
+import pytest
+import cache_store
+from cache_store import MemoryBackend, NamespacedCache, SQLiteBackend
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        self.now += 0.001  # Every call is a distinct instant, as LRU order needs
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_store.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.db"))
+    return MemoryBackend()
+
+
+def test_least_recently_used_entry_is_evicted(backend, clock):
+    cache = NamespacedCache("test", backend, max_entries=2, ttl_seconds=0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["entries"] == 2
+
+
+def test_entries_expire_after_their_ttl(backend, clock):
+    cache = NamespacedCache("test", backend, max_entries=10, ttl_seconds=60)
+    cache.set("short", "value", ttl_seconds=5)
+    cache.set("long", "value")
+    clock.now += 10
+    assert cache.get("short") is None
+    assert cache.get("long") == "value"
+    clock.now += 60
+    assert "long" not in cache
+    assert cache.stats()["entries"] == 0
+
+
+def test_namespaces_are_bounded_separately(backend, clock):
+    summaries = NamespacedCache("summaries", backend, max_entries=1, ttl_seconds=0)
+    searches = NamespacedCache("searches", backend, max_entries=1, ttl_seconds=0)
+    summaries.set("key", {"summary": "text"})
+    searches.set("key", ["result"])
+    assert summaries.get("key") == {"summary": "text"}
+    assert searches.get("key") == ["result"]
+    assert summaries.stats()["hits"] == 1
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    NamespacedCache("test", SQLiteBackend(path)).set("key", "value")
+    assert NamespacedCache("test", SQLiteBackend(path)).get("key") == "value"
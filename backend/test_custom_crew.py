@@ -0,0 +1,139 @@
+import threading
+import time
+import pytest
+from custom_crew import CustomAgent, CustomCrew, CustomTask, tool_spec
+from fake_backends import FakeLlamaCpp
+
+
+class RecordingAgent(CustomAgent):
+    """Answers with the task text after a delay, recording when each task ran and what it saw."""
+
+    def __init__(self, delays=None):
+        super().__init__(role="Recorder", goal="Record", backstory="Test agent", tools=[], llm=FakeLlamaCpp())
+        self.delays = delays or {}
+        self.calls = {}
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def execute_task(self, task_description, context="", generation=None):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        start = time.monotonic()
+        time.sleep(self.delays.get(task_description, 0.05))
+        with self._lock:
+            self.running -= 1
+            self.calls[task_description] = {"context": context, "start": start, "end": time.monotonic()}
+        return f"output of {task_description}"
+
+
+def task(agent, name, depends_on=None):
+    return CustomTask(description=name, expected_output="text", agent=agent, tools=[], depends_on=depends_on)
+
+
+def test_dependency_outside_the_crew_is_rejected():
+    agent = RecordingAgent()
+    outside = task(agent, "outside")
+    with pytest.raises(ValueError, match="outside the crew"):
+        CustomCrew(tasks=[task(agent, "inside", depends_on=[outside])], agents=[agent])
+
+
+def test_dependency_cycle_is_rejected():
+    agent = RecordingAgent()
+    first, second, third = task(agent, "first"), task(agent, "second"), task(agent, "third")
+    first.depends_on = [third]
+    second.depends_on = [first]
+    third.depends_on = [second]
+    with pytest.raises(ValueError, match="cycle"):
+        CustomCrew(tasks=[first, second, third], agents=[agent], process="parallel")
+
+
+def test_sequential_crew_rejects_dependency_on_a_later_task():
+    agent = RecordingAgent()
+    later = task(agent, "later")
+    with pytest.raises(ValueError, match="later task"):
+        CustomCrew(tasks=[task(agent, "earlier", depends_on=[later]), later], agents=[agent])
+    # The same graph is fine when tasks are scheduled by their dependencies
+    CustomCrew(tasks=[task(agent, "earlier", depends_on=[later]), later], agents=[agent], process="parallel")
+
+
+def test_unknown_process_is_rejected():
+    agent = RecordingAgent()
+    with pytest.raises(ValueError, match="Unknown process"):
+        CustomCrew(tasks=[task(agent, "only")], agents=[agent], process="hierarchical")
+
+
+def test_parallel_crew_runs_independent_tasks_together_and_dependents_after():
+    agent = RecordingAgent(delays={"slow": 0.3, "fast": 0.1})
+    slow, fast = task(agent, "slow"), task(agent, "fast")
+    merge = task(agent, "merge", depends_on=[slow, fast])
+    crew = CustomCrew(tasks=[merge, slow, fast], agents=[agent], process="parallel", max_workers=2)
+    outputs = crew.kickoff()
+
+    assert list(outputs) == ["merge", "slow", "fast"]  # Task order, not completion order
+    assert agent.max_running == 2
+    calls = agent.calls
+    assert calls["merge"]["start"] >= max(calls["slow"]["end"], calls["fast"]["end"])
+    # A dependent sees exactly its dependencies' outputs, in declaration order
+    assert calls["merge"]["context"] == "output of slow\noutput of fast"
+    assert set(outputs.timings) == {"merge", "slow", "fast"}
+
+
+def test_sequential_crew_passes_every_earlier_output_by_default():
+    agent = RecordingAgent()
+    crew = CustomCrew(tasks=[task(agent, "one"), task(agent, "two"), task(agent, "three")], agents=[agent])
+    crew.kickoff()
+    assert agent.max_running == 1
+    assert agent.calls["three"]["context"] == "output of one\noutput of two"
+
+
+def test_failing_task_fails_the_parallel_crew():
+    agent = RecordingAgent()
+
+    class Broken(CustomTask):
+        def execute(self, inputs, upstream=None):
+            raise RuntimeError("task failed")
+
+    broken = Broken(description="broken", expected_output="text", agent=agent, tools=[])
+    crew = CustomCrew(tasks=[broken, task(agent, "after", depends_on=[broken])], agents=[agent],
+                      process="parallel")
+    with pytest.raises(RuntimeError, match="task failed"):
+        crew.kickoff()
+    assert "after" not in agent.calls
+
+
+def test_task_inputs_and_upstream_outputs_reach_the_tools():
+    calls = []
+
+    @tool_spec(inputs=["text", "output_path"], required=["text"], memoize=False)
+    def speak(text, output_path="out.wav"):
+        calls.append((text, output_path))
+        return output_path
+
+    @tool_spec(inputs=["arxiv_id"], memoize=False)
+    def fetch(arxiv_id):
+        calls.append(arxiv_id)
+        return f"paper {arxiv_id}"
+
+    reader = CustomAgent(role="Reader", goal="Read", backstory="Test agent", tools=[fetch], llm=FakeLlamaCpp())
+    speaker = RecordingAgent()
+    speaker.tools = {"speak": speak}
+    first = CustomTask(description="first", expected_output="text", agent=reader, tools=["fetch"],
+                       inputs={"arxiv_id": "1706.03762"})
+    second = CustomTask(description="second", expected_output="text", agent=reader, tools=["fetch"],
+                        inputs={"arxiv_id": "1810.04805"})
+    audio = CustomTask(description="audio", expected_output="path", agent=speaker, tools=["speak"],
+                       inputs={"output_path": "podcast.wav"}, upstream_input="text", depends_on=[first, second])
+    outputs = CustomCrew(tasks=[first, second, audio], agents=[reader, speaker], process="parallel").kickoff()
+
+    assert sorted(call for call in calls if isinstance(call, str)) == ["1706.03762", "1810.04805"]
+    assert (outputs["first"] + "\n\n" + outputs["second"], "podcast.wav") in calls
+    assert "Tool speak output: podcast.wav" in speaker.calls["audio"]["context"]
+
+
+def test_task_inputs_are_part_of_the_fingerprint():
+    agent = RecordingAgent()
+    one = CustomTask(description="same", expected_output="text", agent=agent, tools=[], inputs={"arxiv_id": "1"})
+    two = CustomTask(description="same", expected_output="text", agent=agent, tools=[], inputs={"arxiv_id": "2"})
+    assert one.fingerprint() != two.fingerprint()
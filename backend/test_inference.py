@@ -0,0 +1,176 @@
+import asyncio
+import json
+import threading
+import time
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+import api
+from fake_backends import FakeLlamaCpp
+from inference import InferencePool, SingleFlight
+
+
+@pytest.fixture
+def generations(monkeypatch):
+    """Counts LLM generations, each slow enough for a second request to arrive meanwhile."""
+    calls = []
+    tokens = FakeLlamaCpp._tokens
+
+    def slow_tokens(self, prompt, stop, max_tokens):
+        calls.append(prompt)
+        for piece in tokens(self, prompt, stop, max_tokens)[:20]:
+            time.sleep(0.01)
+            yield piece
+    monkeypatch.setattr(FakeLlamaCpp, "_tokens", slow_tokens)
+    return calls
+
+
+def summary_events(body):
+    events = [block.split("\n", 1) for block in body.split("\n\n") if block]
+    return [(name.removeprefix("event: "), json.loads(data.removeprefix("data: "))) for name, data in events]
+
+
+async def stream_twice(paper_id):
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(
+            client.post("/summarize-direct/stream", json={"paper_id": paper_id}) for _ in range(2)))
+
+
+def test_identical_streams_share_one_generation(generations):
+    responses = asyncio.run(stream_twice("2402.00001"))
+    assert len(generations) == 1
+    summaries = []
+    for response in responses:
+        events = summary_events(response.text)
+        assert events[-1][0] == "done"
+        tokens = "".join(data["text"] for name, data in events if name == "token")
+        assert api.clean_summary(tokens) == events[-1][1]["summary"]
+        summaries.append(events[-1][1]["summary"])
+    assert summaries[0] == summaries[1]
+    assert api.flight_stats()["summary_stream"]["in_flight"] == 0
+
+
+def test_streamed_summary_is_cached(generations):
+    first = asyncio.run(stream_twice("2402.00002"))[0]
+    summary = summary_events(first.text)[-1][1]["summary"]
+    assert api.summary_cache.get("2402.00002") == summary
+    again = summary_events(asyncio.run(stream_twice("2402.00002"))[0].text)
+    assert len(generations) == 1
+    assert again == [("token", {"text": summary}), ("done", again[-1][1])]
+    assert again[-1][1]["summary"] == summary
+
+
+def test_late_listener_replays_the_stream():
+    async def scenario():
+        flight = SingleFlight("test")
+        ready = asyncio.Event()
+        starts = []
+
+        async def source():
+            starts.append(1)
+            yield "a"
+            await ready.wait()
+            yield "b"
+
+        first = flight.stream("key", source)
+        assert await first.__anext__() == "a"
+        second = flight.stream("key", source)
+        ready.set()
+        assert [item async for item in second] == ["a", "b"]
+        assert [item async for item in first] == ["b"]
+        return starts, flight.stats()
+
+    starts, stats = asyncio.run(scenario())
+    assert starts == [1]
+    assert stats["leaders"] == 1 and stats["duplicates"] == 1
+
+
+def test_stream_stops_when_every_listener_leaves():
+    async def scenario():
+        flight = SingleFlight("test")
+        closed = asyncio.Event()
+
+        async def source():
+            try:
+                while True:
+                    yield "token"
+                    await asyncio.sleep(0)
+            finally:
+                closed.set()
+
+        listeners = [flight.stream("key", source) for _ in range(2)]
+        for listener in listeners:
+            await listener.__anext__()
+        await listeners[0].aclose()
+        await asyncio.sleep(0.01)
+        assert not closed.is_set()
+        await listeners[1].aclose()
+        await asyncio.wait_for(closed.wait(), 1)
+        await asyncio.sleep(0)
+        return flight.stats()
+
+    assert asyncio.run(scenario())["in_flight"] == 0
+
+
+def test_full_pool_sheds_with_retry_after(monkeypatch):
+    pool = InferencePool("llm", max_workers=1, max_queue=0)
+    monkeypatch.setattr(api, "llm_pool", pool)
+    release = threading.Event()
+    monkeypatch.setattr(FakeLlamaCpp, "_answer", lambda self, prompt: release.wait(5) and "Held answer.")
+    client = TestClient(api.app)
+    held = {}
+    worker = threading.Thread(target=lambda: held.update(
+        response=client.post("/summarize-direct", json={"paper_id": "2403.00001"})))
+    worker.start()
+    try:
+        deadline = time.time() + 5
+        while pool.stats()["running"] < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        for path in ("/summarize-direct", "/summarize-direct/stream"):
+            response = client.post(path, json={"paper_id": "2403.00002"})
+            assert response.status_code == 503
+            assert int(response.headers["Retry-After"]) >= 1
+    finally:
+        release.set()
+        worker.join()
+        pool.shutdown()
+    assert held["response"].status_code == 200
+    assert pool.stats()["rejected"] == 2
+
+
+def test_single_flight_runs_identical_calls_once():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        assert await flight.do("key", work) == "result"  # Finished flights are not reused
+        return results, calls, flight.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == ["result"] * 5
+    assert len(calls) == 2
+    assert stats == {"in_flight": 0, "leaders": 2, "duplicates": 4}
+
+
+def test_single_flight_leader_cancel_spares_followers():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.01)
+            return "result"
+
+        leader = asyncio.ensure_future(flight.do("key", work))
+        follower = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower, leader.cancelled()
+
+    assert asyncio.run(scenario()) == ("result", True)
@@ -0,0 +1,77 @@
+import pytest
+import jobs
+from jobs import JobStore, job_handler, run_job
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(jobs.time, "time", lambda: now[0])
+    monkeypatch.setattr(jobs, "JOB_STALE_SECONDS", 120)
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 2)
+    return now
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def test_claim_takes_the_oldest_queued_job_once(store, clock):
+    first = store.submit("echo", {"n": 1})
+    clock[0] += 1
+    store.submit("echo", {"n": 2})
+    job = store.claim("worker-a", ["echo"])
+    assert job["id"] == first["id"]
+    assert job["status"] == "running" and job["worker"] == "worker-a" and job["attempts"] == 1
+    assert store.claim("worker-b", ["echo"])["payload"] == {"n": 2}
+    assert store.claim("worker-b", ["echo"]) is None
+    assert store.claim("worker-b", ["other"]) is None
+
+
+def test_heartbeat_keeps_a_running_job_from_being_requeued(store, clock):
+    job = store.submit("echo", {})
+    store.claim("worker-a", ["echo"])
+    clock[0] += 100
+    store.heartbeat(job["id"])
+    clock[0] += 100
+    assert store.requeue_stale() == 0
+    assert store.get(job["id"])["status"] == "running"
+
+
+def test_stale_job_is_requeued_then_failed_after_max_attempts(store, clock):
+    job = store.submit("echo", {})
+    store.claim("worker-a", ["echo"])
+    clock[0] += 121  # The worker died without checking in
+    assert store.requeue_stale() == 1
+    requeued = store.get(job["id"])
+    assert requeued["status"] == "queued" and requeued["worker"] is None
+
+    assert store.claim("worker-b", ["echo"])["attempts"] == 2
+    clock[0] += 121
+    assert store.requeue_stale() == 0
+    failed = store.get(job["id"])
+    assert failed["status"] == "failed"
+    assert failed["error"] == "Worker stopped responding"
+
+
+def test_run_job_records_result_progress_and_errors(store, clock):
+    @job_handler("test-double")
+    def double(payload, progress):
+        progress(0.5, "Halfway")
+        return {"value": payload["value"] * 2}
+
+    @job_handler("test-broken")
+    def broken(payload, progress):
+        raise ValueError("bad input")
+
+    done = store.submit("test-double", {"value": 21})
+    run_job(store, store.claim("worker-a", ["test-double"]))
+    finished = store.get(done["id"])
+    assert finished["status"] == "done" and finished["progress"] == 1
+    assert finished["result"] == {"value": 42}
+
+    failed = store.submit("test-broken", {})
+    run_job(store, store.claim("worker-a", ["test-broken"]))
+    assert store.get(failed["id"])["status"] == "failed"
+    assert store.get(failed["id"])["error"] == "bad input"
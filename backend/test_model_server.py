@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SYNTHESIZE = """
+import llm_registry
+llm_registry.use_local_models()
+from model_server import ModelServer
+pcm, sample_rate, seconds = ModelServer("unused.sock").op_synthesize("Hello there, this is a test.")
+print(len(pcm), sample_rate)
+"""
+
+
+def test_synthesize_in_worker_processes_stays_local(tmp_path):
+    # The server's TTS worker processes must not forward back to the server
+    # their settings (or .env) point at; that request would never be answered
+    env = dict(os.environ, MODEL_SERVER_ADDRESS=str(tmp_path / "model-server.sock"), TTS_PROCESSES="1",
+               PYTHONPATH=BACKEND_DIR)
+    result = subprocess.run([sys.executable, "-c", SYNTHESIZE], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    size, sample_rate = result.stdout.split()[-2:]
+    assert int(size) > 0 and int(sample_rate) > 0
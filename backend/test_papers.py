@@ -0,0 +1,32 @@
+import pytest
+from papers import canonical_arxiv_id, paper_key
+
+
+@pytest.mark.parametrize("text, arxiv_id", [
+    ("2101.00001", "2101.00001"),
+    ("arXiv:2101.00001v2", "2101.00001v2"),
+    ("https://arxiv.org/abs/2101.00001?context=cs", "2101.00001"),
+    ("arxiv.org/pdf/2101.00001v2.pdf", "2101.00001v2"),
+    ("http://export.arxiv.org/abs/2101.00001/", "2101.00001"),
+    ("hep-th/9901001", "hep-th/9901001"),
+    ("https://arxiv.org/abs/hep-th/9901001v1", "hep-th/9901001v1"),
+    ("math.AG/0101001", "math.AG/0101001"),
+])
+def test_arxiv_ids_and_urls(text, arxiv_id):
+    assert canonical_arxiv_id(text) == arxiv_id
+
+
+@pytest.mark.parametrize("text", [
+    "https://example.com/foo/1234567",
+    "https://example.com/abs/2101.00001",
+    "https://notarxiv.org/abs/2101.00001",
+    "foo/1234567",
+    "a paper about transformers",
+])
+def test_other_links_have_no_arxiv_id(text):
+    assert canonical_arxiv_id(text) is None
+
+
+def test_paper_keys_of_unrelated_links_differ():
+    assert paper_key("https://example.com/foo/1234567") != paper_key("https://example.org/foo/1234567")
+    assert paper_key("https://arxiv.org/abs/2101.00001") == paper_key("arxiv.org/pdf/2101.00001.pdf")
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+from fake_backends import FakeLlamaClient
+from prompt_cache import PrefixStateCache, state_bytes
+
+PREFIX = "You are a careful research assistant. Summarize papers in plain words."
+
+
+def model(**kwargs):
+    return SimpleNamespace(client=FakeLlamaClient(prompt_tokens_per_second=1e6, **kwargs))
+
+
+def test_miss_evaluates_the_prefix_and_a_hit_restores_it():
+    cache = PrefixStateCache(mode="ram")
+    llm = model()
+    assert cache.restore(llm, PREFIX)
+    prefix_tokens = llm.client.tokens_evaluated
+    assert prefix_tokens == len(PREFIX.split())
+
+    llm.client.eval([1, 2, 3])  # A generation moves the context on
+    assert cache.restore(llm, PREFIX)
+    assert llm.client.tokens_evaluated == prefix_tokens + 3  # Nothing evaluated again
+    assert llm.client.input_ids == llm.client.tokenize(PREFIX.encode())
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["tokens_reused"]) == (1, 1, prefix_tokens)
+
+
+def test_state_of_another_model_is_not_restored():
+    cache = PrefixStateCache(mode="ram")
+    cache.restore(model(), PREFIX)
+    other = model(n_ctx=4096)
+    cache.restore(other, PREFIX)
+    assert other.client.tokens_evaluated > 0
+    assert cache.stats()["misses"] == 2
+
+
+def test_memory_is_bounded_in_bytes():
+    llm = model(kv_bytes_per_token=4096)
+    llm.client.eval(llm.client.tokenize(f"0 {PREFIX}".encode()))
+    size = state_bytes(llm.client.save_state())
+    cache = PrefixStateCache(mode="ram", max_bytes=2 * size + 1)
+    for index in range(3):
+        cache.restore(llm, f"{index} {PREFIX}")
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+    # The oldest prefix was evicted, the newest is still restored
+    cache.restore(llm, f"2 {PREFIX}")
+    cache.restore(llm, f"0 {PREFIX}")
+    assert cache.stats()["hits"] == 1
+
+
+def test_state_larger_than_the_limit_is_not_kept_in_memory(tmp_path):
+    llm = model(kv_bytes_per_token=1024 * 1024)
+    cache = PrefixStateCache(mode="disk", directory=str(tmp_path), max_bytes=1024 * 1024)
+    cache.restore(llm, PREFIX)
+    assert cache.stats()["entries"] == 0 and cache.stats()["too_large"] == 1
+    # Disk mode still has it
+    cache.restore(llm, PREFIX)
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_disk_mode_restores_across_processes(tmp_path):
+    PrefixStateCache(mode="disk", directory=str(tmp_path)).restore(model(), PREFIX)
+    llm = model()
+    fresh = PrefixStateCache(mode="disk", directory=str(tmp_path))
+    fresh.restore(llm, PREFIX)
+    assert llm.client.tokens_evaluated == 0
+    assert fresh.stats()["disk_hits"] == 1 and fresh.stats()["hits"] == 1
+
+
+def test_models_without_saved_state_are_left_alone():
+    cache = PrefixStateCache(mode="ram")
+    assert not cache.restore(SimpleNamespace(), PREFIX)
+    assert not PrefixStateCache(mode="off").restore(model(), PREFIX)
@@ -0,0 +1,92 @@
+import time
+import numpy as np
+from semantic_cache import SemanticCache
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def clustered(rng, n, dim=256, topics=2000, intrinsic=16):
+    """Query-like embeddings: a direction every text shares, then topics of Zipf-distributed
+    size, each spread over a low-dimensional subspace."""
+    shared = unit(rng.standard_normal(dim))
+    centers = rng.standard_normal((topics, dim))
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    bases = rng.standard_normal((topics, intrinsic, dim))
+    bases /= np.linalg.norm(bases, axis=2, keepdims=True)
+    weights = 1.0 / np.arange(1, topics + 1)
+    labels = rng.choice(topics, n, p=weights / weights.sum())
+    coords = rng.standard_normal((n, intrinsic)) * 0.6 / np.sqrt(intrinsic)
+    vectors = shared + centers[labels]
+    order = np.argsort(labels)
+    for members in np.split(order, np.flatnonzero(np.diff(labels[order])) + 1):
+        vectors[members] += coords[members] @ bases[labels[members[0]]]
+    vectors += rng.standard_normal((n, dim)) * 0.05 / np.sqrt(dim)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def paraphrases(rng, vectors, noise=0.3):
+    """Vectors about 0.96 similar to the given ones."""
+    moved = vectors + rng.standard_normal(vectors.shape).astype(np.float32) * noise / np.sqrt(vectors.shape[1])
+    return moved / np.linalg.norm(moved, axis=1, keepdims=True)
+
+
+def test_lookup_finds_near_duplicates_in_a_tight_cluster():
+    rng = np.random.default_rng(0)
+    cache = SemanticCache(capacity=2000, embeddings="hash", threshold=0.9)
+    center = rng.standard_normal(cache.dim)
+    vectors = [unit(center + 0.3 * rng.standard_normal(cache.dim)) for _ in range(1500)]
+    for index, vector in enumerate(vectors):
+        cache.add(vector, index)
+    assert cache.lookup(unit(vectors[42] + 0.01 * rng.standard_normal(cache.dim))) == 42
+    assert cache.lookup(unit(rng.standard_normal(cache.dim))) is None
+
+
+def test_candidates_stay_within_the_limit():
+    rng = np.random.default_rng(2)
+    cache = SemanticCache(capacity=5000, embeddings="hash", threshold=0.92, max_candidates=64)
+    vectors = clustered(rng, 5000, topics=5)
+    for index, vector in enumerate(vectors):
+        cache.add(vector, index)
+    for vector in paraphrases(rng, vectors[:200]):
+        cache.lookup(vector)
+    stats = cache.stats()
+    assert stats["avg_candidates"] <= 64
+    assert stats["truncated_probes"] > 0
+
+
+def test_lookup_at_100k_clustered_entries_is_sub_millisecond():
+    rng = np.random.default_rng(3)
+    vectors = clustered(rng, 100_000)
+    cache = SemanticCache(capacity=len(vectors), embeddings="hash", threshold=0.92)
+    for index, vector in enumerate(vectors):
+        cache.add(vector, index)
+    sources = rng.choice(len(vectors), 500, replace=False)
+    queries = paraphrases(rng, vectors[sources])
+    found, seconds = [], []
+    for query in queries:
+        start = time.perf_counter()
+        found.append(cache.lookup(query))
+        seconds.append(time.perf_counter() - start)
+    # Every query has its source above the threshold; nearly all must find a row that is
+    exact = (vectors @ queries.T).max(axis=0) >= cache.threshold
+    assert exact.all()
+    hits = [value is not None and float(vectors[value] @ query) >= cache.threshold
+            for value, query in zip(found, queries)]
+    assert np.mean(hits) >= 0.95
+    assert cache.stats()["avg_candidates"] <= cache.max_candidates
+    assert np.median(seconds) < 0.001
+
+
+def test_least_recently_hit_entry_is_evicted():
+    rng = np.random.default_rng(1)
+    cache = SemanticCache(capacity=2, embeddings="hash", threshold=0.99)
+    first, second, third = (unit(rng.standard_normal(cache.dim)) for _ in range(3))
+    cache.add(first, "first")
+    cache.add(second, "second")
+    assert cache.lookup(first) == "first"
+    cache.add(third, "third")
+    assert cache.lookup(second) is None
+    assert cache.lookup(first) == "first" and cache.lookup(third) == "third"
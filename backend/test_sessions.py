@@ -0,0 +1,77 @@
+import zlib
+import pytest
+from fastapi.testclient import TestClient
+import api
+
+client = TestClient(api.app)
+
+
+@pytest.fixture(autouse=True)
+def fixed_results(monkeypatch):
+    """Two papers per query, picked by the query, without the index or the model."""
+    async def index_search(query):
+        first = zlib.crc32(query.encode()) % 90000
+        links = [f"https://arxiv.org/abs/2401.{n:05d}" for n in (first, first + 1)]
+        return [{"index": i, "title": f"{query} paper {i}", "link": link, "key": api.paper_key(link)}
+                for i, link in enumerate(links)]
+    monkeypatch.setattr(api, "index_search", index_search)
+
+
+def search(query, session_id=None):
+    headers = {api.SESSION_HEADER: session_id} if session_id else {}
+    response = client.post("/search", json={"query": query}, headers=headers)
+    assert response.status_code == 200
+    links = [line.rsplit(" - ", 1)[1] for line in response.text.splitlines()]
+    return response.headers[api.SESSION_HEADER], response.headers["x-search-id"], links
+
+
+def summarize(index, session_id=None, search_id=None):
+    headers = {api.SESSION_HEADER: session_id} if session_id else {}
+    params = {"search_id": search_id} if search_id else {}
+    return client.get(f"/summarize/{index}", headers=headers, params=params)
+
+
+def test_search_starts_a_session_when_none_is_sent():
+    session_id, _, _ = search("graph neural networks")
+    assert api.SESSION_ID_PATTERN.fullmatch(session_id)
+    # The issued id is then used for the caller's later requests
+    assert search("graph neural networks", session_id)[0] == session_id
+
+
+def test_summarize_resolves_against_the_callers_latest_search():
+    _, _, alice_links = search("protein folding", "session-alice")
+    _, _, bob_links = search("speech recognition", "session-bob")
+    assert alice_links != bob_links
+
+    response = summarize(1, "session-alice")
+    assert response.status_code == 200
+    assert response.headers["x-paper-key"] == api.paper_key(alice_links[1])
+    assert summarize(0, "session-bob").headers["x-paper-key"] == api.paper_key(bob_links[0])
+
+    # A newer search in one session does not move the other
+    _, _, newer_links = search("quantum error correction", "session-alice")
+    assert summarize(0, "session-alice").headers["x-paper-key"] == api.paper_key(newer_links[0])
+    assert summarize(0, "session-bob").headers["x-paper-key"] == api.paper_key(bob_links[0])
+
+
+def test_search_id_selects_an_earlier_result_set():
+    _, first_id, first_links = search("sparse attention", "session-carol")
+    search("diffusion models", "session-carol")
+    response = summarize(0, "session-carol", search_id=first_id)
+    assert response.headers["x-paper-key"] == api.paper_key(first_links[0])
+    # A search id works without any session
+    assert summarize(1, search_id=first_id).headers["x-paper-key"] == api.paper_key(first_links[1])
+
+
+def test_summarize_without_a_search_is_404():
+    for session_id in (None, "session-never-searched", "bad id!"):
+        response = summarize(0, session_id)
+        assert response.status_code == 404
+        assert response.json()["detail"] == "No search in this session. Please search first."
+
+
+def test_unknown_search_id_and_index_are_404():
+    search("reinforcement learning", "session-dave")
+    assert summarize(0, search_id="0123456789abcdef").json()["detail"] == \
+        "Search results expired. Please search again."
+    assert summarize(5, "session-dave").json()["detail"] == "Index out of range."
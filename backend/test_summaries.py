@@ -0,0 +1,44 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+import api
+from fake_backends import FakeLlamaCpp
+
+client = TestClient(api.app)
+RAW = "Summary: The model improves recall [1].\nSee https://example.org/paper for details."
+CLEAN = api.clean_summary(RAW)
+
+
+@pytest.fixture(autouse=True)
+def raw_answers(monkeypatch):
+    """Summaries with the artifacts clean_summary removes."""
+    monkeypatch.setattr(FakeLlamaCpp, "_answer", lambda self, prompt: RAW)
+
+
+def direct(paper_id):
+    response = client.post("/summarize-direct", json={"paper_id": paper_id})
+    assert response.status_code == 200
+    return response.text.split(":", 1)[1]
+
+
+def batch(paper_id):
+    response = client.post("/summarize-batch", json={"papers": [paper_id]})
+    assert response.status_code == 200
+    return json.loads(response.text.splitlines()[0])["summary"]
+
+
+def streamed(paper_id):
+    response = client.post("/summarize-direct/stream", json={"paper_id": paper_id})
+    done = [line for line in response.text.split("\n\n") if line.startswith("event: done")]
+    return json.loads(done[0].split("data: ", 1)[1])["summary"]
+
+
+@pytest.mark.parametrize("first, second", [(direct, batch), (batch, direct), (streamed, direct),
+                                           (direct, streamed)])
+def test_every_path_stores_the_same_form(first, second):
+    paper_id = f"2401.{abs(hash((first.__name__, second.__name__))) % 100000:05d}"
+    assert CLEAN != RAW
+    assert first(paper_id) == CLEAN
+    assert api.summary_cache.get(paper_id) == CLEAN
+    assert second(paper_id) == CLEAN
+    assert api.summary_cache.get(paper_id) == CLEAN
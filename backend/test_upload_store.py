@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import io
+import os
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+from pypdf import PdfWriter
+from upload_store import PdfStore
+
+
+def make_pdf(pages=1, padding=0):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(200, 200)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    # A trailing comment keeps the file valid while making it larger than one chunk
+    return buffer.getvalue() + b"%" + os.urandom(padding)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PdfStore(tmp_path / "pdfs", max_bytes=1024 * 1024, max_pages=3, chunk_size=64 * 1024)
+
+
+@pytest.fixture
+def client(store):
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        file_id, path, digest = await store.receive(request)
+        return {"id": file_id, "path": str(path), "digest": digest}
+
+    return TestClient(app)
+
+
+def upload(client, data, field="file"):
+    return client.post("/upload", files={field: ("paper.pdf", data, "application/pdf")})
+
+
+def test_upload_is_stored_under_its_sha256(client, store):
+    data = make_pdf(padding=200_000)
+    response = upload(client, data)
+    assert response.status_code == 200
+    digest = hashlib.sha256(data).hexdigest()
+    assert response.json()["digest"] == digest
+    assert store.path(digest).read_bytes() == data
+
+
+def test_identical_bytes_resolve_to_the_stored_file(client, store):
+    data = make_pdf(padding=100_000)
+    first = upload(client, data).json()
+    mtime = os.stat(first["path"]).st_mtime_ns
+    second = upload(client, data).json()
+    assert second == first
+    assert os.stat(second["path"]).st_mtime_ns == mtime  # Not rewritten
+    assert store.stats()["stored"] == 1 and store.stats()["duplicates"] == 1
+    assert [name for name in os.listdir(store.directory)] == [f"{first['digest']}.pdf"]
+
+
+def test_too_large_upload_is_rejected_with_413(client, store):
+    response = upload(client, make_pdf(padding=2 * 1024 * 1024))
+    assert response.status_code == 413
+    assert os.listdir(store.directory) == []
+
+
+def test_size_limit_is_enforced_while_streaming(store):
+    # Without a usable Content-Length the limit must still cut the body off
+    body = b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.pdf\"\r\n\r\n" + \
+        make_pdf(padding=2 * 1024 * 1024) + b"\r\n--b--\r\n"
+    chunks = [body[i:i + 65536] for i in range(0, len(body), 65536)]
+    sent = []
+
+    async def receive():
+        chunk = chunks[len(sent)]
+        sent.append(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": len(sent) < len(chunks)}
+
+    request = Request({"type": "http", "method": "POST", "headers": [
+        (b"content-type", b"multipart/form-data; boundary=b")]}, receive)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(store.receive(request))
+    assert error.value.status_code == 413
+    assert len(sent) < len(chunks)
+    assert os.listdir(store.directory) == []
+
+
+def test_too_many_pages_is_rejected_with_413(client, store):
+    response = upload(client, make_pdf(pages=5))
+    assert response.status_code == 413
+    assert "5 pages" in response.json()["detail"]
+
+
+def test_non_pdf_is_rejected_with_415(client, store):
+    assert upload(client, b"plain text, not a PDF" * 100).status_code == 415
+    assert upload(client, b"").status_code == 415
+
+
+def test_unreadable_pdf_or_missing_field_is_rejected_with_422(client, store):
+    assert upload(client, b"%PDF-1.7\nthis is not really a PDF").status_code == 422
+    assert upload(client, make_pdf(), field="document").status_code == 422
+    assert os.listdir(store.directory) == []
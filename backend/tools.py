@@ -14,33 +14,28 @@ except ImportError:
                 return func
             return decorator
 
-from TTS.api import TTS
-from langchain_community.llms import LlamaCpp
+from audio_generator import generate_audio_file
+from custom_crew import tool_spec
+from llm_registry import get_llm
+from pdf_extract import extract_sections, sections_to_text
+from summarizer import condense
 from pathlib import Path
 
 load_dotenv()
 os.environ["CREWAI_DISABLE_AWS"] = "true"
 
-# Configure LlamaCpp from environment variables
-model_path = os.getenv("MODEL_PATH", "./models/llama-2-7b.Q4_K_M.gguf")
-llama_llm = LlamaCpp(
-    model_path=model_path,
-    temperature=0.7,
-    max_tokens=2000
-)
-
+@tool_spec(inputs=["pdf_path", "arxiv_id"], required=[])
 @tool("PDF Processor")
 def process_pdf(pdf_path=None, arxiv_id=None):
     """
     Process a PDF file from a local path or fetch from arXiv.
-    Returns key information from the paper using direct text extraction.
+    Returns the title, abstract and body text of the paper.
     """
     try:
         # Simple PDF processing without Grobid
         if pdf_path and os.path.exists(pdf_path):
-            # Basic PDF text extraction
-            # You can use libraries like PyPDF2 or pdfplumber
-            return f"Processed PDF: {pdf_path}"
+            # Pages are streamed and the result is cached by file hash
+            return sections_to_text(extract_sections(pdf_path))
         elif arxiv_id:
             # Simple arXiv fetching
             return f"Processed arXiv paper: {arxiv_id}"
@@ -49,14 +44,19 @@ def process_pdf(pdf_path=None, arxiv_id=None):
     except Exception as e:
         return f"Error processing PDF: {str(e)}"
 
+@tool_spec(inputs=["text"], llm_backed=True)
 @tool("Research Summarizer")
 def summarize_text(text: str) -> str:
     """Summarize text using the local Llama model."""
-    response = llama_llm.invoke(f"Summarize the following text:\n{text[:3000]}")
+    llm = get_llm()
+    # Long documents are map-reduced to fit the context instead of truncated
+    response = llm.invoke(f"Summarize the following text:\n{condense(str(text), llm)}")
     return response
 
+# Writes a file, so every call runs
+@tool_spec(inputs=["text", "output_path"], required=["text"], memoize=False)
 @tool("Audio Generator")
-def generate_audio(text: str, output_path: str = "output.mp3") -> str:
+def generate_audio(text: str, output_path: str = "output.wav") -> str:
     """Convert text to speech"""
     try:
         # Create parent directory if it doesn't exist
@@ -64,11 +64,8 @@ def generate_audio(text: str, output_path: str = "output.mp3") -> str:
         output_file.parent.mkdir(exist_ok=True, parents=True)
         
         print(f"Generating audio file at {output_path}")
-        # Force CPU mode to avoid GPU issues
-        tts = TTS(model_name="tts_models/en/ljspeech/vits", gpu=False)
-        # Limit text length to avoid errors
-        cleaned_text = text.replace('\n', ' ').strip()[:2000]
-        tts.tts_to_file(text=cleaned_text, file_path=output_path)
+        # Sentences are synthesized in parallel by pre-loaded engines, on CPU
+        generate_audio_file(text, output_path)
         print(f"Audio generation complete: {output_path}")
         return output_path
     except Exception as e:
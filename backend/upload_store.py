@@ -0,0 +1,209 @@
+"""Content-addressed PDF uploads, streamed from the request body to disk.
+
+The multipart body is parsed as it arrives rather than spooled by Starlette
+first, so an upload is read exactly once: each chunk of the file part is
+hashed and written to a temporary file off the event loop, and an upload
+over the size limit is cut off as soon as it crosses it. The finished file
+is stored under its SHA-256; uploading the same bytes again resolves to the
+stored file, whose extraction and summary are already cached by that hash.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+from pathlib import Path
+from uuid import uuid4
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+from pdf_extract import count_pages
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_MAX_PAGES = int(os.getenv("UPLOAD_MAX_PAGES", "300"))
+# Size of each write to disk; network chunks are gathered up to this
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 16 * 1024
+UPLOAD_FIELD = b"file"
+
+# The endpoints read the body themselves, so describe it for the API docs
+UPLOAD_OPENAPI = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object",
+    "required": ["file"],
+    "properties": {"file": {"type": "string", "format": "binary"}},
+}}}}}
+
+
+class _FilePart:
+    """Collects the bytes of the upload field from MultipartParser callbacks."""
+
+    def __init__(self):
+        self.pending = []
+        self.size = 0
+        self.found = False
+        self._in_file = False
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = {}
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field_data,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _part_begin(self):
+        self._disposition = {}
+        self._header_field = self._header_value = b""
+
+    def _header_field_data(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _header_value_data(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = parse_options_header(self._header_value)[1]
+        self._header_field = self._header_value = b""
+
+    def _headers_finished(self):
+        # Only the first part of that name; any later one is ignored
+        self._in_file = not self.found and self._disposition.get(b"name") == UPLOAD_FIELD
+        self.found = self.found or self._in_file
+
+    def _part_data(self, data, start, end):
+        if self._in_file:
+            self.pending.append(data[start:end])
+            self.size += end - start
+
+    def _part_end(self):
+        self._in_file = False
+
+    def take(self) -> bytes:
+        data = b"".join(self.pending)
+        self.pending = []
+        return data
+
+
+class PdfStore:
+    def __init__(self, directory, max_bytes=UPLOAD_MAX_BYTES, max_pages=UPLOAD_MAX_PAGES,
+                 chunk_size=UPLOAD_CHUNK_SIZE):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.bytes_stored = 0
+        self.bytes_deduplicated = 0
+
+    def path(self, digest) -> Path:
+        return self.directory / f"{digest}.pdf"
+
+    @staticmethod
+    def file_id(digest) -> str:
+        # Same bytes, same id, so a repeated upload finds its earlier summary
+        return f"pdf-{digest[:16]}"
+
+    def _reject(self, status_code, detail):
+        with self._lock:
+            self.rejected += 1
+        return HTTPException(status_code=status_code, detail=detail)
+
+    def _too_large(self):
+        return self._reject(413, f"PDF is larger than the upload limit of {self.max_bytes} bytes")
+
+    @staticmethod
+    def _write(f, digest, data):
+        digest.update(data)
+        f.write(data)
+
+    async def receive(self, request: Request):
+        """Stream the PDF in a multipart request to disk; returns its id, path and SHA-256."""
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        boundary = params.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise self._reject(400, "Expected a multipart/form-data upload with a 'file' field")
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and \
+                int(content_length) > self.max_bytes + MULTIPART_OVERHEAD:
+            raise self._too_large()
+
+        part = _FilePart()
+        parser = MultipartParser(boundary, part.callbacks())
+        digest = hashlib.sha256()
+        temp_path = self.directory / f".{uuid4().hex}.part"
+        f = await asyncio.to_thread(open, temp_path, "wb")
+        checked_header = False
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                if part.size > self.max_bytes:
+                    raise self._too_large()
+                if sum(map(len, part.pending)) >= self.chunk_size:
+                    data = part.take()
+                    if not checked_header:
+                        checked_header = self._check_header(data)
+                    await asyncio.to_thread(self._write, f, digest, data)
+            parser.finalize()
+            if not part.found:
+                raise self._reject(422, "No 'file' field in the upload")
+            data = part.take()
+            if not checked_header:
+                self._check_header(data, final=True)
+            await asyncio.to_thread(self._write, f, digest, data)
+            await asyncio.to_thread(f.close)
+            return await self._store(temp_path, digest.hexdigest(), part.size)
+        finally:
+            if not f.closed:
+                await asyncio.to_thread(f.close)
+            if temp_path.exists():
+                await asyncio.to_thread(temp_path.unlink)
+
+    def _check_header(self, data, final=False) -> bool:
+        # PDF readers accept the header anywhere in the first KiB
+        if len(data) < 1024 and not final:
+            return False
+        if b"%PDF-" not in data[:1024]:
+            raise self._reject(415, "The uploaded file is not a PDF")
+        return True
+
+    async def _store(self, temp_path, digest, size):
+        target = self.path(digest)
+        if target.exists():
+            with self._lock:
+                self.duplicates += 1
+                self.bytes_deduplicated += size
+            print(f"📎 Duplicate upload of {digest[:12]}, reusing {target}")
+            return self.file_id(digest), target, digest
+        try:
+            pages = await asyncio.to_thread(count_pages, str(temp_path))
+        except Exception as e:
+            raise self._reject(422, f"Could not read PDF: {e}")
+        if self.max_pages and pages > self.max_pages:
+            raise self._reject(413, f"PDF has {pages} pages, more than the limit of {self.max_pages}")
+        # Complete files only ever appear under their final name
+        await asyncio.to_thread(os.replace, temp_path, target)
+        with self._lock:
+            self.stored += 1
+            self.bytes_stored += size
+        return self.file_id(digest), target, digest
+
+    def stats(self):
+        return {
+            "stored": self.stored,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "bytes_stored": self.bytes_stored,
+            "bytes_deduplicated": self.bytes_deduplicated,
+            "max_bytes": self.max_bytes,
+            "max_pages": self.max_pages,
+        }
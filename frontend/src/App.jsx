@@ -19,7 +19,7 @@ import PaperSearch from './components/PaperSearch';
 import SummaryDisplay from './components/SummaryDisplay';
 import AudioPlayer from './components/AudioPlayer';
 import FileUpload from './components/FileUpload';
-import { getSummary } from './api';
+import { getSummary, sessionHeaders } from './api';
 
 const darkTheme = createTheme({
   palette: {
@@ -61,6 +61,7 @@ export default function App() {
   const [results, setResults] = useState([]);
   const [selectedIndex, setSelectedIndex] = useState(0);
   const [summary, setSummary] = useState("");
+  const [paperKey, setPaperKey] = useState("");
   const [paperSummary, setPaperSummary] = useState("");
   const [audioUrl, setAudioUrl] = useState("");
   const [paperSummaryId, setPaperSummaryId] = useState("");
@@ -117,6 +118,7 @@ export default function App() {
       
       console.log("Formatted results:", formattedResults);
       setResults(formattedResults);
+      setPaperKey("");
     } else {
       console.error("Unexpected results format:", data);
       setResults([]);
@@ -128,10 +130,14 @@ export default function App() {
       try {
         // Use consistent port 8000
         const baseUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
-        const response = await fetch(`${baseUrl}/summarize/${selectedIndex}`);
+        const response = await fetch(`${baseUrl}/summarize/${selectedIndex}`, {
+          headers: sessionHeaders(),
+        });
         if (!response.ok) {
           throw new Error(`Failed to fetch summary: ${response.statusText}`);
         }
+        // Audio for this paper is addressed by its stable key, not its position
+        setPaperKey(response.headers.get("X-Paper-Key") || "");
         const summaryResult = await response.text();
         console.log("Raw Summary Result:", summaryResult);
         const parsedSummary = summaryResult
@@ -150,26 +156,28 @@ export default function App() {
   const handleGeneratePodcast = async () => {
     try {
       if (isGeneratingAudio) return; // Prevent multiple simultaneous requests
+      if (!paperKey) {
+        alert("Please summarize the paper first.");
+        return;
+      }
       
       setAudioUrl(null); // Reset audio URL
       setIsGeneratingAudio(true);
       
-      console.log(`Generating podcast for paper index: ${selectedIndex}`);
+      console.log(`Generating podcast for paper: ${paperKey}`);
       
       const baseUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
-      const audioEndpoint = `${baseUrl}/audio/${selectedIndex}`;
+      const audioEndpoint = `${baseUrl}/audio/${paperKey}`;
       
       console.log("Requesting audio from:", audioEndpoint);
       
       const response = await fetch(audioEndpoint, {
-        method: 'POST', // Change to POST to prevent browser caching/auto-requesting
-        headers: { 'Cache-Control': 'no-cache' }
+        method: 'POST', // Generates the audio if it does not exist yet
       });
       
       if (response.ok) {
-        // Generate a unique timestamp to prevent browser caching
-        const timestamp = new Date().getTime();
-        setAudioUrl(`${audioEndpoint}?t=${timestamp}`);
+        // The server revalidates by ETag, so the audio element can reuse and seek it
+        setAudioUrl(audioEndpoint);
         console.log("Audio generated successfully");
       } else {
         // Reset progress on error
@@ -244,14 +252,12 @@ export default function App() {
       console.log("Requesting audio from:", audioEndpoint);
       
       const response = await fetch(audioEndpoint, {
-        method: 'POST', // Change to POST to prevent browser caching/auto-requesting
-        headers: { 'Cache-Control': 'no-cache' }
+        method: 'POST', // Generates the audio if it does not exist yet
       });
       
       if (response.ok) {
-        // Generate a unique timestamp to prevent browser caching
-        const timestamp = new Date().getTime();
-        setAudioUrl(`${audioEndpoint}?t=${timestamp}`);
+        // The server revalidates by ETag, so the audio element can reuse and seek it
+        setAudioUrl(audioEndpoint);
         console.log("Audio generated successfully");
       } else {
         // Handle error response
@@ -326,7 +332,10 @@ export default function App() {
             <Typography>Select Paper Index:</Typography>
             <Select
               value={selectedIndex}
-              onChange={(e) => setSelectedIndex(e.target.value)}
+              onChange={(e) => {
+                setSelectedIndex(e.target.value);
+                setPaperKey("");
+              }}
               sx={{ minWidth: 100 }}
             >
               {results.map((_, index) => (
@@ -1,5 +1,18 @@
 import axios from 'axios';
 
+// One session per browser tab, so search results are never shared between users or tabs
+const getSessionId = () => {
+  let sessionId = sessionStorage.getItem('sessionId');
+  if (!sessionId) {
+    sessionId = crypto.randomUUID();
+    sessionStorage.setItem('sessionId', sessionId);
+  }
+  return sessionId;
+};
+
+// Headers for plain fetch calls that read or use search results
+export const sessionHeaders = () => ({ 'X-Session-Id': getSessionId() });
+
 // Fix the API base URL to consistently use port 8000
 const API = axios.create({
   baseURL: import.meta.env.VITE_API_URL || 'http://localhost:8000',
@@ -8,6 +21,11 @@ const API = axios.create({
   },
 });
 
+API.interceptors.request.use((request) => {
+  request.headers['X-Session-Id'] = getSessionId();
+  return request;
+});
+
 // Add request and response logging - but only essential information
 API.interceptors.request.use((request) => {
   console.log(`API Request: ${request.method} ${request.url}`);